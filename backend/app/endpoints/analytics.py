@@ -0,0 +1,86 @@
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from loguru import logger
+
+from app.endpoints.analyze import _split
+from app.services.analytics import analytics_index
+
+router = APIRouter()
+
+BUCKET_PATTERN = "^(day|week|month|all)$"
+
+
+def _group_by(value: Optional[str], allowed: tuple) -> tuple:
+    columns = tuple(_split(value) or ())
+    unknown = [column for column in columns if column not in allowed]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Cannot group by {', '.join(unknown)}; "
+                                                    f"expected any of {', '.join(allowed)}")
+    return columns
+
+
+@router.get("/analytics/metrics")
+async def aggregate_metrics(
+    metric: Optional[str] = Query(None, description="Comma-separated metrics, e.g. seo,largest_contentful_paint"),
+    bucket: str = Query("day", pattern=BUCKET_PATTERN),
+    group_by: Optional[str] = Query(None, description="Comma-separated extra grouping: domain"),
+    domain: Optional[str] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    order: str = Query("bucket", pattern="^(bucket|average|count)$"),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Aggregate scores and metrics of completed analyses.
+
+    Every row is one metric in one time bucket (and domain, when grouped
+    by domain) with the number of audits, average, minimum and maximum,
+    e.g. ``?metric=seo&bucket=month&group_by=domain`` for the monthly SEO
+    score of every domain. Metrics are the summary scores (overall,
+    performance, seo, accessibility), Core Web Vitals and carbon figures.
+    """
+    try:
+        return await analytics_index.metrics(
+            metrics=_split(metric), bucket=bucket, group_by=_group_by(group_by, ("domain",)), domain=domain,
+            since=since, until=until, order=order, limit=limit, offset=offset
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error aggregating metrics: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to aggregate metrics: {str(e)}")
+
+
+@router.get("/analytics/issues")
+async def aggregate_issues(
+    module: Optional[str] = Query(None, description="Comma-separated modules, e.g. accessibility"),
+    bucket: str = Query("all", pattern=BUCKET_PATTERN),
+    group_by: Optional[str] = Query("module,issue", description="Comma-separated grouping: module, issue, domain"),
+    domain: Optional[str] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    order: str = Query("tasks", pattern="^(tasks|pages|bucket)$"),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Aggregate the issues found by completed analyses.
+
+    Rows count the audits an issue was found in and the pages it
+    affected, e.g. ``?module=accessibility`` for the most recurring
+    accessibility issues across all domains, or ``?group_by=domain``
+    for the domains with the most issues.
+    """
+    try:
+        return await analytics_index.issues(
+            modules=_split(module), bucket=bucket, group_by=_group_by(group_by, ("module", "issue", "domain")),
+            domain=domain, since=since, until=until, order=order, limit=limit, offset=offset
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error aggregating issues: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to aggregate issues: {str(e)}")
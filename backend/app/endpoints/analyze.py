@@ -1,16 +1,31 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from pydantic import BaseModel, HttpUrl
+import asyncio
+import json
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, HttpUrl
 from typing import List, Optional, Dict, Any
+from datetime import datetime
 from loguru import logger
 from app.services.analyzer import WebsiteAnalyzer
+from app.services.events import STATUS, event_bus, event_log
+from app.services.job_queue import QueueFull
+from app.services.task_store import FINAL_STATUSES, task_store
 
 router = APIRouter()
 
+# Shared by all requests; the analyzer keeps no per-request state
+analyzer = WebsiteAnalyzer()
+
+# Seconds between keep-alive comments on idle event streams
+EVENT_KEEPALIVE_INTERVAL = 15
+
 class AnalysisRequest(BaseModel):
     url: HttpUrl
     modules: List[str] = ["performance", "seo", "accessibility", "technology", "carbon"]
-    depth: int = 1  # How many pages to crawl (1 = just the homepage)
+    depth: int = 1  # How many link levels to crawl (1 = just the homepage)
     device: str = "desktop"  # desktop or mobile
+    priority: int = Field(0, ge=0, le=9)  # Higher priorities are analyzed first
+    deadline: Optional[float] = Field(None, gt=0, le=86400)  # Seconds until the audit is stopped as "timed_out"
 
 
 class AnalysisResponse(BaseModel):
@@ -19,36 +34,46 @@ class AnalysisResponse(BaseModel):
     message: str
 
 
+class AnalysisTaskInfo(BaseModel):
+    task_id: str
+    url: str
+    domain: str
+    status: str
+    created_at: str
+    completed_at: Optional[str] = None
+
+
 class AnalysisResult(BaseModel):
     url: str
+    status: str = "pending"
     timestamp: str
     results: Dict[str, Any]
-    summary: Dict[str, Any]
+    summary: Dict[str, Any] = {}  # Available once the analysis is completed
+    error: Optional[str] = None
+    cache: Dict[str, str] = {}  # Per module: "hit", "revalidated", "unchanged", "resumed" or "miss"
+    timings: Dict[str, Any] = {}  # Where the time of the run went (see telemetry.Trace)
 
 
 @router.post("/analyze", response_model=AnalysisResponse)
-async def analyze_website(request: AnalysisRequest, background_tasks: BackgroundTasks):
+async def analyze_website(request: AnalysisRequest):
     """
     Analyze a website based on provided parameters.
     
-    This endpoint initiates an asynchronous website analysis and returns a task ID
-    that can be used to check the status and retrieve results.
+    This endpoint queues an asynchronous website analysis and returns a task ID
+    that can be used to check the status and retrieve results. When the queue
+    is saturated, or too deep for the analysis to start before its
+    ``deadline``, it responds with 429 and a Retry-After header.
     """
     logger.info(f"Received analysis request for URL: {request.url}")
     
     try:
-        analyzer = WebsiteAnalyzer()
         task_id = await analyzer.start_analysis(
             url=str(request.url),
             modules=request.modules,
             depth=request.depth,
-            device=request.device
-        )
-        
-        # Start the analysis in the background
-        background_tasks.add_task(
-            analyzer.run_analysis,
-            task_id=task_id
+            device=request.device,
+            priority=request.priority,
+            deadline=request.deadline
         )
         
         return {
@@ -57,26 +82,74 @@ async def analyze_website(request: AnalysisRequest, background_tasks: Background
             "message": "Analysis started successfully. Use the task ID to check status."
         }
         
+    except QueueFull as e:
+        logger.warning(f"Rejected analysis request for URL {request.url}: {str(e)}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         logger.error(f"Error starting analysis: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to start analysis: {str(e)}")
 
 
+@router.post("/analysis/{task_id}/cancel", response_model=AnalysisResponse)
+async def cancel_analysis(task_id: str):
+    """
+    Cancel a queued or running analysis.
+
+    A queued analysis is cancelled at once. A running one is stopped by its
+    worker within a second or two; the task then ends with status
+    "cancelled" and keeps the results of the modules that had finished.
+    """
+    task = await task_store.get(task_id, fields=["status"])
+    if task is None:
+        raise HTTPException(status_code=404, detail="Analysis task not found")
+    if task.get("status") in FINAL_STATUSES:
+        raise HTTPException(status_code=409, detail=f"The analysis already ended ({task['status']})")
+
+    try:
+        status = await analyzer.cancel_analysis(task_id)
+    except Exception as e:
+        logger.error(f"Error cancelling analysis {task_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to cancel analysis: {str(e)}")
+    if status is None:
+        raise HTTPException(status_code=409, detail="The analysis is not queued or running")
+
+    return {
+        "task_id": task_id,
+        "status": status,
+        "message": "Analysis cancelled." if status == "cancelled" else "The analysis is being stopped."
+    }
+
+
+def _split(value: Optional[str]) -> Optional[List[str]]:
+    return [item.strip() for item in value.split(",") if item.strip()] if value is not None else None
+
+
 @router.get("/analysis/{task_id}", response_model=Optional[AnalysisResult])
-async def get_analysis_results(task_id: str):
+async def get_analysis_results(
+    task_id: str,
+    fields: Optional[str] = Query(None, description="Comma-separated top-level fields, e.g. status,summary"),
+    modules: Optional[str] = Query(None, description="Comma-separated module results, e.g. seo,performance")
+):
     """
     Get the results of a previously initiated website analysis.
     
     If the analysis is still running, this will return a status update.
     If the analysis is complete, this will return the full results.
+    To follow a running analysis, prefer GET /analysis/{task_id}/events.
+    
+    ``fields`` and ``modules`` project the document; only the requested
+    parts are loaded and returned as stored (including ``pages`` and
+    ``crawl`` of multi-page audits when asked for).
     """
     try:
-        analyzer = WebsiteAnalyzer()
-        result = await analyzer.get_analysis_results(task_id)
+        field_list, module_list = _split(fields), _split(modules)
+        result = await analyzer.get_analysis_results(task_id, fields=field_list, modules=module_list)
         
         if not result:
             raise HTTPException(status_code=404, detail="Analysis task not found")
-            
+        
+        if field_list is not None or module_list is not None:
+            return JSONResponse(result)
         return result
         
     except HTTPException:
@@ -84,3 +157,98 @@ async def get_analysis_results(task_id: str):
     except Exception as e:
         logger.error(f"Error retrieving analysis results: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to retrieve analysis results: {str(e)}")
+
+
+@router.get("/analyses", response_model=List[AnalysisTaskInfo])
+async def list_analyses(
+    url: Optional[str] = None,
+    domain: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0)
+):
+    """
+    List analysis tasks, newest first.
+    
+    Tasks can be filtered by exact URL, domain, status and creation time.
+    """
+    try:
+        return await task_store.find(url=url, domain=domain, status=status, since=since, limit=limit, offset=offset)
+    except Exception as e:
+        logger.error(f"Error listing analyses: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to list analyses: {str(e)}")
+
+
+def _format_event(event: Dict[str, Any]) -> str:
+    lines = [f"id: {event['id']}"] if event.get("id") else []
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event['data'], default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+@router.get("/analysis/{task_id}/events")
+async def stream_analysis_events(
+    task_id: str,
+    last_event_id: Optional[int] = Query(None, ge=0),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """
+    Follow an analysis as Server-Sent Events.
+    
+    Emits ``status`` events on every status transition, a ``module`` event
+    with each module result as soon as it is stored, and a ``page`` event for
+    every crawled page. Events too large to stream carry ``truncated: true``
+    instead of their results, which are read from the task. The stream ends
+    after the final status. Reconnecting clients resume through the
+    Last-Event-ID header (sent automatically by EventSource) or the
+    ``last_event_id`` query parameter.
+    """
+    task = await task_store.get(task_id, fields=["status"])
+    if task is None:
+        raise HTTPException(status_code=404, detail="Analysis task not found")
+    after = last_event_id
+    if after is None and last_event_id_header and last_event_id_header.isdigit():
+        after = int(last_event_id_header)
+    after = after or 0
+
+    def is_final(event: Dict[str, Any]) -> bool:
+        return event["type"] == STATUS and event["data"].get("status") in FINAL_STATUSES
+
+    async def events():
+        async with event_bus.subscribe(task_id) as queue:
+            last = after
+            for event in await event_log.history(task_id, after):
+                last = event["id"]
+                yield _format_event(event)
+                if is_final(event):
+                    return
+
+            current = await task_store.get(task_id, fields=["status", "error", "summary", "completed_at"])
+            if current is not None and current.get("status") in FINAL_STATUSES:
+                # The task finished before the stream started and its events expired
+                yield _format_event({"type": STATUS, "data": {
+                    key: current.get(key) for key in ("status", "error", "summary", "completed_at")
+                }})
+                return
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), EVENT_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    return
+                if event["id"] <= last:
+                    continue
+                last = event["id"]
+                yield _format_event(event)
+                if is_final(event):
+                    return
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
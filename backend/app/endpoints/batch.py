@@ -0,0 +1,192 @@
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from loguru import logger
+from pydantic import BaseModel, Field, HttpUrl, TypeAdapter, ValidationError
+
+from app.services.batches import batch_store
+from app.services.task_store import task_store
+
+router = APIRouter()
+
+DEFAULT_MODULES = ["performance", "seo", "accessibility", "technology", "carbon"]
+
+# How often a result stream checks for newly completed items
+RESULT_POLL_INTERVAL = 1.0
+
+_url_adapter = TypeAdapter(HttpUrl)
+
+
+class BatchRequest(BaseModel):
+    urls: List[HttpUrl] = Field(..., min_length=1)
+    modules: List[str] = DEFAULT_MODULES
+    depth: int = 1  # How many link levels to crawl (1 = just the homepage)
+    device: str = "desktop"  # desktop or mobile
+    priority: int = Field(0, ge=0, le=9)  # Higher priorities are analyzed first
+
+
+class BatchResponse(BaseModel):
+    batch_id: str
+    total: int
+    skipped: int = 0  # Lines of an uploaded list that are not valid URLs
+
+
+class BatchStatus(BaseModel):
+    batch_id: str
+    created_at: str
+    options: Dict[str, Any]
+    total: int
+    completed: int
+    waiting: int
+    scheduled: int
+
+
+async def _validated(urls: AsyncIterator[str], skipped: List[str]) -> AsyncIterator[str]:
+    async for url in urls:
+        try:
+            yield str(_url_adapter.validate_python(url))
+        except ValidationError:
+            skipped.append(url)
+
+
+async def _iter_uploaded_urls(request: Request) -> AsyncIterator[str]:
+    """
+    URLs of an uploaded list, read as the body streams in.
+
+    One URL per line, either plain or as NDJSON objects with a "url" key;
+    blank lines and lines starting with # are ignored.
+    """
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            url = _parse_line(line)
+            if url:
+                yield url
+    url = _parse_line(buffer)
+    if url:
+        yield url
+
+
+def _parse_line(line: bytes) -> Optional[str]:
+    text = line.decode("utf-8", errors="replace").strip()
+    if not text or text.startswith("#"):
+        return None
+    if text.startswith("{"):
+        try:
+            return str(json.loads(text).get("url") or "")
+        except (ValueError, AttributeError):
+            return text
+    return text
+
+
+async def _create_batch(urls: AsyncIterator[str], options: Dict[str, Any]) -> Dict[str, Any]:
+    skipped: List[str] = []
+    batch = await batch_store.create(_validated(urls, skipped), options)
+    if skipped:
+        logger.warning(f"Batch {batch['batch_id']} skipped {len(skipped)} invalid URLs")
+    return {**batch, "skipped": len(skipped)}
+
+
+@router.post("/batch", response_model=BatchResponse)
+async def create_batch(request: BatchRequest):
+    """
+    Submit a list of URLs audited with shared options.
+
+    The URLs are queued gradually, alternating between domains; follow the
+    progress with GET /batch/{batch_id} and read results as they complete
+    from GET /batch/{batch_id}/results.
+    """
+    async def urls():
+        for url in request.urls:
+            yield str(url)
+
+    try:
+        return await _create_batch(urls(), request.model_dump(exclude={"urls"}))
+    except Exception as e:
+        logger.error(f"Error creating batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to create batch: {str(e)}")
+
+
+@router.post("/batch/upload", response_model=BatchResponse)
+async def upload_batch(
+    request: Request,
+    modules: List[str] = Query(DEFAULT_MODULES),
+    depth: int = 1,
+    device: str = "desktop",
+    priority: int = Query(0, ge=0, le=9)
+):
+    """
+    Submit a URL list as the request body (text or NDJSON, one URL per line).
+
+    The body is read as it streams in, so lists of any size can be uploaded
+    without being held in memory. Options apply to every URL.
+    """
+    options = {"modules": modules, "depth": depth, "device": device, "priority": priority}
+    try:
+        batch = await _create_batch(_iter_uploaded_urls(request), options)
+    except Exception as e:
+        logger.error(f"Error creating batch from upload: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to create batch: {str(e)}")
+    if batch["total"] == 0:
+        raise HTTPException(status_code=400, detail="The uploaded list contains no valid URLs")
+    return batch
+
+
+@router.get("/batch/{batch_id}", response_model=BatchStatus)
+async def get_batch(batch_id: str):
+    """
+    Get the progress of a batch.
+    """
+    status = await batch_store.status(batch_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return status
+
+
+@router.get("/batch/{batch_id}/results")
+async def stream_batch_results(batch_id: str, cursor: int = Query(0, ge=0)):
+    """
+    Stream batch results as NDJSON, in completion order.
+
+    Each line holds one audited URL and a ``cursor``; a client that loses
+    the connection resumes by passing the last cursor it received. The
+    stream stays open until every URL of the batch is done and ends with a
+    line containing ``"done": true``.
+    """
+    status = await batch_store.status(batch_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    async def lines():
+        position = cursor
+        while True:
+            items = await batch_store.completed_items(batch_id, position)
+            for item in items:
+                task = await task_store.get(
+                    item["task_id"], fields=["status", "error", "summary", "results"]
+                ) or {}
+                position = item["cursor"]
+                yield json.dumps({
+                    "cursor": position,
+                    "url": item["url"],
+                    "task_id": item["task_id"],
+                    "status": task.get("status"),
+                    "error": task.get("error"),
+                    "summary": task.get("summary", {}),
+                    "results": task.get("results", {}),
+                }, default=str) + "\n"
+            if items:
+                continue
+
+            status = await batch_store.status(batch_id)
+            if status["completed"] >= status["total"] and position >= status["completed"]:
+                yield json.dumps({"done": True, "cursor": position, "total": status["total"]}) + "\n"
+                return
+            await asyncio.sleep(RESULT_POLL_INTERVAL)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
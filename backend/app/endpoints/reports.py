@@ -0,0 +1,34 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import FileResponse
+from loguru import logger
+
+from app.services.reports import REPORT_FIELDS, REPORT_FORMATS, ReportQueueFull, report_renderer
+from app.services.task_store import FINAL_STATUSES, task_store
+
+router = APIRouter()
+
+
+@router.get("/analysis/{task_id}/report")
+async def download_report(task_id: str, format: str = Query("pdf", pattern="^(pdf|html)$")):
+    """
+    Download the report of a finished analysis as PDF or HTML.
+
+    Reports are rendered in background processes and cached, so repeated
+    downloads are served from disk. When too many reports are being
+    rendered the endpoint responds with 503 and a Retry-After header.
+    """
+    task = await task_store.get(task_id, fields=REPORT_FIELDS)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Analysis task not found")
+    if task.get("status") not in FINAL_STATUSES:
+        raise HTTPException(status_code=409, detail="The analysis is not finished yet")
+
+    try:
+        path = await report_renderer.render(task_id, task, format)
+    except ReportQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        logger.error(f"Error rendering report for task {task_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to render report: {str(e)}")
+
+    return FileResponse(path, media_type=REPORT_FORMATS[format], filename=f"audit-{task_id}.{format}")
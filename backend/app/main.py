@@ -1,12 +1,22 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 from loguru import logger
 import os
+import socket
 from dotenv import load_dotenv
 
 # Import routers
-from app.endpoints import analyze, auth
+from app.endpoints import analytics, analyze, auth, batch, reports
+from app.services.database import init_db
+from app.services.events import event_bus
+from app.services.http_client import http_client
+from app.services.job_queue import job_queue
+from app.services.reports import report_renderer
+from app.services.telemetry import metrics, telemetry_monitor
+from app.services.workers import WorkerPool
 
 # Load environment variables from .env file
 load_dotenv()
@@ -14,10 +24,37 @@ load_dotenv()
 # Configure logging
 logger.add("logs/app.log", rotation="10 MB", retention="1 week", level="INFO")
 
+# Name of this API process in the metrics
+PROCESS_NAME = f"api:{socket.gethostname()}:{os.getpid()}"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start shared resources on startup and release them on shutdown
+    """
+    init_db()
+    telemetry_monitor.start(PROCESS_NAME)
+
+    # Audits, and the browsers they use, run in separate worker processes;
+    # with WORKER_PROCESSES=0 they are expected to be started separately
+    # (python -m app.services.workers)
+    worker_pool = WorkerPool()
+    if worker_pool.processes > 0:
+        worker_pool.start()
+    yield
+    await worker_pool.stop()
+    await event_bus.stop()
+    report_renderer.stop()
+    await telemetry_monitor.stop()
+    await http_client.close()
+
+
 app = FastAPI(
     title="CometWeb Audit Tool",
     description="A comprehensive tool for auditing websites, including performance, SEO, accessibility, and more",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -31,6 +68,9 @@ app.add_middleware(
 
 # Include routers
 app.include_router(analyze.router, prefix="/api", tags=["analyze"])
+app.include_router(batch.router, prefix="/api", tags=["batch"])
+app.include_router(reports.router, prefix="/api", tags=["reports"])
+app.include_router(analytics.router, prefix="/api", tags=["analytics"])
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 
 @app.get("/")
@@ -51,6 +91,15 @@ async def health_check():
     """
     return {"status": "ok"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Metrics of the API and worker processes in the Prometheus text format
+    """
+    depth = await job_queue.depth()
+    body = await metrics.render(PROCESS_NAME, gauges={"audit_queue_depth": depth})
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
     uvicorn.run("app.main:app", host="0.0.0.0", port=port, reload=True)
@@ -0,0 +1,646 @@
+import re
+import time
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import lxml.html
+
+from app.services.cancellation import checkpoint
+
+# Rule impact and its weight in the accessibility score
+IMPACT_WEIGHTS = {"critical": 10, "serious": 7, "moderate": 3, "minor": 1}
+IMPACT_ISSUE_TYPES = {"critical": "error", "serious": "error", "moderate": "warning", "minor": "info"}
+
+# Conformance levels each level includes
+LEVELS = {"a": ("A",), "aa": ("A", "AA"), "aaa": ("A", "AA", "AAA")}
+
+# Failing elements reported per rule
+MAX_EXAMPLES = 5
+
+# Elements audited between checks whether the analysis was cancelled
+CHECKPOINT_NODES = 1000
+
+ARIA_ROLES = frozenset("""
+    alert alertdialog application article banner blockquote button caption cell checkbox code columnheader
+    combobox complementary contentinfo definition deletion dialog directory document emphasis feed figure form
+    generic grid gridcell group heading img insertion link list listbox listitem log main marquee math menu
+    menubar menuitem menuitemcheckbox menuitemradio meter navigation none note option paragraph presentation
+    progressbar radio radiogroup region row rowgroup rowheader scrollbar search searchbox separator slider
+    spinbutton status strong subscript superscript switch tab table tablist tabpanel term textbox time timer
+    toolbar tooltip tree treegrid treeitem doc-abstract doc-acknowledgments doc-afterword doc-appendix
+    doc-backlink doc-biblioentry doc-bibliography doc-biblioref doc-chapter doc-colophon doc-conclusion
+    doc-cover doc-credit doc-credits doc-dedication doc-endnote doc-endnotes doc-epigraph doc-epilogue
+    doc-errata doc-example doc-footnote doc-foreword doc-glossary doc-glossref doc-index doc-introduction
+    doc-noteref doc-notice doc-pagebreak doc-pagelist doc-part doc-preface doc-prologue doc-pullquote doc-qna
+    doc-subtitle doc-tip doc-toc graphics-document graphics-object graphics-symbol
+""".split())
+
+ARIA_ATTRIBUTES = frozenset("""
+    aria-activedescendant aria-atomic aria-autocomplete aria-braillelabel aria-brailleroledescription aria-busy
+    aria-checked aria-colcount aria-colindex aria-colindextext aria-colspan aria-controls aria-current
+    aria-describedby aria-description aria-details aria-disabled aria-dropeffect aria-errormessage
+    aria-expanded aria-flowto aria-grabbed aria-haspopup aria-hidden aria-invalid aria-keyshortcuts
+    aria-label aria-labelledby aria-level aria-live aria-modal aria-multiline aria-multiselectable
+    aria-orientation aria-owns aria-placeholder aria-posinset aria-pressed aria-readonly aria-relevant
+    aria-required aria-roledescription aria-rowcount aria-rowindex aria-rowindextext aria-rowspan
+    aria-selected aria-setsize aria-sort aria-valuemax aria-valuemin aria-valuenow aria-valuetext
+""".split())
+
+# Input types that need no label
+UNLABELLED_INPUT_TYPES = {"hidden", "submit", "button", "image", "reset"}
+
+HEADING_TAGS = ("h1", "h2", "h3", "h4", "h5", "h6")
+
+# Bulk extraction of the computed text styles of a rendered page. Elements
+# sharing colors and font are grouped, so the result stays small however
+# large the page is; backgrounds are resolved once per element.
+TEXT_STYLES_SCRIPT = """() => {
+    const MAX_ELEMENTS = 50000;
+    const backgrounds = new Map();
+    const transparent = (c) => !c || c === 'transparent' || c === 'rgba(0, 0, 0, 0)';
+    const background = (element) => {
+        const chain = [];
+        let node = element, result = null;
+        while (node && node.nodeType === 1) {
+            if (backgrounds.has(node)) { result = backgrounds.get(node); break; }
+            chain.push(node);
+            const style = getComputedStyle(node);
+            if (style.backgroundImage && style.backgroundImage !== 'none') { result = 'image'; break; }
+            if (!transparent(style.backgroundColor)) { result = style.backgroundColor; break; }
+            node = node.parentElement;
+        }
+        if (result === null) result = 'rgb(255, 255, 255)';
+        for (const n of chain) backgrounds.set(n, result);
+        return result;
+    };
+    const selector = (element) => {
+        const parts = [];
+        for (let node = element; node && node.nodeType === 1 && parts.length < 3; node = node.parentElement) {
+            let part = node.tagName.toLowerCase();
+            if (node.id) { parts.unshift(part + '#' + node.id); break; }
+            if (node.classList.length) part += '.' + node.classList[0];
+            parts.unshift(part);
+        }
+        return parts.join(' > ');
+    };
+    const groups = new Map();
+    const seen = new Set();
+    const walker = document.createTreeWalker(document.body || document.documentElement, NodeFilter.SHOW_TEXT);
+    let elements = 0;
+    while (walker.nextNode() && elements < MAX_ELEMENTS) {
+        const element = walker.currentNode.parentElement;
+        if (!element || seen.has(element) || !walker.currentNode.nodeValue.trim()) continue;
+        seen.add(element);
+        if (['SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE'].includes(element.tagName)) continue;
+        if (!element.getClientRects().length) continue;
+        const style = getComputedStyle(element);
+        if (style.visibility !== 'visible' || parseFloat(style.opacity) === 0) continue;
+        elements++;
+        const key = [style.color, background(element), style.fontSize, style.fontWeight].join('|');
+        const group = groups.get(key);
+        if (group) { group[4]++; } else {
+            groups.set(key, [style.color, background(element), parseFloat(style.fontSize), parseInt(style.fontWeight) || 400, 1, selector(element)]);
+        }
+    }
+    return {elements, groups: Array.from(groups.values())};
+}"""
+
+
+class Audit:
+    """State of one accessibility audit, shared by the rules during the traversal"""
+
+    def __init__(self):
+        self.applicable: Dict[str, int] = {}
+        self.failures: Dict[str, int] = {}
+        self.examples: Dict[str, List[str]] = {}
+        self.state: Dict[str, Any] = {}
+        self.not_checked: List[str] = []
+
+    def check(self, rule: "Rule"):
+        """Record that an element the rule applies to was checked"""
+        self.applicable[rule.id] = self.applicable.get(rule.id, 0) + 1
+
+    def fail(self, rule: "Rule", element: Any = None, detail: Optional[str] = None, count: int = 1):
+        """Record failing elements of a rule"""
+        self.applicable.setdefault(rule.id, count)
+        self.failures[rule.id] = self.failures.get(rule.id, 0) + count
+        examples = self.examples.setdefault(rule.id, [])
+        if len(examples) < MAX_EXAMPLES and (element is not None or detail):
+            examples.append(detail or describe(element))
+
+
+class Rule:
+    """
+    A WCAG check.
+
+    Rules subscribe to element tags and attribute names; the engine calls
+    ``visit`` for every element carrying one of them during its single walk
+    of the document, then ``finish`` once for document-level conclusions.
+    """
+
+    id = ""
+    wcag = ""
+    level = "A"
+    impact = "serious"
+    message = ""
+    tags: Tuple[str, ...] = ()
+    attributes: Tuple[str, ...] = ()
+
+    def visit(self, element: lxml.html.HtmlElement, audit: Audit):
+        pass
+
+    def finish(self, audit: Audit):
+        pass
+
+
+def describe(element: Any) -> str:
+    """Short selector-like description of an element"""
+    if not isinstance(getattr(element, "tag", None), str):
+        return str(element)
+    description = element.tag
+    if element.get("id"):
+        description += f"#{element.get('id')}"
+    elif (element.get("class") or "").split():
+        description += "." + element.get("class").split()[0]
+    return description
+
+
+def _has_accessible_name(element: lxml.html.HtmlElement) -> bool:
+    return bool((element.get("aria-label") or "").strip() or element.get("aria-labelledby")
+                or (element.get("title") or "").strip())
+
+
+def _text(element: lxml.html.HtmlElement) -> str:
+    return (element.text_content() or "").strip()
+
+
+class ImageAlt(Rule):
+    id, wcag, impact, tags = "image-alt", "1.1.1", "critical", ("img",)
+    message = "Images must have alternate text"
+
+    def visit(self, element, audit):
+        audit.check(self)
+        if element.get("alt") is None and element.get("role") not in ("presentation", "none") \
+                and not _has_accessible_name(element):
+            audit.fail(self, element)
+
+
+class InputImageAlt(Rule):
+    id, wcag, impact, tags = "input-image-alt", "1.1.1", "critical", ("input",)
+    message = "Image buttons must have alternate text"
+
+    def visit(self, element, audit):
+        if (element.get("type") or "").lower() != "image":
+            return
+        audit.check(self)
+        if not (element.get("alt") or "").strip() and not _has_accessible_name(element):
+            audit.fail(self, element)
+
+
+class AreaAlt(Rule):
+    id, wcag, impact, tags = "area-alt", "1.1.1", "critical", ("area",)
+    message = "Image map areas must have alternate text"
+
+    def visit(self, element, audit):
+        if element.get("href") is None:
+            return
+        audit.check(self)
+        if not (element.get("alt") or "").strip() and not _has_accessible_name(element):
+            audit.fail(self, element)
+
+
+class FormLabel(Rule):
+    id, wcag, impact = "label", "1.3.1", "critical"
+    tags = ("input", "select", "textarea", "label")
+    message = "Form fields must have labels"
+
+    def visit(self, element, audit):
+        state = audit.state.setdefault(self.id, {"labelled": set(), "pending": []})
+        if element.tag == "label":
+            if element.get("for"):
+                state["labelled"].add(element.get("for"))
+            return
+        if element.tag == "input" and (element.get("type") or "text").lower() in UNLABELLED_INPUT_TYPES:
+            return
+        audit.check(self)
+        if _has_accessible_name(element) or next(element.iterancestors("label"), None) is not None:
+            return
+        state["pending"].append(element)
+
+    def finish(self, audit):
+        state = audit.state.get(self.id)
+        if not state:
+            return
+        for element in state["pending"]:
+            if element.get("id") not in state["labelled"]:
+                audit.fail(self, element)
+
+
+class ButtonName(Rule):
+    id, wcag, impact, tags = "button-name", "4.1.2", "critical", ("button",)
+    message = "Buttons must have discernible text"
+
+    def visit(self, element, audit):
+        audit.check(self)
+        if _text(element) or _has_accessible_name(element):
+            return
+        if any((img.get("alt") or "").strip() for img in element.iter("img")):
+            return
+        audit.fail(self, element)
+
+
+class LinkName(Rule):
+    id, wcag, impact, tags = "link-name", "2.4.4", "serious", ("a",)
+    message = "Links must have discernible text"
+
+    def visit(self, element, audit):
+        if element.get("href") is None:
+            return
+        audit.check(self)
+        if _text(element) or _has_accessible_name(element):
+            return
+        if any((img.get("alt") or "").strip() for img in element.iter("img")):
+            return
+        audit.fail(self, element)
+
+
+class DocumentTitle(Rule):
+    id, wcag, impact, tags = "document-title", "2.4.2", "serious", ("title",)
+    message = "Documents must have a title"
+
+    def visit(self, element, audit):
+        if (element.text or "").strip():
+            audit.state[self.id] = True
+
+    def finish(self, audit):
+        audit.check(self)
+        if not audit.state.get(self.id):
+            audit.fail(self, detail="title")
+
+
+class HtmlLang(Rule):
+    id, wcag, impact, tags = "html-has-lang", "3.1.1", "serious", ("html",)
+    message = "The html element must have a valid lang attribute"
+
+    def visit(self, element, audit):
+        audit.check(self)
+        lang = (element.get("lang") or element.get("xml:lang") or "").strip()
+        if not re.fullmatch(r"[A-Za-z]{2,3}(?:-[A-Za-z0-9]{2,8})*", lang):
+            audit.fail(self, element)
+
+
+class HeadingOrder(Rule):
+    id, wcag, impact, level, tags = "heading-order", "1.3.1", "moderate", "A", HEADING_TAGS
+    message = "Heading levels should only increase by one"
+
+    def visit(self, element, audit):
+        audit.check(self)
+        level = int(element.tag[1])
+        previous = audit.state.get(self.id)
+        if previous is not None and level > previous + 1:
+            audit.fail(self, element, f"{element.tag} after h{previous}")
+        audit.state[self.id] = level
+
+
+class EmptyHeading(Rule):
+    id, wcag, impact, tags = "empty-heading", "1.3.1", "minor", HEADING_TAGS
+    message = "Headings should not be empty"
+
+    def visit(self, element, audit):
+        audit.check(self)
+        if not _text(element) and not _has_accessible_name(element):
+            audit.fail(self, element)
+
+
+class MainLandmark(Rule):
+    id, wcag, impact = "landmark-one-main", "1.3.1", "moderate"
+    tags, attributes = ("main",), ("role",)
+    message = "The document should have one main landmark"
+
+    def visit(self, element, audit):
+        if element.tag == "main" or element.get("role") == "main":
+            audit.state[self.id] = audit.state.get(self.id, 0) + 1
+
+    def finish(self, audit):
+        audit.check(self)
+        if audit.state.get(self.id, 0) != 1:
+            audit.fail(self, detail=f"{audit.state.get(self.id, 0)} main landmarks")
+
+
+class ListStructure(Rule):
+    id, wcag, impact, tags = "list", "1.3.1", "serious", ("ul", "ol")
+    message = "Lists must only directly contain li, script or template elements"
+
+    def visit(self, element, audit):
+        audit.check(self)
+        for child in element:
+            if isinstance(child.tag, str) and child.tag not in ("li", "script", "template"):
+                audit.fail(self, element)
+                return
+
+
+class FrameTitle(Rule):
+    id, wcag, impact, tags = "frame-title", "4.1.2", "serious", ("iframe", "frame")
+    message = "Frames must have a title"
+
+    def visit(self, element, audit):
+        audit.check(self)
+        if not (element.get("title") or "").strip() and not _has_accessible_name(element):
+            audit.fail(self, element)
+
+
+class MetaViewport(Rule):
+    id, wcag, level, impact, tags = "meta-viewport", "1.4.4", "AA", "critical", ("meta",)
+    message = "Zooming and scaling must not be disabled"
+
+    def visit(self, element, audit):
+        if (element.get("name") or "").lower() != "viewport":
+            return
+        audit.check(self)
+        content = (element.get("content") or "").lower().replace(" ", "")
+        # Browsers read the leading number of the value and ignore the rest,
+        # so "1.0.0" restricts zoom and a value without a number does not
+        scale = re.search(r"maximum-scale=(\d+(?:\.\d*)?|\.\d+)", content)
+        if re.search(r"user-scalable=(?:no|0)(?:,|$)", content) or (scale and float(scale.group(1)) < 2):
+            audit.fail(self, element)
+
+
+class MetaRefresh(Rule):
+    id, wcag, impact, tags = "meta-refresh", "2.2.1", "critical", ("meta",)
+    message = "Timed refreshes must not be used"
+
+    def visit(self, element, audit):
+        if (element.get("http-equiv") or "").lower() != "refresh":
+            return
+        audit.check(self)
+        delay = re.match(r"\s*(\d+)", element.get("content") or "")
+        if delay and 0 < int(delay.group(1)) < 72000:
+            audit.fail(self, element)
+
+
+class BlinkMarquee(Rule):
+    id, wcag, impact, tags = "blink-marquee", "2.2.2", "serious", ("blink", "marquee")
+    message = "Moving content must be avoidable; do not use blink or marquee"
+
+    def visit(self, element, audit):
+        audit.check(self)
+        audit.fail(self, element)
+
+
+class DuplicateId(Rule):
+    id, wcag, impact, attributes = "duplicate-id", "4.1.1", "minor", ("id",)
+    message = "IDs must be unique"
+
+    def visit(self, element, audit):
+        audit.check(self)
+        ids = audit.state.setdefault(self.id, set())
+        if element.get("id") in ids:
+            audit.fail(self, element)
+        ids.add(element.get("id"))
+
+
+class AriaRole(Rule):
+    id, wcag, impact, attributes = "aria-roles", "4.1.2", "critical", ("role",)
+    message = "ARIA roles must have valid values"
+
+    def visit(self, element, audit):
+        audit.check(self)
+        roles = (element.get("role") or "").split()
+        if not roles or not any(role in ARIA_ROLES for role in roles):
+            audit.fail(self, element, f"{describe(element)} role=\"{element.get('role')}\"")
+
+
+class AriaAttribute(Rule):
+    id, wcag, impact, attributes = "aria-valid-attr", "4.1.2", "critical", ("aria-*",)
+    message = "ARIA attributes must be valid"
+
+    def visit(self, element, audit):
+        audit.check(self)
+        for name in element.attrib:
+            if name.startswith("aria-") and name not in ARIA_ATTRIBUTES:
+                audit.fail(self, element, f"{describe(element)} {name}")
+                return
+
+
+class AriaHiddenFocus(Rule):
+    id, wcag, impact, attributes = "aria-hidden-focus", "4.1.2", "serious", ("aria-hidden",)
+    message = "Elements hidden with aria-hidden must not be focusable"
+
+    def visit(self, element, audit):
+        if element.get("aria-hidden") != "true":
+            return
+        audit.check(self)
+        tabindex = element.get("tabindex")
+        focusable = (
+            (element.tag == "a" and element.get("href") is not None)
+            or (element.tag in ("button", "input", "select", "textarea") and element.get("disabled") is None)
+        )
+        if tabindex is not None:
+            try:
+                focusable = int(tabindex) >= 0
+            except ValueError:
+                pass
+        if focusable:
+            audit.fail(self, element)
+
+
+class PositiveTabindex(Rule):
+    id, wcag, impact, attributes = "tabindex", "2.4.3", "serious", ("tabindex",)
+    message = "Elements should not have a tabindex greater than zero"
+
+    def visit(self, element, audit):
+        audit.check(self)
+        value = (element.get("tabindex") or "").strip()
+        if value.isdigit() and int(value) > 0:
+            audit.fail(self, element)
+
+
+class ColorContrast(Rule):
+    """Contrast of rendered text against its background, from the bulk style extraction"""
+
+    id, wcag, level, impact = "color-contrast", "1.4.3", "AA", "serious"
+    message = "Text must have a contrast ratio of at least 4.5:1 (3:1 for large text)"
+    thresholds = (4.5, 3.0)
+
+    def check_styles(self, groups: List[List[Any]], audit: Audit):
+        for color, background, font_size, font_weight, count, example in groups:
+            ratio = contrast_ratio(color, background)
+            if ratio is None:
+                continue
+            audit.applicable[self.id] = audit.applicable.get(self.id, 0) + count
+            large = font_size >= 24 or (font_size >= 18.66 and font_weight >= 700)
+            if ratio < self.thresholds[1 if large else 0]:
+                audit.fail(self, count=count, detail=f"{example} ({ratio:.2f}:1)")
+
+
+class ColorContrastEnhanced(ColorContrast):
+    id, wcag, level, impact = "color-contrast-enhanced", "1.4.6", "AAA", "moderate"
+    message = "Text should have a contrast ratio of at least 7:1 (4.5:1 for large text)"
+    thresholds = (7.0, 4.5)
+
+
+@lru_cache(maxsize=4096)
+def parse_color(value: str) -> Optional[Tuple[float, float, float, float]]:
+    """Parse a computed CSS color (rgb/rgba) into (r, g, b, alpha)"""
+    match = re.fullmatch(r"rgba?\(\s*([\d.]+)[,\s]+([\d.]+)[,\s]+([\d.]+)(?:\s*[,/]\s*([\d.]+%?))?\s*\)", value.strip())
+    if not match:
+        return None
+    r, g, b = (float(match.group(i)) for i in (1, 2, 3))
+    alpha = match.group(4)
+    if alpha is None:
+        a = 1.0
+    elif alpha.endswith("%"):
+        a = float(alpha[:-1]) / 100
+    else:
+        a = float(alpha)
+    return r, g, b, a
+
+
+def _luminance(r: float, g: float, b: float) -> float:
+    def channel(c: float) -> float:
+        c /= 255
+        return c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4
+    return 0.2126 * channel(r) + 0.7152 * channel(g) + 0.0722 * channel(b)
+
+
+@lru_cache(maxsize=4096)
+def contrast_ratio(foreground: str, background: str) -> Optional[float]:
+    """
+    WCAG contrast ratio of two computed colors.
+
+    Semi-transparent colors are blended over white (backgrounds) or over the
+    background (text). Returns None when a color cannot be evaluated, e.g.
+    text over a background image.
+    """
+    fg, bg = parse_color(foreground), parse_color(background)
+    if fg is None or bg is None:
+        return None
+    bg_rgb = tuple(c * bg[3] + 255 * (1 - bg[3]) for c in bg[:3])
+    fg_rgb = tuple(c * fg[3] + b * (1 - fg[3]) for c, b in zip(fg[:3], bg_rgb))
+    lighter, darker = sorted((_luminance(*fg_rgb), _luminance(*bg_rgb)), reverse=True)
+    return (lighter + 0.05) / (darker + 0.05)
+
+
+class RuleEngine:
+    """
+    Runs every accessibility rule in a single walk of the document.
+
+    Rules are indexed by the tags and attribute names they subscribe to, so
+    each element is only handed to the rules that concern it.
+    """
+
+    def __init__(self, rules: Iterable[Rule]):
+        self.rules = list(rules)
+        self.by_tag: Dict[str, List[Rule]] = {}
+        self.by_attribute: Dict[str, List[Rule]] = {}
+        self.aria_rules: List[Rule] = []
+        for rule in self.rules:
+            for tag in rule.tags:
+                self.by_tag.setdefault(tag, []).append(rule)
+            for attribute in rule.attributes:
+                if attribute == "aria-*":
+                    self.aria_rules.append(rule)
+                else:
+                    self.by_attribute.setdefault(attribute, []).append(rule)
+        self.style_rules = [rule for rule in self.rules if isinstance(rule, ColorContrast)]
+
+    def audit(self, tree: lxml.html.HtmlElement, text_styles: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Audit a parsed document.
+
+        Args:
+            tree: The document root
+            text_styles: Bulk text style extraction of the rendered page
+                (TEXT_STYLES_SCRIPT); contrast is not checked without it
+
+        Returns:
+            Score, conformance per WCAG level, issues and audit statistics
+        """
+        started = time.process_time()
+        audit = Audit()
+        by_tag, by_attribute, aria_rules = self.by_tag, self.by_attribute, self.aria_rules
+        nodes = 0
+
+        for element in tree.iter():
+            tag = element.tag
+            if not isinstance(tag, str):
+                continue
+            nodes += 1
+            if not nodes % CHECKPOINT_NODES:
+                checkpoint()
+            for rule in by_tag.get(tag, ()):
+                rule.visit(element, audit)
+            attrib = element.attrib
+            if attrib:
+                aria = False
+                for name in attrib:
+                    for rule in by_attribute.get(name, ()):
+                        # Rules subscribed to the tag as well already saw it
+                        if tag not in rule.tags:
+                            rule.visit(element, audit)
+                    if not aria and name.startswith("aria-"):
+                        aria = True
+                if aria:
+                    for rule in aria_rules:
+                        rule.visit(element, audit)
+
+        for rule in self.rules:
+            rule.finish(audit)
+
+        if text_styles and text_styles.get("groups") is not None:
+            for rule in self.style_rules:
+                rule.check_styles(text_styles["groups"], audit)
+        else:
+            audit.not_checked.extend(rule.id for rule in self.style_rules)
+
+        return self._report(audit, nodes, time.process_time() - started, text_styles)
+
+    def _report(self, audit: Audit, nodes: int, cpu_seconds: float,
+                text_styles: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        applicable = [rule for rule in self.rules if rule.id in audit.applicable]
+        passed = [rule for rule in applicable if rule.id not in audit.failures]
+
+        total_weight = sum(IMPACT_WEIGHTS[rule.impact] for rule in applicable)
+        score = round(100 * sum(IMPACT_WEIGHTS[rule.impact] for rule in passed) / total_weight) if total_weight else 100
+
+        compliance = {}
+        for name, levels in LEVELS.items():
+            at_level = [rule for rule in applicable if rule.level in levels]
+            compliance[name] = round(100 * sum(1 for rule in at_level if rule in passed) / len(at_level)) \
+                if at_level else 100
+
+        issues = [
+            {
+                "type": IMPACT_ISSUE_TYPES[rule.impact],
+                "rule": rule.id,
+                "wcag": rule.wcag,
+                "level": rule.level,
+                "impact": rule.impact,
+                "message": rule.message,
+                "elements": audit.failures[rule.id],
+                "examples": audit.examples.get(rule.id, []),
+            }
+            for rule in sorted(applicable, key=lambda r: -IMPACT_WEIGHTS[r.impact])
+            if rule.id in audit.failures
+        ]
+
+        return {
+            "score": score,
+            "wcag_compliance": compliance,
+            "issues": issues,
+            "rules": {"applicable": len(applicable), "passed": len(passed), "not_checked": audit.not_checked},
+            "stats": {
+                "nodes": nodes,
+                "text_elements": (text_styles or {}).get("elements"),
+                "cpu_ms": round(cpu_seconds * 1000, 1),
+            },
+        }
+
+
+# Process-wide rule engine with all built-in rules
+rule_engine = RuleEngine([
+    ImageAlt(), InputImageAlt(), AreaAlt(), FormLabel(), ButtonName(), LinkName(), DocumentTitle(), HtmlLang(),
+    HeadingOrder(), EmptyHeading(), MainLandmark(), ListStructure(), FrameTitle(), MetaViewport(), MetaRefresh(),
+    BlinkMarquee(), DuplicateId(), AriaRole(), AriaAttribute(), AriaHiddenFocus(), PositiveTabindex(),
+    ColorContrast(), ColorContrastEnhanced(),
+])
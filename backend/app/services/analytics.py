@@ -0,0 +1,396 @@
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from loguru import logger
+from sqlalchemy import Date, DateTime, Float, Index, Integer, String, func, select
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.services.database import Base, SessionLocal, WriteSession, init_db
+from app.services.task_store import TaskRecord, task_store
+
+# Task fields the index is built from
+ANALYTICS_FIELDS = ["url", "status", "completed_at", "summary", "results"]
+
+# Result values indexed besides the summary scores: metric name -> (module, key)
+RESULT_METRICS = {
+    "first_contentful_paint": ("performance", "first_contentful_paint"),
+    "largest_contentful_paint": ("performance", "largest_contentful_paint"),
+    "cumulative_layout_shift": ("performance", "cumulative_layout_shift"),
+    "total_blocking_time": ("performance", "total_blocking_time"),
+    "co2_per_visit": ("carbon", "co2_per_visit"),
+    "transfer_size": ("carbon", "transfer_size"),
+}
+
+# Time buckets aggregates can be grouped by ("all" is a single bucket)
+BUCKETS = ("day", "week", "month", "all")
+
+# Issue keys are the issue's rule, or its message for rules without an ID
+ISSUE_KEY_LENGTH = 255
+
+# Tasks indexed per transaction when backfilling
+BACKFILL_CHUNK = 200
+
+
+class AnalyticsTask(Base):
+    """A task included in the analytics index (guards against counting it twice)"""
+
+    __tablename__ = "analytics_tasks"
+
+    task_id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    domain: Mapped[str] = mapped_column(String(255))
+    day: Mapped[date] = mapped_column(Date, index=True)
+    completed_at: Mapped[datetime] = mapped_column(DateTime)
+
+
+class AnalyticsMetric(Base):
+    """One metric of one completed task"""
+
+    __tablename__ = "analytics_metrics"
+
+    task_id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    metric: Mapped[str] = mapped_column(String(64), primary_key=True)
+    domain: Mapped[str] = mapped_column(String(255))
+    day: Mapped[date] = mapped_column(Date)
+    value: Mapped[float] = mapped_column(Float)
+
+    __table_args__ = (
+        Index("ix_analytics_metrics_metric_day", "metric", "day"),
+        Index("ix_analytics_metrics_domain_metric_day", "domain", "metric", "day"),
+    )
+
+
+class AnalyticsIssue(Base):
+    """One issue found by one completed task, with the pages it affects"""
+
+    __tablename__ = "analytics_issues"
+
+    task_id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    module: Mapped[str] = mapped_column(String(32), primary_key=True)
+    issue: Mapped[str] = mapped_column(String(ISSUE_KEY_LENGTH), primary_key=True)
+    domain: Mapped[str] = mapped_column(String(255))
+    day: Mapped[date] = mapped_column(Date)
+    type: Mapped[str] = mapped_column(String(16))
+    pages: Mapped[int] = mapped_column(Integer)
+
+    __table_args__ = (
+        Index("ix_analytics_issues_module_issue_day", "module", "issue", "day"),
+        Index("ix_analytics_issues_domain_day", "domain", "day"),
+    )
+
+
+class DailyMetric(Base):
+    """Running totals of a metric per day and domain"""
+
+    __tablename__ = "analytics_daily_metrics"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    domain: Mapped[str] = mapped_column(String(255), primary_key=True)
+    metric: Mapped[str] = mapped_column(String(64), primary_key=True)
+    week: Mapped[date] = mapped_column(Date)
+    month: Mapped[date] = mapped_column(Date)
+    count: Mapped[int] = mapped_column(Integer)
+    total: Mapped[float] = mapped_column(Float)
+    minimum: Mapped[float] = mapped_column(Float)
+    maximum: Mapped[float] = mapped_column(Float)
+
+    __table_args__ = (
+        Index("ix_analytics_daily_metrics_metric_day", "metric", "day"),
+        Index("ix_analytics_daily_metrics_domain_metric_day", "domain", "metric", "day"),
+    )
+
+
+class DailyIssue(Base):
+    """Running totals of an issue per day and domain"""
+
+    __tablename__ = "analytics_daily_issues"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    domain: Mapped[str] = mapped_column(String(255), primary_key=True)
+    module: Mapped[str] = mapped_column(String(32), primary_key=True)
+    issue: Mapped[str] = mapped_column(String(ISSUE_KEY_LENGTH), primary_key=True)
+    week: Mapped[date] = mapped_column(Date)
+    month: Mapped[date] = mapped_column(Date)
+    type: Mapped[str] = mapped_column(String(16))
+    message: Mapped[str] = mapped_column(String(1024))
+    tasks: Mapped[int] = mapped_column(Integer)
+    pages: Mapped[int] = mapped_column(Integer)
+
+    __table_args__ = (
+        Index("ix_analytics_daily_issues_module_day", "module", "day"),
+        Index("ix_analytics_daily_issues_domain_day", "domain", "day"),
+    )
+
+
+def task_metrics(task: Dict[str, Any]) -> Dict[str, float]:
+    """The indexed metrics of a completed task"""
+    summary = task.get("summary") or {}
+    metrics = {}
+    scores = summary.get("metrics") or {}
+    if scores:
+        metrics["overall"] = summary.get("overall_score", 0)
+    metrics.update(scores)
+
+    results = task.get("results") or {}
+    for name, (module, key) in RESULT_METRICS.items():
+        result = results.get(module) or {}
+        value = result.get(key, (result.get("metrics") or {}).get(key))
+        if value is not None:
+            metrics[name] = value
+    return {name: float(value) for name, value in metrics.items() if isinstance(value, (int, float))}
+
+
+def task_issues(task: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The issues of a completed task, merged across its audited pages"""
+    issues = {}
+    for finding in (task.get("summary") or {}).get("findings", []):
+        key = (finding.get("rule") or finding["message"])[:ISSUE_KEY_LENGTH]
+        issues[(finding["category"], key)] = {
+            "module": finding["category"],
+            "issue": key,
+            "type": finding["type"],
+            "message": finding["message"][:1024],
+            "pages": finding.get("pages", 1),
+        }
+    return list(issues.values())
+
+
+def _bucket_start(day: date, bucket: str) -> date:
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+class AnalyticsIndex:
+    """
+    Cross-task analytics over completed audits.
+
+    When a task completes, its scores and metrics are written as one row per
+    metric and its findings as one row per issue, and the daily rollups per
+    domain are updated in the same transaction. Aggregate queries read the
+    rollups, whose size depends on days x domains rather than on the number
+    of audits, so dashboards stay fast however many audits are stored.
+    Rollups carry the week and month of their day so any bucket size is a
+    plain GROUP BY; time filters therefore have day granularity.
+    """
+
+    def __init__(self):
+        self._schema_ready = False
+
+    def _ensure_schema(self):
+        if not self._schema_ready:
+            init_db()
+            self._schema_ready = True
+
+    async def record(self, task_id: str, task: Dict[str, Any]) -> bool:
+        """
+        Add a completed task to the index.
+
+        Returns:
+            False when the task was not completed or is already indexed
+        """
+        if task.get("status") != "completed":
+            return False
+        completed_at = datetime.fromisoformat(task["completed_at"]) if task.get("completed_at") else datetime.now()
+        domain = (urlsplit(task["url"]).hostname or "").lower()
+        return await asyncio.to_thread(self._record, task_id, domain, completed_at,
+                                       task_metrics(task), task_issues(task))
+
+    async def metrics(self, metrics: Optional[List[str]] = None, bucket: str = "day",
+                      group_by: Tuple[str, ...] = (), domain: Optional[str] = None,
+                      since: Optional[date] = None, until: Optional[date] = None,
+                      order: str = "bucket", limit: int = 100, offset: int = 0) -> Dict[str, Any]:
+        """
+        Aggregate metrics, e.g. the average SEO score per domain per month.
+
+        Args:
+            metrics: Metrics to include (all when omitted); rows are always per metric
+            bucket: day, week, month or all
+            group_by: Further grouping: "domain"
+            domain: Only this domain
+            since: First day included
+            until: Last day included
+            order: "bucket" (newest first), "average" (highest first) or "count"
+            limit: Page size
+            offset: Rows to skip
+
+        Returns:
+            {"items": [...], "total": number of rows, "limit": ..., "offset": ...}
+        """
+        return await asyncio.to_thread(self._metrics, metrics, bucket, group_by, domain, since, until,
+                                       order, limit, offset)
+
+    async def issues(self, modules: Optional[List[str]] = None, bucket: str = "all",
+                     group_by: Tuple[str, ...] = ("module", "issue"), domain: Optional[str] = None,
+                     since: Optional[date] = None, until: Optional[date] = None,
+                     order: str = "tasks", limit: int = 100, offset: int = 0) -> Dict[str, Any]:
+        """
+        Aggregate issues, e.g. the most recurring accessibility issues across all domains.
+
+        Args:
+            modules: Modules whose issues are included (all when omitted)
+            bucket: day, week, month or all
+            group_by: Any of "module", "issue" and "domain"
+            domain: Only this domain
+            since: First day included
+            until: Last day included
+            order: "tasks" (most affected audits first), "pages" or "bucket"
+            limit: Page size
+            offset: Rows to skip
+
+        Returns:
+            {"items": [...], "total": number of rows, "limit": ..., "offset": ...}
+        """
+        return await asyncio.to_thread(self._issues, modules, bucket, group_by, domain, since, until,
+                                       order, limit, offset)
+
+    async def backfill(self) -> int:
+        """Index completed tasks stored before the index existed; returns how many were added"""
+        added, skipped, after = 0, 0, ""
+        while True:
+            task_ids = await asyncio.to_thread(self._unindexed, after, BACKFILL_CHUNK)
+            if not task_ids:
+                if skipped:
+                    logger.warning(f"{skipped} completed tasks could not be added to the analytics index")
+                return added
+            # Tasks are visited once, in task ID order, whether or not they could be indexed
+            after = task_ids[-1]
+            for task_id in task_ids:
+                try:
+                    task = await task_store.get(task_id, fields=ANALYTICS_FIELDS)
+                    if task is not None and await self.record(task_id, task):
+                        added += 1
+                        continue
+                    logger.warning(f"Skipped task {task_id} while backfilling the analytics index")
+                except Exception as e:
+                    logger.error(f"Failed to index task {task_id} for analytics: {str(e)}")
+                skipped += 1
+            logger.info(f"Backfilled {added} tasks into the analytics index")
+
+    def _record(self, task_id: str, domain: str, completed_at: datetime,
+                metrics: Dict[str, float], issues: List[Dict[str, Any]]) -> bool:
+        self._ensure_schema()
+        day = completed_at.date()
+        week, month = _bucket_start(day, "week"), _bucket_start(day, "month")
+        with WriteSession.begin() as session:
+            if session.get(AnalyticsTask, task_id) is not None:
+                return False
+            session.add(AnalyticsTask(task_id=task_id, domain=domain, day=day, completed_at=completed_at))
+
+            for metric, value in metrics.items():
+                session.add(AnalyticsMetric(task_id=task_id, metric=metric, domain=domain, day=day, value=value))
+                rollup = session.get(DailyMetric, (day, domain, metric))
+                if rollup is None:
+                    session.add(DailyMetric(day=day, domain=domain, metric=metric, week=week, month=month,
+                                            count=1, total=value, minimum=value, maximum=value))
+                else:
+                    rollup.count += 1
+                    rollup.total += value
+                    rollup.minimum = min(rollup.minimum, value)
+                    rollup.maximum = max(rollup.maximum, value)
+
+            for issue in issues:
+                session.add(AnalyticsIssue(task_id=task_id, module=issue["module"], issue=issue["issue"],
+                                           domain=domain, day=day, type=issue["type"], pages=issue["pages"]))
+                rollup = session.get(DailyIssue, (day, domain, issue["module"], issue["issue"]))
+                if rollup is None:
+                    session.add(DailyIssue(day=day, domain=domain, module=issue["module"], issue=issue["issue"],
+                                           week=week, month=month, type=issue["type"], message=issue["message"],
+                                           tasks=1, pages=issue["pages"]))
+                else:
+                    rollup.tasks += 1
+                    rollup.pages += issue["pages"]
+        return True
+
+    def _metrics(self, metrics, bucket, group_by, domain, since, until, order, limit, offset) -> Dict[str, Any]:
+        self._ensure_schema()
+        keys = [DailyMetric.metric.label("metric")]
+        if bucket != "all":
+            keys.insert(0, getattr(DailyMetric, bucket).label("bucket"))
+        if "domain" in group_by:
+            keys.append(DailyMetric.domain.label("domain"))
+
+        count = func.sum(DailyMetric.count).label("count")
+        average = (func.sum(DailyMetric.total) / func.sum(DailyMetric.count)).label("average")
+        query = select(*keys, count, average, func.min(DailyMetric.minimum).label("min"),
+                       func.max(DailyMetric.maximum).label("max")).group_by(*keys)
+        if metrics:
+            query = query.where(DailyMetric.metric.in_(metrics))
+        query = self._filter(query, DailyMetric, domain, since, until)
+
+        orderings = {"average": [average.desc()], "count": [count.desc()]}
+        ordering = orderings.get(order, [])
+        if bucket != "all":
+            ordering.append(keys[0].desc())
+        return self._page(query, ordering + list(keys), limit, offset)
+
+    def _issues(self, modules, bucket, group_by, domain, since, until, order, limit, offset) -> Dict[str, Any]:
+        self._ensure_schema()
+        keys = []
+        if bucket != "all":
+            keys.append(getattr(DailyIssue, bucket).label("bucket"))
+        for column in ("module", "issue", "domain"):
+            if column in group_by:
+                keys.append(getattr(DailyIssue, column).label(column))
+
+        tasks = func.sum(DailyIssue.tasks).label("tasks")
+        pages = func.sum(DailyIssue.pages).label("pages")
+        columns = [*keys, tasks, pages]
+        if "issue" in group_by:
+            columns += [func.max(DailyIssue.message).label("message"), func.max(DailyIssue.type).label("type")]
+        query = select(*columns)
+        if keys:
+            query = query.group_by(*keys)
+        if modules:
+            query = query.where(DailyIssue.module.in_(modules))
+        query = self._filter(query, DailyIssue, domain, since, until)
+
+        orderings = {"tasks": [tasks.desc()], "pages": [pages.desc()]}
+        ordering = orderings.get(order, [])
+        if bucket != "all":
+            ordering.append(keys[0].desc())
+        return self._page(query, ordering + keys, limit, offset)
+
+    def _filter(self, query, table, domain, since, until):
+        if domain:
+            query = query.where(table.domain == domain.lower())
+        if since:
+            query = query.where(table.day >= since)
+        if until:
+            query = query.where(table.day <= until)
+        return query
+
+    def _page(self, query, ordering, limit: int, offset: int) -> Dict[str, Any]:
+        with SessionLocal() as session:
+            total = session.scalar(select(func.count()).select_from(query.subquery()))
+            rows = session.execute(query.order_by(*ordering).limit(limit).offset(offset))
+            items = []
+            for row in rows:
+                item = dict(row._mapping)
+                if isinstance(item.get("bucket"), date):
+                    item["bucket"] = item["bucket"].isoformat()
+                items.append(item)
+        return {"items": items, "total": total, "limit": limit, "offset": offset}
+
+    def _unindexed(self, after: str, limit: int) -> List[str]:
+        self._ensure_schema()
+        with SessionLocal() as session:
+            indexed = select(AnalyticsTask.task_id)
+            return list(session.scalars(
+                select(TaskRecord.task_id)
+                .where(TaskRecord.status == "completed", TaskRecord.task_id > after,
+                       TaskRecord.task_id.not_in(indexed))
+                .order_by(TaskRecord.task_id)
+                .limit(limit)
+            ))
+
+
+# Process-wide analytics index
+analytics_index = AnalyticsIndex()
+
+
+if __name__ == "__main__":
+    print(f"Indexed {asyncio.run(analytics_index.backfill())} tasks")
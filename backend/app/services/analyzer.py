@@ -1,13 +1,45 @@
 import uuid
 import asyncio
-import json
-from datetime import datetime
+import copy
+from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 from loguru import logger
 import os
 
-# In-memory storage for analysis results (in production, use a database)
-analysis_tasks = {}
+from app.services.accessibility import TEXT_STYLES_SCRIPT, rule_engine
+from app.services.analytics import analytics_index
+from app.services.asset_cache import asset_cache
+from app.services.batches import batch_store
+from app.services.browser_pool import browser_pool
+from app.services.cancellation import CANCELLED, TIMED_OUT, AnalysisCancelled, CancelScope
+from app.services.carbon import measure_carbon
+from app.services.crawler import Crawler
+from app.services.events import MODULE, PAGE, STATUS, event_log
+from app.services.fingerprints import fingerprint_engine, group_by_category
+from app.services.job_queue import ATTACHED, CANCELLING, QUEUED, QueueFull, job_queue
+from app.services.performance import PERF_MODULE_TIMEOUT, measure_performance, minification_opportunities
+from app.services.result_cache import result_cache
+from app.services.scheduler import ModuleScheduler
+from app.services.sitemaps import SITEMAP_SAMPLING, SitePlan, plan_site
+from app.services.snapshot import PageSnapshot, fetch_snapshot
+from app.services.task_store import task_store
+from app.services.telemetry import metrics, span, trace
+
+# Registry of analysis modules and the inputs they depend on
+scheduler = ModuleScheduler()
+
+# Task fields copied from a shared execution to the tasks that joined it
+SHARED_FIELDS = ("results", "cache", "pages", "crawl", "sampling")
+
+# How many crawled pages are analyzed at the same time
+CRAWL_ANALYSIS_CONCURRENCY = int(os.getenv("CRAWL_ANALYSIS_CONCURRENCY", 8))
+
+# Render pages to check text contrast (accessibility falls back to the
+# static rules when disabled or when the browser is unavailable)
+ACCESSIBILITY_RENDER = os.getenv("ACCESSIBILITY_RENDER", "true").lower() != "false"
+
+# External scripts of a page scanned for technology fingerprints
+TECH_MAX_SCRIPTS = int(os.getenv("TECH_MAX_SCRIPTS", 20))
 
 
 class WebsiteAnalyzer:
@@ -19,27 +51,42 @@ class WebsiteAnalyzer:
     def __init__(self):
         """Initialize the analyzer with default configuration"""
         # In a real app, load configuration from settings
-        self.storage_dir = os.path.join("data", "analysis_results")
-        os.makedirs(self.storage_dir, exist_ok=True)
+        self.task_store = task_store
+        # Cancellation scopes of the analyses running in this process
+        self._scopes: Dict[str, CancelScope] = {}
 
-    async def start_analysis(self, url: str, modules: List[str], depth: int = 1, device: str = "desktop") -> str:
+    async def start_analysis(self, url: str, modules: List[str], depth: int = 1, device: str = "desktop",
+                             priority: int = 0, batch_id: Optional[str] = None,
+                             deadline: Optional[float] = None, task_id: Optional[str] = None) -> str:
         """
         Start a new analysis task and return the task ID.
         
+        The task is queued for the worker pool; if an identical audit is
+        already queued or running, the task joins it instead.
+        
         Args:
             url: The URL to analyze
             modules: List of analysis modules to run
-            depth: How many pages to crawl (1 = just the homepage)
+            depth: How many link levels to crawl (1 = just the homepage)
             device: Device profile (desktop/mobile)
+            priority: Queue priority (higher runs first)
+            batch_id: The batch the task belongs to, if any
+            deadline: Seconds after which the analysis is stopped as "timed_out"
+            task_id: ID to create the task under (generated when omitted)
             
         Returns:
             A unique task ID for tracking the analysis
+            
+        Raises:
+            QueueFull: When the analysis queue is saturated or too deep to
+                start the analysis before its deadline
         """
-        task_id = str(uuid.uuid4())
+        task_id = task_id or str(uuid.uuid4())
         timestamp = datetime.now().isoformat()
         
         # Create task entry
-        analysis_tasks[task_id] = {
+        task = {
+            "task_id": task_id,
             "status": "pending",
             "url": url,
             "modules": modules,
@@ -49,114 +96,420 @@ class WebsiteAnalyzer:
             "results": {},
             "started_at": timestamp
         }
+        if batch_id:
+            task["batch_id"] = batch_id
+        if deadline:
+            task["deadline"] = (datetime.fromisoformat(timestamp) + timedelta(seconds=deadline)).isoformat()
+        
+        await self.task_store.create(task_id, task)
+        await event_log.publish(task_id, STATUS, {"status": "pending"})
         
-        logger.info(f"Analysis task {task_id} created for URL: {url}")
+        try:
+            leader_id = await job_queue.enqueue(task_id, task, priority, deadline)
+        except QueueFull:
+            task["status"] = "rejected"
+            await self.task_store.save(task_id, task)
+            await event_log.publish(task_id, STATUS, {"status": "rejected"})
+            raise
+        
+        if leader_id:
+            logger.info(f"Analysis task {task_id} for URL {url} joined running task {leader_id}")
+        else:
+            logger.info(f"Analysis task {task_id} created for URL: {url}")
         return task_id
 
     async def run_analysis(self, task_id: str):
         """
         Run the full analysis for a given task ID.
-        This method will be executed as a background task.
+        This method is executed by a queue worker.
         
         Args:
             task_id: The ID of the analysis task to run
         """
-        if task_id not in analysis_tasks:
+        task = await self.task_store.get(task_id)
+        if task is None:
             logger.error(f"Task {task_id} not found")
             return
-            
-        task = analysis_tasks[task_id]
-        task["status"] = "running"
+
+        # The run can be stopped through its scope (see cancel); a task whose
+        # deadline passed while it was queued is shed without starting it
+        scope = self._scopes[task_id] = CancelScope()
+        timer = None
+        if task.get("deadline"):
+            remaining = (datetime.fromisoformat(task["deadline"]) - datetime.now()).total_seconds()
+            if remaining > 0:
+                timer = asyncio.get_running_loop().call_later(
+                    remaining, scope.cancel, TIMED_OUT, "Analysis did not finish before its deadline"
+                )
+            else:
+                scope.cancel(TIMED_OUT, "Deadline passed before the analysis started")
+
+        if not scope.cancelled:
+            # A task already marked running was claimed before by a worker that
+            # died; the module results it stored are kept and not recomputed
+            resumed = task["status"] == "running"
+            task["status"] = "running"
+            await self.task_store.save(task_id, task)
+            await event_log.publish(task_id, STATUS, {"status": "running", "resumed": resumed})
+            if resumed:
+                logger.info(f"Resuming analysis for task {task_id} ({task['url']}), "
+                            f"{len(task['results'])} modules already done")
+            else:
+                logger.info(f"Starting analysis for task {task_id} ({task['url']})")
+
+        with trace() as timings:
+            try:
+                with span("task", "analysis"):
+                    await scope.run(self._execute(task_id, task))
+
+                # Generate summary and finalize
+                task["summary"] = self._generate_summary(task["results"], task.get("pages"), task["url"])
+                task["status"] = "completed"
+                task["completed_at"] = datetime.now().isoformat()
+
+            except AnalysisCancelled as e:
+                # Keep the results of the modules that finished
+                logger.warning(f"Analysis task {task_id} stopped: {str(e)}")
+                task["status"] = e.status
+                task["error"] = str(e)
+                task["summary"] = self._generate_summary(task["results"], task.get("pages"), task["url"])
+                task["completed_at"] = datetime.now().isoformat()
+
+            except Exception as e:
+                logger.error(f"Error in analysis task {task_id}: {str(e)}")
+                task["status"] = "error"
+                task["error"] = str(e)
+
+            finally:
+                if timer is not None:
+                    timer.cancel()
+                self._scopes.pop(task_id, None)
+
+            # Persist the final results with where the time went
+            task["timings"] = timings.to_dict()
+            metrics.inc("audit_tasks_total", status=task["status"])
+            await self._finalize(task_id, task)
+            if task["status"] == "completed":
+                logger.info(f"Analysis completed for task {task_id} in {task['timings']['total_ms']:.0f} ms")
+
+    def cancel(self, task_id: str, status: str = CANCELLED, reason: str = "Analysis cancelled") -> bool:
+        """
+        Stop an analysis running in this process.
+
+        The run is interrupted right away, so its browser contexts and
+        connections are released; the task is then finalized with ``status``
+        and the results of the modules that already finished.
+
+        Returns:
+            False when the task is not running here or already stopping
+        """
+        scope = self._scopes.get(task_id)
+        return scope is not None and scope.cancel(status, reason)
+
+    async def cancel_analysis(self, task_id: str) -> Optional[str]:
+        """
+        Cancel an analysis wherever it is queued or running.
+
+        Waiting tasks are cancelled immediately; a running task is flagged
+        for the worker executing it, which stops it at its next cancellation
+        check.
+
+        Args:
+            task_id: The ID of the analysis task
+
+        Returns:
+            "cancelled" or "cancelling", or None when the task is neither
+            waiting nor running
+        """
+        previous = await job_queue.cancel(task_id)
+        if previous is None:
+            return None
+        if previous in (QUEUED, ATTACHED):
+            await self.cancel_task(task_id, "Analysis cancelled before it started")
+            return CANCELLED
+        logger.info(f"Requested cancellation of running task {task_id}")
+        return CANCELLING
+
+    async def cancel_task(self, task_id: str, reason: str, status: str = CANCELLED):
+        """
+        Mark a task that is not executing as stopped, keeping the results it has.
+
+        Args:
+            task_id: The ID of the analysis task
+            reason: Message stored on the task
+            status: "cancelled" or "timed_out"
+        """
+        task = await self.task_store.get(task_id)
+        if task is None:
+            return
+        task["status"] = status
+        task["error"] = reason
+        task["completed_at"] = datetime.now().isoformat()
+        if task.get("results"):
+            task["summary"] = self._generate_summary(task["results"], task.get("pages"), task["url"])
+        metrics.inc("audit_tasks_total", status=status)
+        await self._finalize(task_id, task)
+
+    async def fail_task(self, task_id: str, reason: str):
+        """
+        Mark a task that can no longer be executed as failed.
         
-        try:
-            logger.info(f"Starting analysis for task {task_id} ({task['url']})")
-            
-            # Run each requested analysis module
-            for module_name in task["modules"]:
-                try:
-                    logger.info(f"Running module '{module_name}' for task {task_id}")
-                    
-                    # Call appropriate analyzer based on module name
-                    if module_name == "performance":
-                        results = await self._analyze_performance(task["url"], task["device"])
-                    elif module_name == "seo":
-                        results = await self._analyze_seo(task["url"], task["depth"])
-                    elif module_name == "accessibility":
-                        results = await self._analyze_accessibility(task["url"])
-                    elif module_name == "technology":
-                        results = await self._analyze_technology_stack(task["url"])
-                    elif module_name == "carbon":
-                        results = await self._analyze_carbon_emissions(task["url"])
-                    else:
-                        logger.warning(f"Unknown module '{module_name}', skipping")
-                        continue
-                        
-                    task["results"][module_name] = results
-                    
-                except Exception as e:
-                    logger.error(f"Error in module '{module_name}' for task {task_id}: {str(e)}")
-                    task["results"][module_name] = {"error": str(e)}
-            
-            # Generate summary and finalize
-            task["summary"] = self._generate_summary(task["results"])
-            task["status"] = "completed"
-            task["completed_at"] = datetime.now().isoformat()
-            
-            # Store results to disk
-            self._save_results(task_id, task)
-            
-            logger.info(f"Analysis completed for task {task_id}")
-            
-        except Exception as e:
-            logger.error(f"Error in analysis task {task_id}: {str(e)}")
-            task["status"] = "error"
-            task["error"] = str(e)
+        Args:
+            task_id: The ID of the analysis task
+            reason: Error message stored on the task
+        """
+        task = await self.task_store.get(task_id)
+        if task is None:
+            return
+        task["status"] = "error"
+        task["error"] = reason
+        await self._finalize(task_id, task)
 
-    async def get_analysis_results(self, task_id: str) -> Optional[Dict[str, Any]]:
+    async def share_results(self, task_id: str, leader: Dict[str, Any]):
         """
-        Get the results of a specific analysis task
+        Complete a task that joined another task's execution.
+        
+        Args:
+            task_id: The ID of the joined task
+            leader: The finished task document whose results are shared
+        """
+        task = await self.task_store.get(task_id)
+        if task is None:
+            logger.error(f"Task {task_id} not found")
+            return
+        
+        task["shared_from"] = leader["task_id"]
+        for field in SHARED_FIELDS + ("summary", "status", "error", "completed_at"):
+            if field in leader:
+                task[field] = copy.deepcopy(leader[field])
+        for module_name, result in task.get("results", {}).items():
+            await event_log.publish(task_id, MODULE, {"module": module_name, "result": result})
+        await self._finalize(task_id, task)
+        logger.info(f"Task {task_id} completed with the results of task {leader['task_id']}")
+
+    async def _finalize(self, task_id: str, task: Dict[str, Any]):
+        """Persist a task that reached a final status, notify its subscribers and batch and index its results"""
+        await self.task_store.save(task_id, task)
+        await event_log.publish(task_id, STATUS, {
+            "status": task["status"],
+            "error": task.get("error"),
+            "summary": task.get("summary"),
+            "completed_at": task.get("completed_at")
+        })
+        if task.get("batch_id"):
+            try:
+                await batch_store.item_finished(task_id)
+            except Exception as e:
+                logger.error(f"Failed to record batch progress of task {task_id}: {str(e)}")
+        if task["status"] == "completed":
+            try:
+                await analytics_index.record(task_id, task)
+            except Exception as e:
+                logger.error(f"Failed to index task {task_id} for analytics: {str(e)}")
+
+    async def _execute(self, task_id: str, task: Dict[str, Any]):
+        """
+        Run the requested modules for a task, storing results on the task.
         
         Args:
             task_id: The ID of the analysis task
+            task: The task document, updated in place
+        """
+        # Run the requested modules concurrently; each result is stored
+        # as soon as its module finishes
+        async def store_result(module_name: str, results: Dict[str, Any]):
+            task["results"][module_name] = results
+            await self.task_store.save_module_result(task_id, module_name, results)
+            await event_log.publish(task_id, MODULE, {"module": module_name, "result": results})
+            logger.info(f"Module '{module_name}' finished for task {task_id}")
+
+        values = {"url": task["url"], "device": task["device"], "depth": task["depth"]}
+
+        # Reuse cached results of a recent audit of the same page where possible,
+        # and results of modules whose inputs did not change since
+        pending = [m for m in task["modules"] if m not in task["results"]]
+        dependencies = scheduler.dependencies(task["modules"])
+        cached, snapshot = await result_cache.lookup(task["url"], pending, task["device"], task["depth"], dependencies)
+        task["cache"] = {}
+        for module_name in task["modules"]:
+            if module_name not in pending:
+                task["cache"][module_name] = "resumed"
+            elif module_name in cached:
+                task["cache"][module_name], task["results"][module_name] = cached[module_name]
+            else:
+                task["cache"][module_name] = "miss"
+        modules = [m for m in pending if m not in cached]
+        if snapshot is not None:
+            await asyncio.to_thread(lambda: snapshot.tree)
+            values["snapshot"] = snapshot
+
+        plan = await self._plan_site(task["url"]) if task["depth"] > 1 else None
+        if plan is not None:
+            snapshot = await self._run_sampled(task, modules, values, store_result, plan)
+        elif task["depth"] > 1:
+            snapshot = await self._run_crawl(task, modules, values, store_result)
+        else:
+            inputs = await scheduler.run(self, modules, values=values, on_result=store_result)
+            snapshot = inputs.get("snapshot", snapshot)
+
+        await result_cache.store(
+            task["url"], task["device"], task["depth"],
+            {m: task["results"][m] for m in modules if m in task["results"]},
+            snapshot,
+            dependencies
+        )
+
+    async def _run_crawl(self, task: Dict[str, Any], modules: List[str], values: Dict[str, Any],
+                         store_result) -> PageSnapshot:
+        """
+        Crawl the site up to the task depth, analyzing pages as they arrive.
+        
+        The start page runs ``modules``; every further page runs the per-page
+        modules and its results are stored under task["pages"].
+        
+        Args:
+            task: The task being analyzed
+            modules: Modules to run on the start page
+            values: Plain scheduler inputs for the start page
+            store_result: Callback storing start page module results
             
         Returns:
-            The analysis results or status information
+            The snapshot of the start page
         """
-        if task_id not in analysis_tasks:
-            # Try to load from storage
-            loaded_task = self._load_results(task_id)
-            if loaded_task:
-                return loaded_task
-            return None
-            
-        return analysis_tasks[task_id]
+        crawler = Crawler(task["url"], depth=task["depth"])
+        pages = crawler.crawl()
+        page_modules = scheduler.per_page_modules(task["modules"])
+        semaphore = asyncio.Semaphore(CRAWL_ANALYSIS_CONCURRENCY)
+        task["pages"] = []
+
+        async def analyze_page(snapshot: PageSnapshot, depth: int):
+            entry = {"url": snapshot.final_url, "depth": depth, "status_code": snapshot.status_code, "results": {}}
+            task["pages"].append(entry)
+            try:
+                await asyncio.to_thread(lambda: snapshot.tree)
+                await scheduler.run(
+                    self,
+                    page_modules,
+                    values={**values, "url": snapshot.final_url, "snapshot": snapshot},
+                    on_result=lambda name, result: entry["results"].__setitem__(name, result)
+                )
+            finally:
+                semaphore.release()
+            await event_log.publish(task["task_id"], PAGE, entry)
+
+        # The crawler yields the start page first and raises if it cannot be fetched
+        first = await pages.__anext__()
+        await asyncio.to_thread(lambda: first[0].tree)
 
-    def _save_results(self, task_id: str, task: Dict[str, Any]):
-        """Save analysis results to disk"""
+        start_page = asyncio.create_task(
+            scheduler.run(self, modules, values={**values, "snapshot": first[0]}, on_result=store_result)
+        )
+        page_jobs = []
         try:
-            filename = os.path.join(self.storage_dir, f"{task_id}.json")
-            with open(filename, 'w') as f:
-                json.dump(task, f, indent=2)
-        except Exception as e:
-            logger.error(f"Failed to save results for task {task_id}: {str(e)}")
+            # A page is only pulled once an analysis slot is free, so the
+            # crawl cannot run ahead of analysis and pile up snapshots
+            while True:
+                await semaphore.acquire()
+                try:
+                    snapshot, depth = await pages.__anext__()
+                except StopAsyncIteration:
+                    semaphore.release()
+                    break
+                page_jobs.append(asyncio.create_task(analyze_page(snapshot, depth)))
+            await asyncio.gather(start_page, *page_jobs)
+        finally:
+            for job in [start_page, *page_jobs]:
+                job.cancel()
+            await pages.aclose()
+
+        task["crawl"] = crawler.stats
+        return first[0]
 
-    def _load_results(self, task_id: str) -> Optional[Dict[str, Any]]:
-        """Load analysis results from disk"""
+    async def _plan_site(self, url: str) -> Optional[SitePlan]:
+        """The template plan of the site when it is too large to crawl, otherwise None"""
+        if not SITEMAP_SAMPLING:
+            return None
         try:
-            filename = os.path.join(self.storage_dir, f"{task_id}.json")
-            if os.path.exists(filename):
-                with open(filename, 'r') as f:
-                    return json.load(f)
+            with span("fetch", "sitemap"):
+                return await plan_site(url)
         except Exception as e:
-            logger.error(f"Failed to load results for task {task_id}: {str(e)}")
-        return None
+            logger.warning(f"Could not read the sitemaps of {url}, crawling instead: {str(e)}")
+            return None
 
-    def _generate_summary(self, results: Dict[str, Any]) -> Dict[str, Any]:
+    async def _run_sampled(self, task: Dict[str, Any], modules: List[str], values: Dict[str, Any],
+                           store_result, plan: SitePlan) -> PageSnapshot:
+        """
+        Audit one representative page per template of a large site.
+        
+        The start page runs ``modules``; every template representative runs
+        the full module set and its results are stored under task["pages"]
+        together with the number of pages of the site it stands for.
+        
+        Args:
+            task: The task being analyzed
+            modules: Modules to run on the start page
+            values: Plain scheduler inputs for the start page
+            store_result: Callback storing start page module results
+            plan: Templates of the site with their representatives
+            
+        Returns:
+            The snapshot of the start page
+        """
+        snapshot = values.get("snapshot") or await fetch_snapshot(task["url"])
+        await asyncio.to_thread(lambda: snapshot.tree)
+        semaphore = asyncio.Semaphore(CRAWL_ANALYSIS_CONCURRENCY)
+        task["pages"] = []
+        task["sampling"] = plan.to_dict()
+
+        async def analyze_template(template):
+            representative = template.representative
+            entry = {
+                "url": representative.final_url,
+                "status_code": representative.status_code,
+                "template": template.id,
+                "represents": template.pages,
+                "results": {},
+            }
+            task["pages"].append(entry)
+            async with semaphore:
+                await scheduler.run(
+                    self,
+                    task["modules"],
+                    values={**values, "url": representative.final_url, "snapshot": representative},
+                    on_result=lambda name, result: entry["results"].__setitem__(name, result)
+                )
+            await event_log.publish(task["task_id"], PAGE, entry)
+
+        await asyncio.gather(
+            scheduler.run(self, modules, values={**values, "snapshot": snapshot}, on_result=store_result),
+            *(analyze_template(template) for template in plan.templates)
+        )
+        return snapshot
+
+    async def get_analysis_results(self, task_id: str, fields: Optional[List[str]] = None,
+                                   modules: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get the results of a specific analysis task
+        
+        Args:
+            task_id: The ID of the analysis task
+            fields: Top-level fields to return (all when omitted)
+            modules: Module results to return (all when omitted)
+            
+        Returns:
+            The analysis results or status information
+        """
+        return await self.task_store.get(task_id, fields=fields, modules=modules)
+
+    def _generate_summary(self, results: Dict[str, Any], pages: Optional[List[Dict[str, Any]]] = None,
+                          url: Optional[str] = None) -> Dict[str, Any]:
         """
         Generate a summary of the analysis results
         
         Args:
             results: The complete analysis results
+            pages: Further audited pages (crawled pages or template representatives)
+            url: The URL of the start page
             
         Returns:
             A summary of key metrics and findings
@@ -207,7 +560,7 @@ class WebsiteAnalyzer:
         if "performance" in results and "metrics" in results["performance"]:
             perf_metrics = results["performance"]["metrics"]
             
-            if "first_contentful_paint" in perf_metrics and perf_metrics["first_contentful_paint"] > 2000:
+            if (perf_metrics.get("first_contentful_paint") or 0) > 2000:
                 summary["recommendations"].append({
                     "category": "performance",
                     "priority": "important",
@@ -215,202 +568,262 @@ class WebsiteAnalyzer:
                     "description": "First Contentful Paint is too slow. Consider optimizing server response time and critical rendering path."
                 })
                 summary["issues"]["important"] += 1
-                
+                summary["recommendations"][-1]["pages"] = 1
+
+        # Issues found on the audited pages; on sampled sites every template
+        # representative stands for all the pages of its template
+        pages = pages or []
+        summary["pages"] = {
+            "audited": 1 + len(pages),
+            "represented": 1 + sum(page.get("represents", 1) for page in pages),
+        }
+        summary["findings"] = self._collect_findings([({"url": url}, results)] +
+                                                     [(page, page.get("results", {})) for page in pages])
         return summary
 
+    def _collect_findings(self, audited: List[Any]) -> List[Dict[str, Any]]:
+        """
+        Merge the issues of several pages, counting the pages each one affects
+        
+        Args:
+            audited: (page entry, module results) pairs
+            
+        Returns:
+            Findings with the number of pages they represent, most widespread first
+        """
+        findings: Dict[Any, Dict[str, Any]] = {}
+        for page, page_results in audited:
+            for category in ("seo", "accessibility"):
+                for issue in (page_results.get(category) or {}).get("issues", []):
+                    key = (category, issue.get("rule") or issue["message"])
+                    finding = findings.get(key)
+                    if finding is None:
+                        finding = findings[key] = {
+                            "category": category,
+                            "type": issue["type"],
+                            "message": issue["message"],
+                            "pages": 0,
+                            "audited_pages": 0,
+                            "examples": [],
+                        }
+                        if issue.get("rule"):
+                            finding["rule"] = issue["rule"]
+                    finding["pages"] += page.get("represents", 1)
+                    finding["audited_pages"] += 1
+                    if len(finding["examples"]) < 3 and page.get("url"):
+                        finding["examples"].append(page["url"])
+        return sorted(findings.values(), key=lambda f: (-f["pages"], f["category"], f["message"]))
+
+    @scheduler.input("snapshot", requires=("url",))
+    async def _snapshot_input(self, url: str) -> PageSnapshot:
+        """
+        Fetch and parse the page once for every module that needs its HTML
+        
+        Args:
+            url: The URL to fetch
+            
+        Returns:
+            The shared, read-only page snapshot
+        """
+        snapshot = await fetch_snapshot(url)
+        # Parse off the event loop so large documents don't stall other tasks
+        await asyncio.to_thread(lambda: snapshot.tree)
+        logger.info(f"Fetched {snapshot.final_url} ({snapshot.status_code}, {len(snapshot.body)} bytes)")
+        return snapshot
+
+    @scheduler.input("text_styles", requires=("url", "device"))
+    async def _text_styles_input(self, url: str, device: str) -> Optional[Dict[str, Any]]:
+        """
+        Collect the computed text styles of the rendered page in one extraction
+        
+        Args:
+            url: The URL to render
+            device: Device profile (desktop/mobile)
+            
+        Returns:
+            Text style groups (see TEXT_STYLES_SCRIPT), or None when the page
+            could not be rendered
+        """
+        if not ACCESSIBILITY_RENDER:
+            return None
+        try:
+            async with browser_pool.context(device) as context:
+                page = await context.new_page()
+                with span("browser", "navigate"):
+                    await page.goto(url, wait_until="load")
+                return await page.evaluate(TEXT_STYLES_SCRIPT)
+        except Exception as e:
+            logger.warning(f"Could not collect text styles of {url}: {str(e)}")
+            return None
+
     # The following are placeholder methods for the actual analysis modules
-    # In a real implementation, you would have dedicated classes for each module
+    # In a real implementation, you would have dedicated classes for each module.
+    # Each module is registered with the scheduler together with the inputs it
+    # needs; the inputs are passed to the method as keyword arguments.
     
-    async def _analyze_performance(self, url: str, device: str) -> Dict[str, Any]:
+    @scheduler.module("performance", requires=("url", "device", "snapshot"), timeout=PERF_MODULE_TIMEOUT,
+                      depends_on=("html", "assets"))
+    async def _analyze_performance(self, url: str, device: str, snapshot: PageSnapshot) -> Dict[str, Any]:
         """
-        Analyze website performance using Lighthouse metrics
+        Analyze website performance by measuring Core Web Vitals
+        
+        The page is loaded several times in isolated contexts under the
+        throttling profile of the device; metrics are reported as medians
+        with their spread across runs.
         
         Args:
             url: The URL to analyze
             device: Device profile (desktop/mobile)
+            snapshot: The fetched page shared by all modules
             
         Returns:
             Performance analysis results
         """
-        # In a real implementation, this would use Playwright to run Lighthouse or
-        # collect Core Web Vitals metrics directly
-        
-        # Placeholder implementation
-        await asyncio.sleep(2)  # Simulate work
-        
-        return {
-            "lighthouse_score": 85,
-            "metrics": {
-                "first_contentful_paint": 1200,
-                "speed_index": 1800,
-                "largest_contentful_paint": 2500,
-                "time_to_interactive": 3200,
-                "total_blocking_time": 250,
-                "cumulative_layout_shift": 0.12
-            },
-            "opportunities": [
-                {
-                    "title": "Properly size images",
-                    "description": "Serve images that are appropriately-sized to save cellular data and improve load time.",
-                    "score": 80
-                },
-                {
-                    "title": "Eliminate render-blocking resources",
-                    "description": "Resources are blocking the first paint of your page. Consider delivering critical JS/CSS inline and deferring all non-critical JS/styles.",
-                    "score": 65
-                }
-            ]
-        }
+        result, minification = await asyncio.gather(
+            measure_performance(url, device),
+            minification_opportunities(snapshot)
+        )
+        result["opportunities"].extend(minification)
+        return result
 
-    async def _analyze_seo(self, url: str, depth: int) -> Dict[str, Any]:
+    @scheduler.module("seo", requires=("snapshot",), per_page=True, depends_on=("html",))
+    async def _analyze_seo(self, snapshot: PageSnapshot) -> Dict[str, Any]:
         """
         Analyze website SEO factors
         
         Args:
-            url: The URL to analyze
-            depth: How many pages to crawl
+            snapshot: The fetched page shared by all modules
             
         Returns:
             SEO analysis results
         """
-        # Placeholder implementation
-        await asyncio.sleep(1.5)  # Simulate work
-        
+        tree = snapshot.tree
+        if tree is None:
+            return {"error": f"No HTML document at {snapshot.final_url} ({snapshot.content_type})"}
+
+        issues = []
+
+        # Title: 30-60 characters is the range search engines display fully
+        title = (tree.findtext(".//title") or "").strip()
+        if not title:
+            title_score = 0
+            issues.append({"type": "error", "message": "Page is missing a title"})
+        elif 30 <= len(title) <= 60:
+            title_score = 100
+        else:
+            title_score = 70
+            issues.append({"type": "warning", "message": "Title should be between 30 and 60 characters"})
+
+        # Meta description: 70-160 characters
+        descriptions = tree.xpath('//meta[translate(@name, "DESCRIPTION", "description")="description"]/@content')
+        description = descriptions[0].strip() if descriptions else ""
+        if not description:
+            description_score = 0
+            issues.append({"type": "error", "message": "Page is missing a meta description"})
+        elif 70 <= len(description) <= 160:
+            description_score = 100
+        else:
+            description_score = 70
+            issues.append({"type": "warning", "message": "Meta description should be between 70 and 160 characters"})
+
+        # Headings: exactly one h1
+        heading_counts = {f"h{level}_count": 0 for level in (1, 2, 3)}
+        for element in tree.iter("h1", "h2", "h3"):
+            heading_counts[f"{element.tag}_count"] += 1
+        if heading_counts["h1_count"] == 1:
+            headings_score = 100
+        else:
+            headings_score = 50
+            issues.append({"type": "warning", "message": "Page should contain exactly one h1 heading"})
+
+        internal_links = sum(1 for link in tree.iter("a") if link.get("href", "").startswith(("/", snapshot.final_url)))
+        if internal_links < 3:
+            issues.append({"type": "info", "message": "Consider adding more internal links to important pages"})
+
         return {
-            "score": 78,
+            "score": round((title_score + description_score + headings_score) / 3),
             "on_page": {
                 "title": {
-                    "found": True,
-                    "value": "Example Website - Home Page",
-                    "length": 26,
-                    "score": 85
+                    "found": bool(title),
+                    "value": title,
+                    "length": len(title),
+                    "score": title_score
                 },
                 "meta_description": {
-                    "found": True,
-                    "value": "This is an example website description that would appear in search results.",
-                    "length": 74,
-                    "score": 90
+                    "found": bool(description),
+                    "value": description,
+                    "length": len(description),
+                    "score": description_score
                 },
                 "headings": {
-                    "h1_count": 1,
-                    "h2_count": 5,
-                    "h3_count": 8,
-                    "score": 95
+                    **heading_counts,
+                    "score": headings_score
                 }
             },
-            "issues": [
-                {
-                    "type": "warning",
-                    "message": "Meta description could be more descriptive"
-                },
-                {
-                    "type": "info",
-                    "message": "Consider adding more internal links to important pages"
-                }
-            ]
+            "issues": issues
         }
 
-    async def _analyze_accessibility(self, url: str) -> Dict[str, Any]:
+    @scheduler.module("accessibility", requires=("snapshot", "text_styles"), per_page=True,
+                      depends_on=("html", "assets"))
+    async def _analyze_accessibility(self, snapshot: PageSnapshot,
+                                     text_styles: Optional[Dict[str, Any]]) -> Dict[str, Any]:
         """
         Analyze website accessibility compliance
         
         Args:
-            url: The URL to analyze
+            snapshot: The fetched page shared by all modules
+            text_styles: Computed text styles of the rendered page, for contrast checks
             
         Returns:
             Accessibility analysis results
         """
-        # Placeholder implementation
-        await asyncio.sleep(1.8)  # Simulate work
+        tree = snapshot.tree
+        if tree is None:
+            return {"error": f"No HTML document at {snapshot.final_url} ({snapshot.content_type})"}
         
-        return {
-            "score": 72,
-            "wcag_compliance": {
-                "a": 95,
-                "aa": 80,
-                "aaa": 45
-            },
-            "issues": [
-                {
-                    "type": "error",
-                    "wcag": "1.1.1",
-                    "message": "Images must have alternate text",
-                    "elements": 3
-                },
-                {
-                    "type": "warning",
-                    "wcag": "1.4.3",
-                    "message": "Text contrast ratio should be at least 4.5:1",
-                    "elements": 5
-                }
-            ]
-        }
+        # All WCAG rules in one walk of the document
+        return await asyncio.to_thread(rule_engine.audit, tree, text_styles)
 
-    async def _analyze_technology_stack(self, url: str) -> Dict[str, Any]:
+    @scheduler.module("technology", requires=("snapshot",), per_page=True,
+                      depends_on=("html", "headers", "assets"))
+    async def _analyze_technology_stack(self, snapshot: PageSnapshot) -> Dict[str, Any]:
         """
         Analyze website technology stack
         
         Args:
-            url: The URL to analyze
+            snapshot: The fetched page shared by all modules
             
         Returns:
             Technology stack analysis results
         """
-        # Placeholder implementation
-        await asyncio.sleep(1)  # Simulate work
-        
+        # External scripts come from the shared asset cache and their matches
+        # are memoized per content, so well-known libraries are scanned once
+        scripts = [r["url"] for r in snapshot.resources if r["type"] == "script"][:TECH_MAX_SCRIPTS]
+        assets = await asset_cache.get_many(scripts)
+        kind = "fingerprints:" + await asyncio.to_thread(lambda: fingerprint_engine.database_key)
+        script_evidence = await asyncio.gather(*(
+            asset_cache.memoize(asset.content_hash, kind, lambda asset=asset: fingerprint_engine.scan_script(asset.text))
+            for asset in assets
+        ))
+
+        # One pass of the compiled fingerprint index over the snapshot
+        technologies = await asyncio.to_thread(fingerprint_engine.detect, snapshot, script_evidence)
         return {
-            "frameworks": [
-                {
-                    "name": "React",
-                    "version": "17.0.2",
-                    "confidence": 95
-                },
-                {
-                    "name": "Bootstrap",
-                    "version": "5.1.0",
-                    "confidence": 90
-                }
-            ],
-            "server": {
-                "name": "Nginx",
-                "version": "1.20.0",
-                "confidence": 100
-            },
-            "analytics": [
-                {
-                    "name": "Google Analytics",
-                    "version": "GA4",
-                    "confidence": 100
-                }
-            ],
-            "cdn": {
-                "name": "Cloudflare",
-                "confidence": 95
-            }
+            "technologies": technologies,
+            **group_by_category(technologies),
+            "external_scripts": {"analyzed": len(assets), "cached": sum(a.status != "fetched" for a in assets)},
         }
 
-    async def _analyze_carbon_emissions(self, url: str) -> Dict[str, Any]:
+    @scheduler.module("carbon", requires=("url", "device"), per_page=True, depends_on=("html", "assets"))
+    async def _analyze_carbon_emissions(self, url: str, device: str) -> Dict[str, Any]:
         """
-        Analyze website carbon emissions
+        Analyze website carbon emissions from the data the page transfers
         
         Args:
             url: The URL to analyze
+            device: Device profile (desktop/mobile)
             
         Returns:
             Carbon emissions analysis results
         """
-        # Placeholder implementation
-        await asyncio.sleep(1.2)  # Simulate work
-        
-        return {
-            "co2_per_visit": 0.78,  # grams
-            "energy_consumption": 0.00025,  # kWh
-            "cleaner_than": 65,  # percent of websites
-            "transfer_size": 2.4,  # MB
-            "recommendations": [
-                "Optimize images to reduce file size",
-                "Use a green hosting provider",
-                "Implement lazy loading for below-the-fold content"
-            ]
-        }
+        return await measure_carbon(url, device)
@@ -0,0 +1,365 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import httpx
+from loguru import logger
+from sqlalchemy import DateTime, Integer, String, Text, delete, func, select, update
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.services.database import Base, SessionLocal, WriteSession, init_db
+from app.services.http_client import http_client, read_limited
+from app.services.telemetry import span
+
+# Where asset bodies are stored and how much disk they may use in total
+ASSET_CACHE_DIR = os.getenv("ASSET_CACHE_DIR", "data/assets")
+ASSET_CACHE_MAX_BYTES = int(os.getenv("ASSET_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+ASSET_CACHE_ENABLED = os.getenv("ASSET_CACHE_ENABLED", "true").lower() != "false"
+
+# Largest single asset worth caching, fetch timeout, and the freshness of
+# responses that don't state one
+ASSET_MAX_BYTES = int(os.getenv("ASSET_MAX_BYTES", 5 * 1024 * 1024))
+ASSET_FETCH_TIMEOUT = float(os.getenv("ASSET_FETCH_TIMEOUT", 15))
+ASSET_DEFAULT_TTL = int(os.getenv("ASSET_DEFAULT_TTL", 3600))
+
+# Resolution of the least-recently-used order: a body served again within
+# this many seconds of its last recorded use is not recorded again
+ASSET_TOUCH_INTERVAL = int(os.getenv("ASSET_TOUCH_INTERVAL", 300))
+
+
+class CachedAssetUrl(Base):
+    """The content last served for a URL, with the validators to revalidate it"""
+
+    __tablename__ = "asset_cache_urls"
+
+    url_key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    url: Mapped[str] = mapped_column(String(2048))
+    content_hash: Mapped[str] = mapped_column(String(64), index=True)
+    content_type: Mapped[str] = mapped_column(String(255), default="")
+    etag: Mapped[Optional[str]] = mapped_column(String(256), nullable=True)
+    last_modified: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime)
+
+
+class CachedAssetBlob(Base):
+    """A stored asset body, shared by every URL serving the same bytes"""
+
+    __tablename__ = "asset_cache_blobs"
+
+    content_hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    size: Mapped[int] = mapped_column(Integer)
+    last_used: Mapped[datetime] = mapped_column(DateTime, index=True)
+
+
+class CachedAssetArtifact(Base):
+    """A value derived from an asset body (e.g. fingerprint matches), stored as JSON"""
+
+    __tablename__ = "asset_cache_artifacts"
+
+    content_hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    kind: Mapped[str] = mapped_column(String(128), primary_key=True)
+    data: Mapped[str] = mapped_column(Text)
+
+
+@dataclass
+class Asset:
+    """A cached subresource"""
+
+    url: str
+    content_hash: str
+    content_type: str
+    body: bytes
+    status: str  # "hit", "revalidated" or "fetched"
+
+    @property
+    def text(self) -> str:
+        return self.body.decode("utf-8", errors="replace")
+
+
+def _url_key(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
+def _freshness(headers: httpx.Headers) -> Optional[int]:
+    """Seconds a response may be reused without revalidation; None if it must not be stored"""
+    cache_control = headers.get("cache-control", "").lower()
+    if "no-store" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return 0
+    match = re.search(r"max-age=(\d+)", cache_control)
+    return int(match.group(1)) if match else ASSET_DEFAULT_TTL
+
+
+class AssetCache:
+    """
+    Content-addressed cache of page subresources shared by all audits.
+
+    Bodies are stored once per SHA-256 of their content, however many URLs
+    serve them (the same jQuery build from several CDNs, for instance). A
+    URL maps to the content it served last together with its validators:
+    fresh entries are read from disk, stale ones are revalidated with a
+    conditional GET. Values derived from an asset are memoized per content
+    hash, so analysing a known asset again costs a lookup. When the stored
+    bodies exceed ASSET_CACHE_MAX_BYTES the least recently used ones are
+    evicted along with their URLs and derived values. Uses of cached bodies
+    are recorded in one write per ``get_many``, at most once per
+    ASSET_TOUCH_INTERVAL per body.
+    """
+
+    def __init__(self, directory: str = ASSET_CACHE_DIR, max_bytes: int = ASSET_CACHE_MAX_BYTES,
+                 enabled: bool = ASSET_CACHE_ENABLED):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+        # Concurrent audits asking for the same URL share one fetch
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Bodies served since the last write of their use, and when each was last written
+        self._touches: Set[str] = set()
+        self._touched: Dict[str, float] = {}
+
+    async def get(self, url: str) -> Optional[Asset]:
+        """
+        Get a subresource, from the cache when possible.
+
+        Returns:
+            The asset, or None if it could not be fetched (errors, oversized
+            or non-success responses)
+        """
+        if url in self._inflight:
+            return await asyncio.shield(self._inflight[url])
+        future = asyncio.ensure_future(self._get(url))
+        self._inflight[url] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                self._inflight.pop(url, None)
+            else:
+                future.add_done_callback(lambda _: self._inflight.pop(url, None))
+
+    async def get_many(self, urls: List[str]) -> List[Asset]:
+        """The assets of several URLs, fetched concurrently; failures are left out"""
+        assets = await asyncio.gather(*(self.get(url) for url in urls), return_exceptions=True)
+        await self._flush_touches()
+        for failure in (a for a in assets if isinstance(a, Exception)):
+            logger.warning(f"Asset cache lookup failed: {str(failure)}")
+        return [asset for asset in assets if isinstance(asset, Asset)]
+
+    async def memoize(self, content_hash: str, kind: str, compute: Callable[[], Any]) -> Any:
+        """
+        Get a value derived from an asset, computing it once per content hash.
+
+        Args:
+            content_hash: Hash of the asset the value is derived from
+            kind: Name of the derived value; include a version to invalidate
+                values computed by older code
+            compute: Blocking function computing a JSON-serializable value
+        """
+        if self.enabled:
+            stored = await asyncio.to_thread(self._load_artifact, content_hash, kind)
+            if stored is not None:
+                return json.loads(stored)
+        value = await asyncio.to_thread(compute)
+        if self.enabled:
+            try:
+                await asyncio.to_thread(self._save_artifact, content_hash, kind, json.dumps(value))
+            except Exception as e:
+                logger.warning(f"Failed to memoize {kind} of asset {content_hash[:12]}: {str(e)}")
+        return value
+
+    async def _get(self, url: str) -> Optional[Asset]:
+        entry = await asyncio.to_thread(self._load_url, url) if self.enabled else None
+        headers = {}
+        if entry is not None:
+            if entry.expires_at > datetime.now():
+                body = await asyncio.to_thread(self._read_blob, entry.content_hash)
+                if body is not None:
+                    self._touches.add(entry.content_hash)
+                    return Asset(url, entry.content_hash, entry.content_type, body, "hit")
+            else:
+                if entry.etag:
+                    headers["If-None-Match"] = entry.etag
+                if entry.last_modified:
+                    headers["If-Modified-Since"] = entry.last_modified
+
+        try:
+            with span("fetch", "asset"):
+                status, response_headers, body = await self._fetch(url, headers)
+        except Exception as e:
+            logger.warning(f"Failed to fetch asset {url}: {str(e)}")
+            return None
+
+        if status == 304 and entry is not None:
+            cached = await asyncio.to_thread(self._read_blob, entry.content_hash)
+            if cached is not None:
+                self._touches.add(entry.content_hash)
+                ttl = _freshness(response_headers)
+                await asyncio.to_thread(self._extend_url, url, ttl or 0)
+                return Asset(url, entry.content_hash, entry.content_type, cached, "revalidated")
+            # The body was evicted meanwhile; fetch it unconditionally
+            return await self._refetch(url)
+
+        if status >= 400 or body is None:
+            return None
+        content_hash = hashlib.sha256(body).hexdigest()
+        content_type = response_headers.get("content-type", "")
+        ttl = _freshness(response_headers)
+        if self.enabled and ttl is not None:
+            try:
+                await asyncio.to_thread(self._store, url, content_hash, content_type, body, response_headers, ttl)
+            except Exception as e:
+                logger.warning(f"Failed to cache asset {url}: {str(e)}")
+        return Asset(url, content_hash, content_type, body, "fetched")
+
+    async def _flush_touches(self):
+        """Record the use of the bodies served since the last flush, in one transaction"""
+        now = time.monotonic()
+        self._touched = {h: at for h, at in self._touched.items() if now - at < ASSET_TOUCH_INTERVAL}
+        stale = [content_hash for content_hash in self._touches if content_hash not in self._touched]
+        self._touches.clear()
+        if not stale:
+            return
+        self._touched.update((content_hash, now) for content_hash in stale)
+        try:
+            await asyncio.to_thread(self._save_touches, stale)
+        except Exception as e:
+            logger.warning(f"Failed to record the use of {len(stale)} cached assets: {str(e)}")
+
+    async def _refetch(self, url: str) -> Optional[Asset]:
+        await asyncio.to_thread(self._forget_url, url)
+        return await self._get(url)
+
+    async def _fetch(self, url: str, headers: Dict[str, str]):
+        async with http_client.stream("GET", url, headers=headers, timeout=ASSET_FETCH_TIMEOUT) as response:
+            if response.status_code != 200:
+                return response.status_code, response.headers, None
+            declared = int(response.headers.get("content-length") or 0)
+            if declared > ASSET_MAX_BYTES:
+                return response.status_code, response.headers, None
+            body, truncated = await read_limited(response, ASSET_MAX_BYTES)
+            if truncated:
+                logger.info(f"Asset {url} exceeds {ASSET_MAX_BYTES} bytes, not caching")
+                return response.status_code, response.headers, None
+            return response.status_code, response.headers, body
+
+    def _ensure_schema(self):
+        # Lookups of a page's assets start together; create the tables once
+        with self._schema_lock:
+            if not self._schema_ready:
+                init_db()
+                self._schema_ready = True
+
+    def _blob_path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, content_hash[:2], content_hash)
+
+    def _read_blob(self, content_hash: str) -> Optional[bytes]:
+        try:
+            with open(self._blob_path(content_hash), "rb") as f:
+                body = f.read()
+        except OSError:
+            return None
+        return body
+
+    def _save_touches(self, content_hashes: List[str]):
+        with WriteSession.begin() as session:
+            session.execute(
+                update(CachedAssetBlob)
+                .where(CachedAssetBlob.content_hash.in_(content_hashes))
+                .values(last_used=datetime.now())
+            )
+
+    def _write_blob(self, content_hash: str, body: bytes):
+        path = self._blob_path(content_hash)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}"
+        with open(temporary, "wb") as f:
+            f.write(body)
+        os.replace(temporary, path)
+
+    def _load_url(self, url: str) -> Optional[CachedAssetUrl]:
+        self._ensure_schema()
+        with SessionLocal() as session:
+            return session.get(CachedAssetUrl, _url_key(url))
+
+    def _extend_url(self, url: str, ttl: int):
+        with WriteSession.begin() as session:
+            entry = session.get(CachedAssetUrl, _url_key(url))
+            if entry is not None:
+                entry.expires_at = datetime.now() + timedelta(seconds=ttl)
+
+    def _forget_url(self, url: str):
+        with WriteSession.begin() as session:
+            session.execute(delete(CachedAssetUrl).where(CachedAssetUrl.url_key == _url_key(url)))
+
+    def _store(self, url: str, content_hash: str, content_type: str, body: bytes,
+               headers: httpx.Headers, ttl: int):
+        self._ensure_schema()
+        self._write_blob(content_hash, body)
+        now = datetime.now()
+        with WriteSession.begin() as session:
+            blob = session.get(CachedAssetBlob, content_hash)
+            if blob is None:
+                session.add(CachedAssetBlob(content_hash=content_hash, size=len(body), last_used=now))
+            else:
+                blob.last_used = now
+            key = _url_key(url)
+            entry = session.get(CachedAssetUrl, key)
+            if entry is None:
+                entry = CachedAssetUrl(url_key=key, url=url)
+                session.add(entry)
+            entry.content_hash = content_hash
+            entry.content_type = content_type[:255]
+            entry.etag = headers.get("etag")
+            entry.last_modified = headers.get("last-modified")
+            entry.expires_at = now + timedelta(seconds=ttl)
+        self._evict()
+
+    def _evict(self):
+        """Drop least recently used bodies until the cache fits its size bound"""
+        with WriteSession.begin() as session:
+            total = session.scalar(select(func.coalesce(func.sum(CachedAssetBlob.size), 0)))
+            if total <= self.max_bytes:
+                return
+            evicted = []
+            for blob in session.scalars(select(CachedAssetBlob).order_by(CachedAssetBlob.last_used)):
+                if total <= self.max_bytes:
+                    break
+                total -= blob.size
+                evicted.append(blob.content_hash)
+            session.execute(delete(CachedAssetUrl).where(CachedAssetUrl.content_hash.in_(evicted)))
+            session.execute(delete(CachedAssetArtifact).where(CachedAssetArtifact.content_hash.in_(evicted)))
+            session.execute(delete(CachedAssetBlob).where(CachedAssetBlob.content_hash.in_(evicted)))
+        for content_hash in evicted:
+            try:
+                os.remove(self._blob_path(content_hash))
+            except OSError:
+                pass
+        logger.info(f"Evicted {len(evicted)} assets from the asset cache")
+
+    def _load_artifact(self, content_hash: str, kind: str) -> Optional[str]:
+        self._ensure_schema()
+        with SessionLocal() as session:
+            artifact = session.get(CachedAssetArtifact, (content_hash, kind))
+            return artifact.data if artifact is not None else None
+
+    def _save_artifact(self, content_hash: str, kind: str, data: str):
+        with WriteSession.begin() as session:
+            # Only for bodies still cached, so eviction takes the value along
+            if session.get(CachedAssetBlob, content_hash) is not None:
+                session.merge(CachedAssetArtifact(content_hash=content_hash, kind=kind, data=data))
+
+
+# Process-wide asset cache
+asset_cache = AssetCache()
@@ -0,0 +1,281 @@
+import asyncio
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+from loguru import logger
+from sqlalchemy import DateTime, Index, Integer, String, Text, func, or_, select, update
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.services.database import Base, SessionLocal, WriteSession, init_db
+from app.services.job_queue import QUEUED, JobRecord
+from app.services.task_store import TaskRecord, task_store
+
+# Batch scheduling (overridable through environment variables)
+BATCH_MAX_URLS = int(os.getenv("BATCH_MAX_URLS", 100000))
+BATCH_QUEUE_SHARE = float(os.getenv("BATCH_QUEUE_SHARE", 0.5))
+BATCH_FEED_SIZE = int(os.getenv("BATCH_FEED_SIZE", 100))
+BATCH_INSERT_CHUNK = 1000
+
+# Batch item statuses
+WAITING = "waiting"
+SCHEDULED = "scheduled"
+DONE = "done"
+
+
+class BatchRecord(Base):
+    """A batch of URLs audited with shared options"""
+
+    __tablename__ = "analysis_batches"
+
+    batch_id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    options: Mapped[str] = mapped_column(Text)
+    total: Mapped[int] = mapped_column(Integer, default=0)
+    completed: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime)
+
+
+class BatchItem(Base):
+    """
+    One URL of a batch.
+
+    ``domain_seq`` is the item's position among the batch's URLs on the same
+    domain; feeding items in (domain_seq, id) order interleaves domains so a
+    single large site cannot starve the rest of the batch. ``completed_seq``
+    numbers items in completion order and serves as the result stream cursor.
+    """
+
+    __tablename__ = "analysis_batch_items"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    batch_id: Mapped[str] = mapped_column(String(36))
+    url: Mapped[str] = mapped_column(String(2048))
+    domain: Mapped[str] = mapped_column(String(255))
+    domain_seq: Mapped[int] = mapped_column(Integer)
+    status: Mapped[str] = mapped_column(String(16))
+    task_id: Mapped[Optional[str]] = mapped_column(String(36), nullable=True, unique=True)
+    scheduled_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    completed_seq: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index("ix_analysis_batch_items_feed", "status", "domain_seq", "id"),
+        Index("ix_analysis_batch_items_results", "batch_id", "completed_seq"),
+    )
+
+
+class BatchStore:
+    """
+    Persistent batches and their fair feeding into the job queue.
+
+    Submitting a batch only records its URLs. Workers periodically move
+    waiting items into the job queue while the queue is below its batch
+    share, so a large batch never triggers admission control for
+    interactive requests and domains are served round-robin.
+    """
+
+    def __init__(self):
+        self._schema_ready = False
+
+    def _ensure_schema(self):
+        if not self._schema_ready:
+            init_db()
+            self._schema_ready = True
+
+    async def create(self, urls: AsyncIterator[str], options: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Record a batch from a stream of URLs.
+
+        Args:
+            urls: The URLs to audit (consumed in chunks, never held in full)
+            options: Shared analysis options (modules, depth, device, priority)
+
+        Returns:
+            The batch ID and number of accepted URLs
+        """
+        batch_id = str(uuid.uuid4())
+        await asyncio.to_thread(self._create_batch, batch_id, options)
+
+        domain_counts: Dict[str, int] = {}
+        chunk: List[str] = []
+        total = 0
+        async for url in urls:
+            if total >= BATCH_MAX_URLS:
+                logger.warning(f"Batch {batch_id} truncated at {BATCH_MAX_URLS} URLs")
+                break
+            chunk.append(url)
+            total += 1
+            if len(chunk) >= BATCH_INSERT_CHUNK:
+                await asyncio.to_thread(self._add_items, batch_id, chunk, domain_counts)
+                chunk = []
+        if chunk:
+            await asyncio.to_thread(self._add_items, batch_id, chunk, domain_counts)
+
+        logger.info(f"Batch {batch_id} created with {total} URLs on {len(domain_counts)} domains")
+        return {"batch_id": batch_id, "total": total}
+
+    async def status(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Progress counters of a batch"""
+        return await asyncio.to_thread(self._status, batch_id)
+
+    async def feed(self, start_analysis, queue_limit: int) -> int:
+        """
+        Move waiting batch items into the job queue.
+
+        Args:
+            start_analysis: Coroutine function creating and queueing a task
+                under a given task ID
+            queue_limit: Maximum queue depth
+
+        Returns:
+            Number of items scheduled
+        """
+        items = await asyncio.to_thread(self._take_waiting, int(queue_limit * BATCH_QUEUE_SHARE))
+        scheduled = 0
+        for index, item in enumerate(items):
+            options = item["options"]
+            try:
+                task_id = await start_analysis(
+                    url=item["url"],
+                    modules=options["modules"],
+                    depth=options["depth"],
+                    device=options["device"],
+                    priority=options.get("priority", 0),
+                    batch_id=item["batch_id"],
+                    task_id=item["task_id"]
+                )
+            except Exception as e:
+                logger.warning(f"Could not schedule batch item {item['id']}: {str(e)}")
+                returned = items[index:]
+                await asyncio.to_thread(self._return_items, [rest["id"] for rest in returned])
+                # The item gets a new task when it is scheduled again; drop
+                # the one start_analysis recorded as rejected
+                await task_store.delete([rest["task_id"] for rest in returned])
+                break
+            scheduled += 1
+        return scheduled
+
+    async def item_finished(self, task_id: str):
+        """Record the completion of a batch item's task"""
+        await asyncio.to_thread(self._finish_item, task_id)
+
+    async def completed_items(self, batch_id: str, cursor: int, limit: int = 100) -> List[Dict[str, Any]]:
+        """Items completed after ``cursor``, in completion order"""
+        return await asyncio.to_thread(self._completed_items, batch_id, cursor, limit)
+
+    def _create_batch(self, batch_id: str, options: Dict[str, Any]):
+        self._ensure_schema()
+        with WriteSession.begin() as session:
+            session.add(BatchRecord(batch_id=batch_id, options=json.dumps(options), created_at=datetime.now()))
+
+    def _add_items(self, batch_id: str, urls: Iterable[str], domain_counts: Dict[str, int]):
+        rows = []
+        for url in urls:
+            domain = (urlsplit(url).hostname or "").lower()
+            domain_counts[domain] = domain_counts.get(domain, 0) + 1
+            rows.append({"batch_id": batch_id, "url": url, "domain": domain,
+                         "domain_seq": domain_counts[domain], "status": WAITING})
+        with WriteSession.begin() as session:
+            session.execute(BatchItem.__table__.insert(), rows)
+            session.execute(
+                update(BatchRecord).where(BatchRecord.batch_id == batch_id).values(total=BatchRecord.total + len(rows))
+            )
+
+    def _take_waiting(self, share: int) -> List[Dict[str, Any]]:
+        """
+        Claim waiting items while the queue is below the batch share.
+
+        Every worker feeds batches, so the room left is counted in the same
+        transaction that claims items: queued jobs plus items claimed by
+        other workers that are not queued yet.
+        """
+        self._ensure_schema()
+        now = datetime.now()
+        with WriteSession.begin() as session:
+            # Items scheduled by a process that died before creating their task
+            session.execute(
+                update(BatchItem)
+                .where(BatchItem.status == SCHEDULED, BatchItem.scheduled_at < now - timedelta(minutes=5),
+                       or_(BatchItem.task_id.is_(None), BatchItem.task_id.not_in(select(TaskRecord.task_id))))
+                .values(status=WAITING, scheduled_at=None, task_id=None)
+            )
+            queued = session.scalar(select(func.count()).select_from(JobRecord).where(JobRecord.status == QUEUED))
+            claimed = session.scalar(
+                select(func.count()).select_from(BatchItem)
+                .where(BatchItem.status == SCHEDULED, BatchItem.task_id.not_in(select(JobRecord.task_id)))
+            )
+            room = min(share - queued - claimed, BATCH_FEED_SIZE)
+            if room <= 0:
+                return []
+            rows = session.execute(
+                select(BatchItem.id, BatchItem.batch_id, BatchItem.url, BatchRecord.options)
+                .join(BatchRecord, BatchRecord.batch_id == BatchItem.batch_id)
+                .where(BatchItem.status == WAITING)
+                .order_by(BatchItem.domain_seq, BatchItem.id)
+                .limit(room)
+            ).all()
+            # The task ID is linked to the item before the task exists, so a
+            # task that finishes right away always finds its item
+            items = []
+            for row in rows:
+                task_id = str(uuid.uuid4())
+                session.execute(
+                    update(BatchItem).where(BatchItem.id == row.id)
+                    .values(status=SCHEDULED, scheduled_at=now, task_id=task_id)
+                )
+                items.append({"id": row.id, "batch_id": row.batch_id, "url": row.url, "task_id": task_id,
+                              "options": json.loads(row.options)})
+        return items
+
+    def _return_items(self, item_ids: List[int]):
+        with WriteSession.begin() as session:
+            session.execute(
+                update(BatchItem).where(BatchItem.id.in_(item_ids))
+                .values(status=WAITING, scheduled_at=None, task_id=None)
+            )
+
+    def _finish_item(self, task_id: str):
+        self._ensure_schema()
+        with WriteSession.begin() as session:
+            item = session.scalars(select(BatchItem).where(BatchItem.task_id == task_id)).first()
+            if item is None or item.completed_seq is not None:
+                return
+            batch = session.get(BatchRecord, item.batch_id)
+            batch.completed += 1
+            item.status = DONE
+            item.completed_seq = batch.completed
+
+    def _status(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        self._ensure_schema()
+        with SessionLocal() as session:
+            batch = session.get(BatchRecord, batch_id)
+            if batch is None:
+                return None
+            counts = dict(session.execute(
+                select(BatchItem.status, func.count()).where(BatchItem.batch_id == batch_id).group_by(BatchItem.status)
+            ).all())
+            return {
+                "batch_id": batch.batch_id,
+                "created_at": batch.created_at.isoformat(),
+                "options": json.loads(batch.options),
+                "total": batch.total,
+                "completed": batch.completed,
+                "waiting": counts.get(WAITING, 0),
+                "scheduled": counts.get(SCHEDULED, 0),
+            }
+
+    def _completed_items(self, batch_id: str, cursor: int, limit: int) -> List[Dict[str, Any]]:
+        with SessionLocal() as session:
+            rows = session.execute(
+                select(BatchItem.url, BatchItem.task_id, BatchItem.completed_seq)
+                .where(BatchItem.batch_id == batch_id, BatchItem.completed_seq > cursor)
+                .order_by(BatchItem.completed_seq)
+                .limit(limit)
+            ).all()
+        return [{"url": row.url, "task_id": row.task_id, "cursor": row.completed_seq} for row in rows]
+
+
+# Process-wide batch store
+batch_store = BatchStore()
@@ -0,0 +1,283 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set
+from loguru import logger
+
+from app.services.telemetry import span
+
+# Pool configuration (overridable through environment variables)
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", 2))
+BROWSER_CONTEXTS_PER_BROWSER = int(os.getenv("BROWSER_CONTEXTS_PER_BROWSER", 4))
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", 200))
+BROWSER_MAX_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", 1024))
+BROWSER_RSS_SAMPLE_INTERVAL = float(os.getenv("BROWSER_RSS_SAMPLE_INTERVAL", 10))
+BROWSER_ACQUIRE_TIMEOUT = float(os.getenv("BROWSER_ACQUIRE_TIMEOUT", 60))
+BROWSER_MAX_WAITERS = int(os.getenv("BROWSER_MAX_WAITERS", 32))
+BROWSER_HEADLESS = os.getenv("BROWSER_HEADLESS", "true").lower() != "false"
+
+# Playwright device descriptors used for each AnalysisRequest.device value
+DEVICE_PROFILES = {
+    "desktop": "Desktop Chrome",
+    "mobile": "Moto G4",
+}
+
+
+class BrowserPoolExhausted(Exception):
+    """Raised when no browser context becomes available in time"""
+
+
+class PooledBrowser:
+    """A warm browser together with its usage counters"""
+
+    def __init__(self, browser: Any):
+        self.browser = browser
+        self.active = 0
+        self.pages_served = 0
+        self.retiring = False
+
+
+class BrowserPool:
+    """
+    Pool of warm Chromium instances handing out isolated browser contexts.
+
+    Each task gets a fresh context (its own cookies, cache and storage) on one
+    of the already running browsers, so the per-audit cost is context creation
+    rather than a browser launch. A browser is recycled after serving
+    BROWSER_MAX_PAGES contexts or when the browsers together exceed
+    BROWSER_MAX_RSS_MB per browser; the memory of the Playwright driver's
+    process tree is sampled off the event loop every
+    BROWSER_RSS_SAMPLE_INTERVAL seconds. When every slot is taken callers
+    wait for up to BROWSER_ACQUIRE_TIMEOUT seconds; beyond
+    BROWSER_MAX_WAITERS queued callers the pool rejects new requests
+    immediately.
+    """
+
+    def __init__(self, size: int = BROWSER_POOL_SIZE, contexts_per_browser: int = BROWSER_CONTEXTS_PER_BROWSER,
+                 max_pages: int = BROWSER_MAX_PAGES, max_rss_mb: int = BROWSER_MAX_RSS_MB,
+                 acquire_timeout: float = BROWSER_ACQUIRE_TIMEOUT, max_waiters: int = BROWSER_MAX_WAITERS):
+        self.size = size
+        self.contexts_per_browser = contexts_per_browser
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.acquire_timeout = acquire_timeout
+        self.max_waiters = max_waiters
+
+        self._playwright = None
+        self._browsers: List[PooledBrowser] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._waiters = 0
+        self._driver_pids: Set[int] = set()
+        self._rss_mb: Optional[float] = None
+        self._sampler: Optional[asyncio.Task] = None
+
+    @property
+    def started(self) -> bool:
+        return self._playwright is not None
+
+    async def start(self):
+        """Start Playwright and launch the warm browsers"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.started:
+                return
+            from playwright.async_api import async_playwright
+
+            # The driver is the child process Playwright starts; the browsers
+            # run below it, apart from any other children of this process
+            before = await asyncio.to_thread(_child_pids, os.getpid())
+            self._playwright = await async_playwright().start()
+            self._driver_pids = await asyncio.to_thread(_child_pids, os.getpid()) - before
+            self._slots = asyncio.Semaphore(self.size * self.contexts_per_browser)
+            await self._fill()
+            self._sampler = asyncio.create_task(self._sample_memory())
+            logger.info(f"Browser pool started with {len(self._browsers)} browsers")
+
+    async def stop(self):
+        """Close all browsers and stop Playwright"""
+        if not self.started:
+            return
+        async with self._lock:
+            if self._sampler is not None:
+                self._sampler.cancel()
+                self._sampler = None
+            for pooled in self._browsers:
+                await self._close(pooled)
+            self._browsers = []
+            await self._playwright.stop()
+            self._playwright = None
+            self._driver_pids, self._rss_mb = set(), None
+            logger.info("Browser pool stopped")
+
+    @asynccontextmanager
+    async def context(self, device: str = "desktop", **options) -> AsyncIterator[Any]:
+        """
+        Borrow an isolated browser context configured for a device profile.
+
+        Args:
+            device: Device profile (desktop/mobile)
+            options: Extra keyword arguments for ``Browser.new_context``
+
+        Yields:
+            A Playwright BrowserContext, closed automatically on exit
+        """
+        if not self.started:
+            await self.start()
+
+        with span("browser", "acquire"):
+            pooled = await self._acquire()
+        context = None
+        try:
+            with span("browser", "new_context"):
+                context = await pooled.browser.new_context(**self._profile(device), **options)
+            yield context
+        finally:
+            if context is not None:
+                try:
+                    await context.close()
+                except Exception as e:
+                    logger.warning(f"Failed to close browser context: {str(e)}")
+            await self._release(pooled)
+
+    def stats(self) -> Dict[str, Any]:
+        """Current pool usage"""
+        return {
+            "browsers": len(self._browsers),
+            "active_contexts": sum(b.active for b in self._browsers),
+            "waiting": self._waiters,
+            "pages_served": sum(b.pages_served for b in self._browsers),
+        }
+
+    def _profile(self, device: str) -> Dict[str, Any]:
+        descriptor = DEVICE_PROFILES.get(device, DEVICE_PROFILES["desktop"])
+        profile = dict(self._playwright.devices[descriptor])
+        profile.pop("default_browser_type", None)
+        return profile
+
+    async def _acquire(self) -> PooledBrowser:
+        if self._waiters >= self.max_waiters:
+            raise BrowserPoolExhausted(f"Browser pool saturated ({self._waiters} callers waiting)")
+
+        self._waiters += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise BrowserPoolExhausted(f"No browser context available after {self.acquire_timeout}s")
+        finally:
+            self._waiters -= 1
+
+        try:
+            async with self._lock:
+                await self._fill()
+                pooled = min((b for b in self._browsers if not b.retiring), key=lambda b: b.active)
+                pooled.active += 1
+                return pooled
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def _release(self, pooled: PooledBrowser):
+        pooled.active -= 1
+        pooled.pages_served += 1
+
+        if pooled.pages_served >= self.max_pages:
+            pooled.retiring = True
+        elif self._over_memory_ceiling():
+            # Retire the browser that has been used the most; it is the most
+            # likely to have accumulated leaked renderer memory
+            candidates = [b for b in self._browsers if not b.retiring]
+            if candidates:
+                max(candidates, key=lambda b: b.pages_served).retiring = True
+
+        async with self._lock:
+            for retired in [b for b in self._browsers if b.retiring and b.active == 0]:
+                self._browsers.remove(retired)
+                await self._close(retired)
+                logger.info(f"Recycled browser after {retired.pages_served} pages")
+        self._slots.release()
+
+    async def _fill(self):
+        """Launch browsers until the pool has its configured number of live ones"""
+        while sum(1 for b in self._browsers if not b.retiring) < self.size:
+            browser = await self._playwright.chromium.launch(headless=BROWSER_HEADLESS)
+            pooled = PooledBrowser(browser)
+            browser.on("disconnected", lambda _, pooled=pooled: setattr(pooled, "retiring", True))
+            self._browsers.append(pooled)
+
+    async def _close(self, pooled: PooledBrowser):
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            logger.warning(f"Failed to close browser: {str(e)}")
+
+    async def _sample_memory(self):
+        """Keep the resident memory of the driver and browsers up to date"""
+        while True:
+            try:
+                self._rss_mb = await asyncio.to_thread(_process_tree_rss_mb, self._driver_pids)
+            except Exception as e:
+                logger.warning(f"Failed to sample browser memory: {str(e)}")
+            await asyncio.sleep(BROWSER_RSS_SAMPLE_INTERVAL)
+
+    def _over_memory_ceiling(self) -> bool:
+        live = sum(1 for b in self._browsers if not b.retiring)
+        rss_mb = self._rss_mb
+        return bool(live and rss_mb is not None and rss_mb / live > self.max_rss_mb)
+
+
+def _process_children() -> Dict[int, List[int]]:
+    """Child PIDs of every process, from /proc"""
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; fields resume after ')'
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    return children
+
+
+def _child_pids(pid: int) -> Set[int]:
+    """Direct children of a process (empty when /proc is not available)"""
+    try:
+        return set(_process_children().get(pid, []))
+    except OSError:
+        return set()
+
+
+def _process_tree_rss_mb(roots: Iterable[int]) -> Optional[float]:
+    """
+    Total resident memory of processes and all their descendants in MB, or
+    None when /proc is not available or there are no processes to measure.
+    """
+    roots = list(roots)
+    if not roots:
+        return None
+    try:
+        children = _process_children()
+        total_kb = 0
+        pending = roots
+        while pending:
+            pid = pending.pop()
+            pending.extend(children.get(pid, []))
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith("VmRSS:"):
+                            total_kb += int(line.split()[1])
+                            break
+            except OSError:
+                continue
+        return total_kb / 1024
+    except OSError:
+        return None
+
+
+# Process-wide pool, started and stopped by the application lifespan
+browser_pool = BrowserPool()
@@ -0,0 +1,107 @@
+import asyncio
+import inspect
+from contextlib import suppress
+from contextvars import ContextVar
+from typing import Any, Awaitable, Optional
+
+# Final statuses of analyses that were stopped before finishing
+CANCELLED = "cancelled"
+TIMED_OUT = "timed_out"
+
+
+class AnalysisCancelled(Exception):
+    """Raised when an analysis was cancelled or ran past its deadline"""
+
+    def __init__(self, status: str, reason: str):
+        super().__init__(reason)
+        self.status = status
+
+
+class CancelScope:
+    """
+    Cancellation state of one analysis run.
+
+    ``cancel`` cancels the asyncio task executing the run, which interrupts
+    it at its next ``await``: providers and context managers release their
+    browser contexts, connections and crawls in their cleanup code right
+    away. Work running in threads cannot be interrupted that way, so long
+    loops call ``checkpoint()`` to stop as soon as the run is cancelled.
+    """
+
+    def __init__(self):
+        self.status: Optional[str] = None
+        self.reason: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.status is not None
+
+    def cancel(self, status: str = CANCELLED, reason: str = "Analysis cancelled") -> bool:
+        """
+        Stop the run.
+
+        Returns:
+            False when the run was already cancelled
+        """
+        if self.cancelled:
+            return False
+        self.status, self.reason = status, reason
+        if self._task is not None:
+            self._task.cancel()
+        return True
+
+    def checkpoint(self):
+        """Raise AnalysisCancelled if the run was cancelled"""
+        if self.status is not None:
+            raise AnalysisCancelled(self.status, self.reason)
+
+    async def run(self, awaitable: Awaitable[Any]) -> Any:
+        """
+        Execute the run in its own task, inside this scope.
+
+        Raises:
+            AnalysisCancelled: When the run was cancelled through the scope;
+                cancelling the calling task still raises CancelledError
+        """
+        if self.cancelled:
+            if inspect.iscoroutine(awaitable):
+                awaitable.close()
+            self.checkpoint()
+        token = _current_scope.set(self)
+        try:
+            self._task = asyncio.ensure_future(awaitable)
+        finally:
+            _current_scope.reset(token)
+        try:
+            # Waiting does not propagate a cancellation of the calling task to
+            # the run, so the two cases stay apart: the caller being cancelled
+            # (worker shutdown, lost lease) raises here, while the run being
+            # cancelled through the scope surfaces as a cancelled task below
+            await asyncio.wait({self._task})
+        except asyncio.CancelledError:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await asyncio.wait({self._task})
+            raise
+        if self._task.cancelled():
+            self.checkpoint()
+            raise asyncio.CancelledError()
+        self.checkpoint()
+        return self._task.result()
+
+
+_current_scope: ContextVar[Optional[CancelScope]] = ContextVar("cancel_scope", default=None)
+
+
+def checkpoint():
+    """
+    Cooperative cancellation point.
+
+    Raises AnalysisCancelled when the analysis the caller runs for was
+    cancelled. Context variables reach threads started with
+    asyncio.to_thread, so CPU-bound loops running there call this too.
+    """
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.checkpoint()
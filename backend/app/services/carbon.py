@@ -0,0 +1,335 @@
+import asyncio
+import heapq
+import ipaddress
+import math
+import os
+import statistics
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+from app.services.browser_pool import browser_pool
+from app.services.telemetry import span
+
+GREEN_HOSTING_PATH = os.getenv(
+    "GREEN_HOSTING_PATH", os.path.join(os.path.dirname(__file__), "..", "data", "green_hosting.csv")
+)
+
+# The capture ends once the network has been idle for CARBON_IDLE_TIME
+# seconds after the load event, or after CARBON_CAPTURE_TIMEOUT seconds for
+# pages that keep streaming (video, polling)
+CARBON_CAPTURE_TIMEOUT = float(os.getenv("CARBON_CAPTURE_TIMEOUT", 30))
+CARBON_IDLE_TIME = float(os.getenv("CARBON_IDLE_TIME", 2))
+LARGEST_RESOURCES = 10
+
+# Sustainable Web Design model constants
+KWH_PER_GB = 0.81
+GRID_INTENSITY = 442  # g CO2e per kWh, global average
+RENEWABLE_INTENSITY = 50  # g CO2e per kWh
+DATA_CENTER_SHARE = 0.15  # Share of the energy used by hosting
+NEW_VISITOR_SHARE = 0.75
+RETURNING_VISITOR_SHARE = 0.25
+RETURNING_DATA_RATIO = 0.02  # Share of the data a returning visitor loads again
+
+# Log-normal fit of the emissions of a typical page view, used to rank a page
+MEDIAN_CO2_PER_VISIT = 0.8
+CO2_SPREAD = 1.0
+
+# Second-level labels under which country domains register sites (example.co.uk)
+SECOND_LEVEL_LABELS = {"ac", "co", "com", "edu", "gov", "net", "org", "ne", "or"}
+
+
+class PrefixTrie:
+    """
+    Binary trie of IP prefixes.
+
+    A lookup walks the address bits and returns the value of the longest
+    matching prefix, so its cost depends on the prefix length only, not on
+    the number of prefixes.
+    """
+
+    def __init__(self):
+        # Nodes are [zero child, one child, value]
+        self._roots = {4: [None, None, None], 6: [None, None, None]}
+        self.size = 0
+
+    def insert(self, prefix: str, value: Any):
+        network = ipaddress.ip_network(prefix, strict=False)
+        bits = int(network.network_address)
+        width = network.max_prefixlen
+        node = self._roots[network.version]
+        for position in range(network.prefixlen):
+            bit = (bits >> (width - 1 - position)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+        node[2] = value
+        self.size += 1
+
+    def lookup(self, address: str) -> Optional[Any]:
+        try:
+            ip = ipaddress.ip_address(address.strip("[]"))
+        except ValueError:
+            return None
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        bits = int(ip)
+        width = ip.max_prefixlen
+        node = self._roots[ip.version]
+        found = node[2]
+        for position in range(width):
+            node = node[(bits >> (width - 1 - position)) & 1]
+            if node is None:
+                break
+            if node[2] is not None:
+                found = node[2]
+        return found
+
+
+class GreenHostingIndex:
+    """Green hosting providers by IP prefix, loaded from the local dataset on first use"""
+
+    def __init__(self, path: str = GREEN_HOSTING_PATH):
+        self.path = path
+        self._trie: Optional[PrefixTrie] = None
+        self._lock = threading.Lock()
+
+    @property
+    def trie(self) -> PrefixTrie:
+        if self._trie is None:
+            with self._lock:
+                if self._trie is None:
+                    self._trie = self._load()
+        return self._trie
+
+    def provider(self, address: Optional[str]) -> Optional[str]:
+        """The green hosting provider serving an IP address, if any"""
+        return self.trie.lookup(address) if address else None
+
+    def _load(self) -> PrefixTrie:
+        trie = PrefixTrie()
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line or line.startswith("#"):
+                        continue
+                    prefix, _, provider = line.partition(",")
+                    try:
+                        trie.insert(prefix.strip(), provider.strip() or "unknown")
+                    except ValueError:
+                        logger.warning(f"Skipping invalid green hosting prefix {prefix!r}")
+        except OSError as e:
+            logger.warning(f"Green hosting dataset unavailable: {str(e)}")
+        logger.info(f"Loaded {trie.size} green hosting prefixes")
+        return trie
+
+
+def _site(host: str) -> str:
+    """Registrable part of a host name, used to tell first from third parties"""
+    labels = host.lower().rstrip(".").split(".")
+    if len(labels) <= 2 or all(label.isdigit() for label in labels):
+        return ".".join(labels)
+    if len(labels[-1]) == 2 and labels[-2] in SECOND_LEVEL_LABELS:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+def _bucket() -> Dict[str, int]:
+    return {"requests": 0, "transfer_bytes": 0, "decoded_bytes": 0}
+
+
+class TransferCapture:
+    """
+    Accumulates network traffic from DevTools events as it happens.
+
+    Only counters are kept: a request in flight holds its URL, type and
+    byte counts, and is folded into the totals when it finishes. Response
+    bodies are never read, so memory does not grow with the page weight.
+    """
+
+    def __init__(self, page_url: str, green_hosts: GreenHostingIndex):
+        self.site = _site(urlsplit(page_url).hostname or "")
+        self.green_hosts = green_hosts
+        self.inflight: Dict[str, Dict[str, Any]] = {}
+        self.by_type: Dict[str, Dict[str, int]] = {}
+        self.by_party = {"first_party": _bucket(), "third_party": _bucket()}
+        self.third_party_hosts: Dict[str, int] = {}
+        self.largest: List[tuple] = []
+        self.green_bytes = 0
+        self.document_ip: Optional[str] = None
+        self._providers: Dict[str, Optional[str]] = {}
+        self.last_activity = time.monotonic()
+
+    def on_request(self, event: Dict[str, Any]):
+        self.last_activity = time.monotonic()
+        request_id = event["requestId"]
+        previous = self.inflight.get(request_id)
+        if previous is not None and event.get("redirectResponse"):
+            # A redirect reuses the request id; settle the hop that ended
+            previous["encoded"] += event["redirectResponse"].get("encodedDataLength") or 0
+            self._fold(self.inflight.pop(request_id))
+        self.inflight[request_id] = {
+            "url": event["request"]["url"], "type": (event.get("type") or "other").lower(),
+            "encoded": 0, "decoded": 0, "ip": None,
+        }
+
+    def on_response(self, event: Dict[str, Any]):
+        self.last_activity = time.monotonic()
+        entry = self.inflight.get(event["requestId"])
+        if entry is None:
+            return
+        response = event["response"]
+        entry["ip"] = response.get("remoteIPAddress")
+        entry["type"] = (event.get("type") or entry["type"]).lower()
+        if entry["type"] == "document" and self.document_ip is None:
+            self.document_ip = entry["ip"]
+
+    def on_data(self, event: Dict[str, Any]):
+        self.last_activity = time.monotonic()
+        entry = self.inflight.get(event["requestId"])
+        if entry is not None:
+            entry["decoded"] += event.get("dataLength") or 0
+            entry["encoded"] += event.get("encodedDataLength") or 0
+
+    def on_finished(self, event: Dict[str, Any]):
+        self.last_activity = time.monotonic()
+        entry = self.inflight.pop(event["requestId"], None)
+        if entry is not None:
+            # The final count includes headers and chunks not reported as data
+            entry["encoded"] = max(entry["encoded"], event.get("encodedDataLength") or 0)
+            self._fold(entry)
+
+    def on_failed(self, event: Dict[str, Any]):
+        self.last_activity = time.monotonic()
+        entry = self.inflight.pop(event["requestId"], None)
+        if entry is not None:
+            self._fold(entry)
+
+    def close(self):
+        """Count what streams still open at the end of the capture transferred so far"""
+        for entry in self.inflight.values():
+            self._fold(entry)
+        self.inflight.clear()
+
+    def _fold(self, entry: Dict[str, Any]):
+        host = urlsplit(entry["url"]).hostname or ""
+        party = "first_party" if not host or _site(host) == self.site else "third_party"
+        for bucket in (self.by_type.setdefault(entry["type"], _bucket()), self.by_party[party]):
+            bucket["requests"] += 1
+            bucket["transfer_bytes"] += entry["encoded"]
+            bucket["decoded_bytes"] += entry["decoded"]
+        if party == "third_party":
+            self.third_party_hosts[host] = self.third_party_hosts.get(host, 0) + entry["encoded"]
+
+        ip = entry["ip"]
+        if ip:
+            if ip not in self._providers:
+                self._providers[ip] = self.green_hosts.provider(ip)
+            if self._providers[ip]:
+                self.green_bytes += entry["encoded"]
+
+        item = (entry["encoded"], entry["url"][:300], entry["type"])
+        if len(self.largest) < LARGEST_RESOURCES:
+            heapq.heappush(self.largest, item)
+        elif item > self.largest[0]:
+            heapq.heapreplace(self.largest, item)
+
+
+def estimate_emissions(transfer_bytes: int, green_share: float) -> Dict[str, float]:
+    """CO2 per page view according to the Sustainable Web Design model"""
+    energy = transfer_bytes / 1e9 * KWH_PER_GB
+    energy *= NEW_VISITOR_SHARE + RETURNING_VISITOR_SHARE * RETURNING_DATA_RATIO
+    hosting_intensity = green_share * RENEWABLE_INTENSITY + (1 - green_share) * GRID_INTENSITY
+    co2 = energy * (DATA_CENTER_SHARE * hosting_intensity + (1 - DATA_CENTER_SHARE) * GRID_INTENSITY)
+    cleaner_than = 100.0
+    if co2 > 0:
+        ranking = statistics.NormalDist(math.log(MEDIAN_CO2_PER_VISIT), CO2_SPREAD)
+        cleaner_than = 100 * (1 - ranking.cdf(math.log(co2)))
+    return {"co2_per_visit": co2, "energy_consumption": energy, "cleaner_than": round(cleaner_than)}
+
+
+def _recommendations(capture: TransferCapture, total: int, green: bool) -> List[str]:
+    recommendations = []
+
+    def share(resource_type: str) -> float:
+        return capture.by_type.get(resource_type, {}).get("transfer_bytes", 0) / total
+
+    if share("image") > 0.4:
+        recommendations.append("Optimize images to reduce file size (modern formats, responsive sizes)")
+    if share("media") > 0.2:
+        recommendations.append("Implement lazy loading for video and audio, and avoid autoplay")
+    if share("script") > 0.3:
+        recommendations.append("Reduce the amount of JavaScript shipped to the browser")
+    if share("font") > 0.1:
+        recommendations.append("Subset web fonts and limit the number of font files")
+    if capture.by_party["third_party"]["transfer_bytes"] / total > 0.5:
+        recommendations.append("Review third-party resources; they account for most of the transferred data")
+    if total > 2 * 1024 * 1024:
+        recommendations.append("Reduce the total page weight below 2 MB")
+    if not green:
+        recommendations.append("Use a green hosting provider")
+    return recommendations
+
+
+async def measure_carbon(url: str, device: str) -> Dict[str, Any]:
+    """
+    Measure the data a page transfers and the emissions it causes.
+
+    Args:
+        url: The URL to load
+        device: Device profile (desktop/mobile)
+
+    Returns:
+        Emission estimate with the transferred bytes by resource type and by
+        first/third party, and the green hosting status of the page
+    """
+    capture = TransferCapture(url, green_hosting)
+    async with browser_pool.context(device) as context:
+        page = await context.new_page()
+        cdp = await context.new_cdp_session(page)
+        cdp.on("Network.requestWillBeSent", capture.on_request)
+        cdp.on("Network.responseReceived", capture.on_response)
+        cdp.on("Network.dataReceived", capture.on_data)
+        cdp.on("Network.loadingFinished", capture.on_finished)
+        cdp.on("Network.loadingFailed", capture.on_failed)
+        # No buffer: bodies are counted as they arrive, never retained for DevTools
+        await cdp.send("Network.enable", {"maxTotalBufferSize": 0, "maxResourceBufferSize": 0})
+
+        deadline = time.monotonic() + CARBON_CAPTURE_TIMEOUT
+        with span("browser", "navigate"):
+            await page.goto(url, wait_until="load", timeout=CARBON_CAPTURE_TIMEOUT * 1000)
+        while time.monotonic() < deadline:
+            if not capture.inflight and time.monotonic() - capture.last_activity >= CARBON_IDLE_TIME:
+                break
+            await asyncio.sleep(0.1)
+        capture.close()
+
+    total = sum(bucket["transfer_bytes"] for bucket in capture.by_party.values())
+    decoded = sum(bucket["decoded_bytes"] for bucket in capture.by_party.values())
+    provider = green_hosting.provider(capture.document_ip)
+    green_share = capture.green_bytes / total if total else 0.0
+    emissions = estimate_emissions(total, green_share)
+    return {
+        **emissions,
+        "transfer_size": round(total / (1024 * 1024), 3),  # MB
+        "transfer_bytes": total,
+        "decoded_bytes": decoded,
+        "requests": sum(bucket["requests"] for bucket in capture.by_party.values()),
+        "by_type": capture.by_type,
+        "by_party": capture.by_party,
+        "third_party_hosts": dict(sorted(capture.third_party_hosts.items(), key=lambda h: -h[1])[:20]),
+        "largest_resources": [
+            {"url": u, "type": t, "transfer_bytes": size} for size, u, t in sorted(capture.largest, reverse=True)
+        ],
+        "green_hosting": {"green": provider is not None, "provider": provider, "ip": capture.document_ip},
+        "green_share": green_share,
+        "recommendations": _recommendations(capture, total or 1, provider is not None),
+    }
+
+
+# Process-wide green hosting index
+green_hosting = GreenHostingIndex()
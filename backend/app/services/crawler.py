@@ -0,0 +1,292 @@
+import asyncio
+import os
+import posixpath
+import time
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+
+import httpx
+from lxml import etree
+from loguru import logger
+
+from app.services.http_client import USER_AGENT, http_client, read_limited
+from app.services.snapshot import PageSnapshot, SNAPSHOT_MAX_BYTES, SNAPSHOT_TIMEOUT
+from app.services.telemetry import span
+
+# Crawl limits (overridable through environment variables)
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", 500))
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", 16))
+CRAWL_PER_HOST_CONCURRENCY = int(os.getenv("CRAWL_PER_HOST_CONCURRENCY", 4))
+CRAWL_DELAY = float(os.getenv("CRAWL_DELAY", 0.1))
+CRAWL_MAX_DELAY = float(os.getenv("CRAWL_MAX_DELAY", 5))
+ROBOTS_CACHE_TTL = float(os.getenv("ROBOTS_CACHE_TTL", 3600))
+# Longest robots.txt read; rules beyond it are ignored, as search engines do
+ROBOTS_MAX_BYTES = 512 * 1024
+
+# Query parameters that never change page content
+TRACKING_PARAMS = {"utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content", "gclid", "fbclid"}
+
+# Extensions of links that are not HTML pages
+SKIPPED_EXTENSIONS = {
+    ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".ico", ".pdf", ".zip", ".gz",
+    ".mp3", ".mp4", ".webm", ".avi", ".css", ".js", ".json", ".xml", ".woff", ".woff2",
+}
+
+
+def normalize_url(url: str, base: Optional[str] = None) -> Optional[str]:
+    """
+    Normalize a URL so that equivalent addresses deduplicate in the frontier.
+
+    Resolves relative references, lowercases scheme and host, drops default
+    ports, fragments and tracking parameters, removes dot segments and sorts
+    the query string.
+
+    Args:
+        url: The URL or reference to normalize
+        base: Base URL for relative references
+
+    Returns:
+        The normalized URL, or None for non-HTTP references
+    """
+    if base:
+        url = urljoin(base, url.strip())
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in ("http", "https") or not parts.hostname:
+        return None
+
+    host = parts.hostname.lower()
+    port = parts.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+
+    path = parts.path or "/"
+    normalized_path = posixpath.normpath(path)
+    if path.endswith("/") and normalized_path != "/":
+        normalized_path += "/"
+    if normalized_path.startswith("//"):
+        normalized_path = "/" + normalized_path.lstrip("/")
+
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                             if k.lower() not in TRACKING_PARAMS))
+    return urlunsplit((scheme, host, normalized_path, query, ""))
+
+
+class RobotsCache:
+    """Cached robots.txt rules per origin"""
+
+    def __init__(self, ttl: float = ROBOTS_CACHE_TTL):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, RobotFileParser]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def get(self, url: str) -> RobotFileParser:
+        """Return the parsed robots.txt for the origin of ``url``"""
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+
+        entry = self._entries.get(origin)
+        if entry and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+
+        lock = self._locks.setdefault(origin, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(origin)
+            if entry and time.monotonic() - entry[0] < self.ttl:
+                return entry[1]
+
+            parser = RobotFileParser(f"{origin}/robots.txt")
+            try:
+                with span("fetch", "robots"):
+                    response = await http_client.get(f"{origin}/robots.txt", max_bytes=ROBOTS_MAX_BYTES,
+                                                     timeout=SNAPSHOT_TIMEOUT)
+                if response.status_code >= 500:
+                    parser.disallow_all = True
+                elif response.status_code >= 400:
+                    parser.allow_all = True
+                else:
+                    parser.parse(response.text.splitlines())
+            except httpx.HTTPError as e:
+                logger.warning(f"Could not fetch robots.txt for {origin}: {str(e)}")
+                parser.allow_all = True
+
+            self._entries[origin] = (time.monotonic(), parser)
+            return parser
+
+
+class HostLimiter:
+    """Per-host concurrency cap plus a minimum delay between request starts"""
+
+    def __init__(self, concurrency: int = CRAWL_PER_HOST_CONCURRENCY, delay: float = CRAWL_DELAY):
+        self.concurrency = concurrency
+        self.delay = delay
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._next_start: Dict[str, float] = {}
+
+    async def acquire(self, host: str, delay: Optional[float] = None) -> asyncio.Semaphore:
+        semaphore = self._semaphores.setdefault(host, asyncio.Semaphore(self.concurrency))
+        await semaphore.acquire()
+
+        # Reserve the next start slot for this host, then wait for it
+        delay = min(max(self.delay, delay or 0), CRAWL_MAX_DELAY)
+        now = time.monotonic()
+        start = max(now, self._next_start.get(host, now))
+        self._next_start[host] = start + delay
+        if start > now:
+            await asyncio.sleep(start - now)
+        return semaphore
+
+
+# Robots rules are shared by every crawl in the process
+robots_cache = RobotsCache()
+
+
+class Crawler:
+    """
+    Concurrent crawler following links up to a maximum depth.
+
+    Pages are yielded as soon as they are downloaded, so analysis of early
+    pages overlaps with fetching later ones. Links are extracted while the
+    body is still streaming in and added to a deduplicated frontier; the crawl
+    stays on the start URL's host, respects robots.txt and stops scheduling
+    new pages once the page budget is used up.
+    """
+
+    def __init__(self, start_url: str, depth: int = 1, max_pages: int = CRAWL_MAX_PAGES,
+                 concurrency: int = CRAWL_CONCURRENCY):
+        self.start_url = normalize_url(start_url) or start_url
+        self.depth = max(depth, 1)
+        self.max_pages = max_pages
+        self.concurrency = concurrency
+        self.host = urlsplit(self.start_url).netloc
+        self.limiter = HostLimiter()
+
+        self._seen: Set[str] = set()
+        self._scheduled = 0
+        self._frontier: asyncio.Queue = asyncio.Queue()
+        self._output: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+        self.stats = {"pages_crawled": 0, "pages_failed": 0, "blocked_by_robots": 0, "max_depth_reached": 0}
+
+    async def crawl(self) -> AsyncIterator[Tuple[PageSnapshot, int]]:
+        """
+        Crawl the site.
+
+        Yields:
+            (snapshot, depth) for every fetched page, the start page first
+
+        Raises:
+            httpx.HTTPError: When the start page cannot be fetched
+        """
+        # The start page is fetched on its own, so it is the first page
+        # yielded and its failure fails the crawl; its links seed the frontier
+        self._seen.add(self.start_url)
+        self._scheduled += 1
+        start_page = await self._visit(self.start_url, 1)
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        finisher = asyncio.create_task(self._finish())
+
+        try:
+            yield start_page, 1
+            while True:
+                item = await self._output.get()
+                if item is None:
+                    break
+                yield item
+        finally:
+            finisher.cancel()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(finisher, *workers, return_exceptions=True)
+
+    def _enqueue(self, url: str, depth: int):
+        if url in self._seen or self._scheduled >= self.max_pages or depth > self.depth:
+            return
+        self._seen.add(url)
+        self._scheduled += 1
+        self._frontier.put_nowait((url, depth))
+
+    async def _finish(self):
+        await self._frontier.join()
+        await self._output.put(None)
+
+    async def _worker(self):
+        while True:
+            url, depth = await self._frontier.get()
+            try:
+                snapshot = await self._visit(url, depth)
+                if snapshot is not None:
+                    await self._output.put((snapshot, depth))
+            except Exception as e:
+                logger.warning(f"Failed to crawl {url}: {str(e)}")
+                self.stats["pages_failed"] += 1
+            finally:
+                self._frontier.task_done()
+
+    async def _visit(self, url: str, depth: int) -> Optional[PageSnapshot]:
+        """Fetch a page, or return None when robots.txt disallows it"""
+        robots = await robots_cache.get(url)
+        if url != self.start_url and not robots.can_fetch(USER_AGENT, url):
+            self.stats["blocked_by_robots"] += 1
+            return None
+
+        host = urlsplit(url).netloc
+        semaphore = await self.limiter.acquire(host, robots.crawl_delay(USER_AGENT))
+        try:
+            with span("fetch", "crawl"):
+                snapshot = await self._fetch(url, depth)
+        finally:
+            semaphore.release()
+
+        self.stats["pages_crawled"] += 1
+        self.stats["max_depth_reached"] = max(self.stats["max_depth_reached"], depth)
+        return snapshot
+
+    async def _fetch(self, url: str, depth: int) -> PageSnapshot:
+        """Download a page, extracting links from the stream as it arrives"""
+        started = time.perf_counter()
+        async with http_client.stream("GET", url, timeout=SNAPSHOT_TIMEOUT) as response:
+            headers_at = time.perf_counter()
+            final_url = str(response.url)
+            if url == self.start_url:
+                # Stay on the host the start page redirected to (e.g. www.)
+                self.host = urlsplit(final_url).netloc
+            follow = depth < self.depth and "html" in response.headers.get("content-type", "")
+            parser = etree.HTMLPullParser(events=("start",), tag=("a", "base")) if follow else None
+            base = final_url
+
+            def extract_links(chunk: bytes):
+                nonlocal base
+                parser.feed(chunk)
+                for _, element in parser.read_events():
+                    if element.tag == "base" and element.get("href"):
+                        base = urljoin(final_url, element.get("href"))
+                    elif element.tag == "a" and element.get("href"):
+                        self._discover(element.get("href"), base, depth + 1)
+
+            body, _ = await read_limited(response, SNAPSHOT_MAX_BYTES, extract_links if parser is not None else None)
+            finished = time.perf_counter()
+
+        return PageSnapshot(
+            url=url,
+            final_url=final_url,
+            status_code=response.status_code,
+            headers=response.headers,
+            body=body,
+            encoding=response.charset_encoding,
+            timings={
+                "time_to_headers": (headers_at - started) * 1000,
+                "download": (finished - headers_at) * 1000,
+                "total": (finished - started) * 1000,
+            }
+        )
+
+    def _discover(self, href: str, base: str, depth: int):
+        if href.startswith(("mailto:", "tel:", "javascript:", "#")):
+            return
+        url = normalize_url(href, base)
+        if not url or urlsplit(url).netloc != self.host:
+            return
+        if posixpath.splitext(urlsplit(url).path)[1].lower() in SKIPPED_EXTENSIONS:
+            return
+        self._enqueue(url, depth)
@@ -0,0 +1,51 @@
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import DeclarativeBase, sessionmaker
+
+# Database location (SQLite in WAL mode is enough for a single machine)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///data/cometweb.db")
+
+
+class Base(DeclarativeBase):
+    """Declarative base shared by all persisted models"""
+
+
+def _create_engine(url: str) -> Engine:
+    if url.startswith("sqlite"):
+        path = url.split("///", 1)[-1]
+        if path and path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        engine = create_engine(url, connect_args={"check_same_thread": False, "timeout": 30})
+
+        @event.listens_for(engine, "connect")
+        def _set_sqlite_pragmas(dbapi_connection, connection_record):
+            # Let SQLAlchemy emit BEGIN itself (see _begin_sqlite_transaction)
+            dbapi_connection.isolation_level = None
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA foreign_keys=ON")
+            cursor.close()
+
+        @event.listens_for(engine, "begin")
+        def _begin_sqlite_transaction(connection):
+            # Read-modify-write transactions take the write lock up front so
+            # concurrent writers wait on busy_timeout instead of failing
+            mode = "IMMEDIATE" if connection.get_execution_options().get("sqlite_immediate") else "DEFERRED"
+            connection.exec_driver_sql(f"BEGIN {mode}")
+
+        return engine
+    return create_engine(url, pool_pre_ping=True)
+
+
+engine = _create_engine(DATABASE_URL)
+SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
+
+# Sessions for transactions that read and then write the same rows
+WriteSession = sessionmaker(bind=engine.execution_options(sqlite_immediate=True), expire_on_commit=False)
+
+
+def init_db():
+    """Create any missing tables"""
+    Base.metadata.create_all(engine)
@@ -0,0 +1,212 @@
+import asyncio
+import json
+import os
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from loguru import logger
+from sqlalchemy import DateTime, Integer, String, Text, delete, func, select
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.services.database import Base, SessionLocal, WriteSession, init_db
+
+# How often the event bus looks for new events while clients are subscribed
+EVENT_POLL_INTERVAL = float(os.getenv("EVENT_POLL_INTERVAL", 0.25))
+# How long events are kept for clients resuming a stream
+EVENT_RETENTION = int(os.getenv("EVENT_RETENTION", 24 * 3600))
+EVENT_PRUNE_INTERVAL = float(os.getenv("EVENT_PRUNE_INTERVAL", 3600))
+# Events buffered per subscriber before the slowest clients are dropped
+EVENT_SUBSCRIBER_BUFFER = int(os.getenv("EVENT_SUBSCRIBER_BUFFER", 1000))
+# Largest event stored in the log; bigger events are published without
+# their results, which clients read from the task instead
+EVENT_MAX_BYTES = int(os.getenv("EVENT_MAX_BYTES", 64 * 1024))
+
+# Event fields left out of events larger than EVENT_MAX_BYTES
+RESULT_FIELDS = ("result", "results")
+
+# Event types
+STATUS = "status"
+MODULE = "module"
+PAGE = "page"
+
+
+class TaskEvent(Base):
+    """
+    A progress event of an analysis task.
+
+    The autoincrement ID orders events across all tasks and is the event ID
+    clients resume from.
+    """
+
+    __tablename__ = "analysis_task_events"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    task_id: Mapped[str] = mapped_column(String(36), index=True)
+    type: Mapped[str] = mapped_column(String(16))
+    data: Mapped[str] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+
+
+def _as_dict(row: TaskEvent) -> Dict[str, Any]:
+    return {"id": row.id, "task_id": row.task_id, "type": row.type, "data": json.loads(row.data)}
+
+
+class EventLog:
+    """Durable log of task events, written by whichever process runs the task"""
+
+    def __init__(self):
+        self._schema_ready = False
+
+    def _ensure_schema(self):
+        if not self._schema_ready:
+            init_db()
+            self._schema_ready = True
+
+    async def publish(self, task_id: str, type: str, data: Dict[str, Any]):
+        """Append an event; failures are logged and never interrupt the analysis"""
+        try:
+            await asyncio.to_thread(self._append, task_id, type, data)
+        except Exception as e:
+            logger.error(f"Failed to publish {type} event of task {task_id}: {str(e)}")
+
+    async def history(self, task_id: str, after_id: int = 0) -> List[Dict[str, Any]]:
+        """Events of a task with an ID above ``after_id``"""
+        return await asyncio.to_thread(self._history, task_id, after_id)
+
+    async def since(self, after_id: int, limit: int = 500) -> List[Dict[str, Any]]:
+        """Events of all tasks with an ID above ``after_id``"""
+        return await asyncio.to_thread(self._since, after_id, limit)
+
+    async def last_id(self) -> int:
+        return await asyncio.to_thread(self._last_id)
+
+    async def prune(self):
+        """Delete events older than the retention period"""
+        await asyncio.to_thread(self._prune)
+
+    def _append(self, task_id: str, type: str, data: Dict[str, Any]):
+        self._ensure_schema()
+        body = json.dumps(data, default=str)
+        if len(body) > EVENT_MAX_BYTES:
+            # The task store keeps the results; the event only announces them
+            body = json.dumps({**{k: v for k, v in data.items() if k not in RESULT_FIELDS}, "truncated": True},
+                              default=str)
+        with WriteSession.begin() as session:
+            session.add(TaskEvent(task_id=task_id, type=type, data=body, created_at=datetime.now()))
+
+    def _history(self, task_id: str, after_id: int) -> List[Dict[str, Any]]:
+        self._ensure_schema()
+        with SessionLocal() as session:
+            rows = session.scalars(
+                select(TaskEvent).where(TaskEvent.task_id == task_id, TaskEvent.id > after_id).order_by(TaskEvent.id)
+            )
+            return [_as_dict(row) for row in rows]
+
+    def _since(self, after_id: int, limit: int) -> List[Dict[str, Any]]:
+        with SessionLocal() as session:
+            rows = session.scalars(
+                select(TaskEvent).where(TaskEvent.id > after_id).order_by(TaskEvent.id).limit(limit)
+            )
+            return [_as_dict(row) for row in rows]
+
+    def _last_id(self) -> int:
+        self._ensure_schema()
+        with SessionLocal() as session:
+            return session.scalar(select(func.max(TaskEvent.id))) or 0
+
+    def _prune(self):
+        self._ensure_schema()
+        with WriteSession.begin() as session:
+            session.execute(
+                delete(TaskEvent).where(TaskEvent.created_at < datetime.now() - timedelta(seconds=EVENT_RETENTION))
+            )
+
+
+class EventBus:
+    """
+    Fans task events out to subscribers of this process.
+
+    A single background loop reads new events from the event log, and only
+    while someone is subscribed, then hands each event to the queues of the
+    subscribers of its task. Subscribers therefore cost one queue each,
+    however many of them watch the same task. When the first subscriber
+    arrives the loop starts from the end of the log: events published
+    while nobody listened are read from the task's history instead.
+    """
+
+    def __init__(self, log: EventLog):
+        self.log = log
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._wakeup = asyncio.Event()
+        self._poller: Optional[asyncio.Task] = None
+        self._position = 0
+
+    async def start(self):
+        if self._poller is None:
+            self._position = await self.log.last_id()
+            self._poller = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
+            self._poller = None
+
+    @asynccontextmanager
+    async def subscribe(self, task_id: str) -> AsyncIterator[asyncio.Queue]:
+        """
+        Receive the live events of a task through a queue.
+
+        A ``None`` item means the subscriber fell too far behind and was
+        dropped.
+        """
+        await self.start()
+        if not self._subscribers:
+            self._position = await self.log.last_id()
+        queue: asyncio.Queue = asyncio.Queue(EVENT_SUBSCRIBER_BUFFER)
+        self._subscribers[task_id].add(queue)
+        self._wakeup.set()
+        try:
+            yield queue
+        finally:
+            self._subscribers[task_id].discard(queue)
+            if not self._subscribers[task_id]:
+                del self._subscribers[task_id]
+
+    async def _poll(self):
+        while True:
+            if not self._subscribers:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            try:
+                events = await self.log.since(self._position)
+                for event in events:
+                    if event["id"] <= self._position:
+                        # Skipped by a subscriber arriving while the events were read
+                        continue
+                    self._position = event["id"]
+                    for queue in list(self._subscribers.get(event["task_id"], ())):
+                        try:
+                            queue.put_nowait(event)
+                        except asyncio.QueueFull:
+                            # The client resumes from its last event ID
+                            logger.warning(f"Dropping slow subscriber of task {event['task_id']}")
+                            self._subscribers[event["task_id"]].discard(queue)
+                            while not queue.empty():
+                                queue.get_nowait()
+                            queue.put_nowait(None)
+            except Exception as e:
+                logger.error(f"Event bus poll failed: {str(e)}")
+                events = []
+            if not events:
+                await asyncio.sleep(EVENT_POLL_INTERVAL)
+
+
+# Process-wide event log and bus
+event_log = EventLog()
+event_bus = EventBus(event_log)
@@ -0,0 +1,558 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from app.services.snapshot import PageSnapshot
+
+# Fingerprint database in the Wappalyzer format (a full Wappalyzer export can
+# be dropped in) and where its compiled index is cached between starts
+TECH_FINGERPRINTS_PATH = os.getenv(
+    "TECH_FINGERPRINTS_PATH", os.path.join(os.path.dirname(__file__), "..", "data", "technologies.json")
+)
+TECH_INDEX_CACHE = os.getenv("TECH_INDEX_CACHE", "data/fingerprints.idx")
+
+# Bumped whenever the index layout changes, invalidating cached indexes
+INDEX_VERSION = 2
+
+# Shortest literal worth indexing; patterns without one are always evaluated
+MIN_LITERAL_LENGTH = 3
+
+# Fields scanned as a whole with the combined literal matcher
+SCANNED_FIELDS = ("html", "scripts", "scriptSrc", "url")
+# Fields looked up by name (header, cookie or meta name)
+KEYED_FIELDS = ("headers", "cookies", "meta")
+
+# Categories reported under their own keys in the module result
+CATEGORY_GROUPS = {
+    "frameworks": {"JavaScript frameworks", "Web frameworks", "UI frameworks", "Static site generator"},
+    "analytics": {"Analytics", "Tag managers"},
+    "cms": {"CMS", "Ecommerce", "Blogs"},
+}
+SINGLE_CATEGORIES = {"server": "Web servers", "cdn": "CDN"}
+
+
+@dataclass
+class Signature:
+    """One pattern of a technology"""
+
+    tech: str
+    pattern: str
+    version: str = ""
+    confidence: int = 100
+
+
+@dataclass
+class FieldIndex:
+    """
+    Signatures of one scanned field, indexed by a literal every match contains.
+
+    ``literals`` lists the distinct literals longest first; ``covers`` maps a
+    literal to the indexes of all literals it starts with (itself included),
+    since only the longest literal starting at a position is reported by the
+    combined matcher.
+    """
+
+    literals: List[str] = field(default_factory=list)
+    covers: Dict[str, List[int]] = field(default_factory=dict)
+    by_literal: List[List[int]] = field(default_factory=list)
+    always: List[int] = field(default_factory=list)
+
+
+def _parse_pattern(raw: str) -> Tuple[str, str, int]:
+    """Split a Wappalyzer pattern into (regex, version template, confidence)"""
+    parts = raw.split("\\;")
+    version, confidence = "", 100
+    for part in parts[1:]:
+        key, _, value = part.partition(":")
+        if key == "version":
+            version = value
+        elif key == "confidence" and value.isdigit():
+            confidence = int(value)
+    return parts[0], version, confidence
+
+
+def _skip_group(pattern: str, i: int) -> int:
+    """Index just after the group or character class starting at ``i``"""
+    if pattern[i] == "[":
+        j = i + 1
+        if j < len(pattern) and pattern[j] == "^":
+            j += 1
+        if j < len(pattern) and pattern[j] == "]":
+            j += 1
+        while j < len(pattern) and pattern[j] != "]":
+            j += 2 if pattern[j] == "\\" else 1
+        return j + 1
+
+    depth, j = 0, i
+    while j < len(pattern):
+        c = pattern[j]
+        if c == "\\":
+            j += 2
+            continue
+        if c == "[":
+            j = _skip_group(pattern, j)
+            continue
+        if c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+            if depth == 0:
+                return j + 1
+        j += 1
+    return j
+
+
+def _split_branches(pattern: str) -> List[str]:
+    """Split a pattern on its top-level alternation"""
+    branches, start, i = [], 0, 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            i += 2
+        elif c in "([":
+            i = _skip_group(pattern, i)
+        elif c == "|":
+            branches.append(pattern[start:i])
+            start = i = i + 1
+        else:
+            i += 1
+    branches.append(pattern[start:])
+    return branches
+
+
+# Escapes standing for a single literal character
+_CODE_ESCAPE = re.compile(r"\\(?:x([0-9a-fA-F]{2})|u([0-9a-fA-F]{4})|U([0-9a-fA-F]{8}))")
+_CONTROL_ESCAPES = {"t": "\t", "n": "\n", "r": "\r", "f": "\f", "v": "\v", "a": "\a"}
+# Other escapes, with the digits or name that belong to them
+_OTHER_ESCAPE = re.compile(r"\\(?:\d+|N\{[^}]*\}|.)", re.S)
+
+
+def _literal_runs(branch: str) -> List[str]:
+    """Literal text every match of an alternation-free pattern contains"""
+    runs, current, i = [], [], 0
+
+    def flush():
+        if current:
+            runs.append("".join(current))
+            current.clear()
+
+    while i < len(branch):
+        c = branch[i]
+        if c == "\\":
+            escaped = branch[i + 1:i + 2]
+            code = _CODE_ESCAPE.match(branch, i)
+            if code is not None:
+                # \xHH, \uHHHH and \UHHHHHHHH stand for one character
+                char, size = chr(int(code.group(code.lastindex), 16)), code.end() - i
+            elif escaped in _CONTROL_ESCAPES:
+                char, size = _CONTROL_ESCAPES[escaped], 2
+            elif not escaped or escaped.isalnum():
+                # Character classes, anchors, back references and octal or
+                # named characters, with all of their digits or name
+                flush()
+                end = _OTHER_ESCAPE.match(branch, i)
+                i = end.end() if end is not None else i + 2
+                continue
+            else:
+                char, size = escaped, 2
+        elif c in "([":
+            flush()
+            i = _skip_group(branch, i)
+            continue
+        elif c in "?*+":
+            flush()
+            i += 1
+            continue
+        elif c == "{":
+            flush()
+            i = branch.find("}", i) + 1 or len(branch)
+            continue
+        elif c in ".^$":
+            flush()
+            i += 1
+            continue
+        else:
+            char, size = c, 1
+
+        following = branch[i + size:i + size + 1]
+        if following in ("?", "*") or (following == "{" and branch[i + size + 1:i + size + 2] in ("0", ",")):
+            # The character is optional
+            flush()
+        elif following in ("+", "{"):
+            current.append(char)
+            flush()
+        else:
+            current.append(char)
+        i += size
+    flush()
+    return runs
+
+
+def required_literals(pattern: str) -> Optional[List[str]]:
+    """
+    Lowercase literals such that every match contains at least one of them.
+
+    Returns None when no literal of useful length can be derived.
+    """
+    literals = []
+    for branch in _split_branches(pattern):
+        best = max(_literal_runs(branch), key=len, default="")
+        if len(best) < MIN_LITERAL_LENGTH:
+            return None
+        literals.append(best.lower())
+    return literals
+
+
+def _trie_regex(literals: Iterable[str]) -> str:
+    """Regex matching any of the literals, factored on common prefixes"""
+    trie: Dict[str, Any] = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node: Dict[str, Any]) -> str:
+        end = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if end:
+            # Try longer literals first, so the longest one starting here wins
+            body = "(?:" + body + ")?" if len(branches) == 1 else body + "?"
+        return body
+
+    return build(trie)
+
+
+class FingerprintIndex:
+    """
+    Compiled form of the fingerprint database.
+
+    Scanned fields (the HTML, inline scripts, script URLs and the page URL)
+    get one combined matcher each: a prefix-factored regex over the literals
+    of all their signatures. One pass of it over the text yields every
+    signature that can possibly match, and only those are evaluated.
+    Headers, cookies and meta tags are looked up by name.
+    """
+
+    def __init__(self, database: Dict[str, Any]):
+        self.categories = {str(k): (v["name"] if isinstance(v, dict) else v)
+                           for k, v in database.get("categories", {}).items()}
+        self.technologies: Dict[str, Dict[str, Any]] = {}
+        self.signatures: List[Signature] = []
+        self.fields: Dict[str, FieldIndex] = {name: FieldIndex() for name in SCANNED_FIELDS}
+        self.keyed: Dict[str, Dict[str, List[int]]] = {name: {} for name in KEYED_FIELDS}
+
+        literal_ids: Dict[str, Dict[str, int]] = {name: {} for name in SCANNED_FIELDS}
+        for tech, spec in database.get("technologies", database).items():
+            self.technologies[tech] = {
+                "categories": [self.categories.get(str(c), str(c)) for c in spec.get("cats", [])],
+                "implies": [_parse_pattern(i) for i in _as_list(spec.get("implies"))],
+                "excludes": _as_list(spec.get("excludes")),
+            }
+            for name in ("html", "scriptSrc", "scripts", "url"):
+                for raw in _as_list(spec.get(name)):
+                    self._add_scanned(name, self._add(tech, raw), literal_ids[name])
+            for global_name, raw in (spec.get("js") or {}).items():
+                # Globals cannot be evaluated without running the page; a
+                # reference to them in an inline script is weaker evidence
+                _, _, confidence = _parse_pattern(raw)
+                root = re.escape(global_name.split(".")[0])
+                pattern = rf"(?<![\w$.]){root}(?![\w$])\;confidence:{max(confidence // 2, 1)}"
+                self._add_scanned("scripts", self._add(tech, pattern), literal_ids["scripts"])
+            for name in KEYED_FIELDS:
+                for key, raw in (spec.get(name) or {}).items():
+                    self.keyed[name].setdefault(key.lower(), []).append(self._add(tech, raw))
+
+        for name, index in self.fields.items():
+            index.literals.sort(key=len, reverse=True)
+            order = {literal: position for position, literal in enumerate(index.literals)}
+            index.by_literal = [index.by_literal[literal_ids[name][literal]] for literal in index.literals]
+            literal_set = set(index.literals)
+            index.covers = {
+                literal: [order[literal[:end]] for end in range(MIN_LITERAL_LENGTH, len(literal) + 1)
+                          if literal[:end] in literal_set]
+                for literal in index.literals
+            }
+
+    def _add(self, tech: str, raw: str) -> int:
+        pattern, version, confidence = _parse_pattern(raw)
+        self.signatures.append(Signature(tech, pattern, version, confidence))
+        return len(self.signatures) - 1
+
+    def _add_scanned(self, name: str, signature_id: int, literal_ids: Dict[str, int]):
+        index = self.fields[name]
+        literals = required_literals(self.signatures[signature_id].pattern)
+        if literals is None:
+            index.always.append(signature_id)
+            return
+        for literal in set(literals):
+            if literal not in literal_ids:
+                literal_ids[literal] = len(index.by_literal)
+                index.literals.append(literal)
+                index.by_literal.append([])
+            index.by_literal[literal_ids[literal]].append(signature_id)
+
+
+def _as_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+
+def _format_version(template: str, match: re.Match) -> str:
+    def group(ref: re.Match) -> str:
+        number = int(ref.group(1))
+        return (match.group(number) or "") if number <= match.re.groups else ""
+
+    version = re.sub(r"\\(\d+)", group, template)
+    ternary = re.fullmatch(r"(.*?)\?(.*?):(.*)", version)
+    if ternary:
+        version = ternary.group(2) if ternary.group(1) else ternary.group(3)
+    return version.strip(" .")
+
+
+class FingerprintEngine:
+    """
+    Detects the technologies used by a page from a single snapshot.
+
+    The fingerprint database is compiled into a FingerprintIndex on first
+    use. The index is pickled to disk, keyed by the database content, so
+    worker processes only load it; signature regexes are compiled lazily the
+    first time a page makes them a candidate.
+    """
+
+    def __init__(self, database_path: str = TECH_FINGERPRINTS_PATH, cache_path: Optional[str] = TECH_INDEX_CACHE):
+        self.database_path = database_path
+        self.cache_path = cache_path
+        self._index: Optional[FingerprintIndex] = None
+        self._database_key = ""
+        self._matchers: Dict[str, re.Pattern] = {}
+        self._compiled: Dict[int, Optional[re.Pattern]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def index(self) -> FingerprintIndex:
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    index = self._load_index()
+                    self._matchers = {
+                        name: re.compile("(?=(" + _trie_regex(field_index.literals) + "))")
+                        for name, field_index in index.fields.items() if field_index.literals
+                    }
+                    self._index = index
+        return self._index
+
+    @property
+    def database_key(self) -> str:
+        """Identifies the fingerprint database; part of the key of memoized matches"""
+        self.index  # Loading the index computes the key
+        return self._database_key
+
+    def detect(self, snapshot: PageSnapshot,
+               script_evidence: Iterable[Dict[str, Dict[str, Any]]] = ()) -> List[Dict[str, Any]]:
+        """
+        Detect technologies on a page.
+
+        Args:
+            snapshot: The fetched page
+            script_evidence: Matches in the page's external scripts, as
+                returned by scan_script
+
+        Returns:
+            Detected technologies with version, confidence and categories,
+            most confident first
+        """
+        evidence = self._scan(self._fields(snapshot))
+        for found in script_evidence:
+            for tech, script_found in found.items():
+                merged = evidence.setdefault(tech, {"confidence": {}, "versions": set()})
+                merged["confidence"].update({int(k): v for k, v in script_found["confidence"].items()})
+                merged["versions"].update(script_found["versions"])
+        return self._resolve(evidence)
+
+    def scan_script(self, text: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Match the content of an external script against the script signatures.
+
+        Returns:
+            JSON-serializable evidence to pass to detect, so the result can be
+            memoized per script content
+        """
+        evidence = self._scan({"scanned": {"scripts": [text]}, "keyed": {}})
+        return {
+            tech: {"confidence": found["confidence"], "versions": sorted(found["versions"])}
+            for tech, found in evidence.items()
+        }
+
+    def _scan(self, fields: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        index = self.index
+        evidence: Dict[str, Dict[str, Any]] = {}
+
+        def record(signature_id: int, texts: Iterable[str]):
+            signature = index.signatures[signature_id]
+            regex = self._regex(signature_id)
+            if regex is None:
+                return
+            for text in texts:
+                match = regex.search(text)
+                if match is None:
+                    continue
+                found = evidence.setdefault(signature.tech, {"confidence": {}, "versions": set()})
+                found["confidence"][signature_id] = signature.confidence
+                if signature.version:
+                    version = _format_version(signature.version, match)
+                    if version:
+                        found["versions"].add(version)
+                return
+
+        for name, texts in fields["scanned"].items():
+            for signature_id in self._candidates(name, texts):
+                record(signature_id, texts)
+
+        for name, values in fields["keyed"].items():
+            for key, texts in values.items():
+                for signature_id in index.keyed[name].get(key, ()):
+                    record(signature_id, texts)
+
+        return evidence
+
+    def _candidates(self, name: str, texts: List[str]) -> Set[int]:
+        field_index = self.index.fields[name]
+        candidates = set(field_index.always)
+        matcher = self._matchers.get(name)
+        if matcher is None or not texts:
+            return candidates
+        seen: Set[str] = set()
+        for text in texts:
+            for match in matcher.finditer(text.lower()):
+                literal = match.group(1)
+                if literal in seen:
+                    continue
+                seen.add(literal)
+                for position in field_index.covers[literal]:
+                    candidates.update(field_index.by_literal[position])
+        return candidates
+
+    def _regex(self, signature_id: int) -> Optional[re.Pattern]:
+        if signature_id not in self._compiled:
+            pattern = self.index.signatures[signature_id].pattern
+            try:
+                self._compiled[signature_id] = re.compile(pattern, re.IGNORECASE)
+            except re.error as e:
+                logger.warning(f"Skipping invalid fingerprint pattern {pattern!r}: {str(e)}")
+                self._compiled[signature_id] = None
+        return self._compiled[signature_id]
+
+    def _fields(self, snapshot: PageSnapshot) -> Dict[str, Dict[str, Any]]:
+        scanned: Dict[str, List[str]] = {"url": [snapshot.final_url], "html": [], "scripts": [], "scriptSrc": []}
+        meta: Dict[str, List[str]] = {}
+        tree = snapshot.tree
+        if tree is not None:
+            scanned["html"].append(snapshot.html)
+            for script in tree.iter("script"):
+                if script.get("src"):
+                    scanned["scriptSrc"].append(script.get("src"))
+                elif script.text:
+                    scanned["scripts"].append(script.text)
+            for element in tree.iter("meta"):
+                key = element.get("name") or element.get("property") or element.get("http-equiv")
+                if key and element.get("content") is not None:
+                    meta.setdefault(key.lower(), []).append(element.get("content"))
+
+        headers = {name: [value] for name, value in snapshot.headers.items()}
+        cookies: Dict[str, List[str]] = {}
+        for cookie in snapshot.cookies:
+            name, _, rest = cookie.partition("=")
+            if name.strip():
+                cookies.setdefault(name.strip().lower(), []).append(rest.split(";", 1)[0])
+
+        return {"scanned": scanned, "keyed": {"headers": headers, "cookies": cookies, "meta": meta}}
+
+    def _resolve(self, evidence: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        index = self.index
+        detected = {
+            tech: {"confidence": min(sum(found["confidence"].values()), 100),
+                   "version": max(found["versions"], key=len, default=None)}
+            for tech, found in evidence.items()
+        }
+
+        # Technologies implied by detected ones, e.g. WordPress implies PHP
+        pending = list(detected)
+        while pending:
+            tech = pending.pop()
+            for implied, _, confidence in index.technologies.get(tech, {}).get("implies", []):
+                if implied in index.technologies and implied not in detected:
+                    detected[implied] = {
+                        "confidence": min(confidence, detected[tech]["confidence"]),
+                        "version": None,
+                        "implied_by": tech,
+                    }
+                    pending.append(implied)
+
+        for tech in list(detected):
+            for excluded in index.technologies.get(tech, {}).get("excludes", []):
+                detected.pop(excluded, None)
+
+        return sorted(
+            ({"name": tech, **found, "categories": index.technologies[tech]["categories"]}
+             for tech, found in detected.items()),
+            key=lambda t: (-t["confidence"], t["name"])
+        )
+
+    def _load_index(self) -> FingerprintIndex:
+        with open(self.database_path, "rb") as f:
+            raw = f.read()
+        key = hashlib.sha256(raw + str(INDEX_VERSION).encode()).hexdigest()
+        self._database_key = key
+
+        if self.cache_path and os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, "rb") as f:
+                    cached_key, index = pickle.load(f)
+                if cached_key == key:
+                    return index
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable fingerprint index cache: {str(e)}")
+
+        index = FingerprintIndex(json.loads(raw))
+        logger.info(f"Compiled {len(index.signatures)} fingerprints of {len(index.technologies)} technologies")
+        if self.cache_path:
+            try:
+                os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+                temporary = f"{self.cache_path}.{os.getpid()}"
+                with open(temporary, "wb") as f:
+                    pickle.dump((key, index), f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(temporary, self.cache_path)
+            except OSError as e:
+                logger.warning(f"Could not cache the fingerprint index: {str(e)}")
+        return index
+
+
+def group_by_category(technologies: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Arrange detected technologies under the keys reported by the technology module"""
+    grouped: Dict[str, Any] = {key: [] for key in CATEGORY_GROUPS}
+    grouped.update({key: None for key in SINGLE_CATEGORIES})
+    for tech in technologies:
+        entry = {"name": tech["name"], "version": tech["version"], "confidence": tech["confidence"]}
+        for key, categories in CATEGORY_GROUPS.items():
+            if categories.intersection(tech["categories"]):
+                grouped[key].append(entry)
+        for key, category in SINGLE_CATEGORIES.items():
+            if grouped[key] is None and category in tech["categories"]:
+                grouped[key] = entry
+    return grouped
+
+
+# Process-wide fingerprint engine
+fingerprint_engine = FingerprintEngine()
@@ -0,0 +1,387 @@
+import asyncio
+import ipaddress
+import os
+import random
+import socket
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import httpcore
+import httpx
+from loguru import logger
+
+# Identification of the analyzer towards audited sites
+USER_AGENT = os.getenv("ANALYZER_USER_AGENT", "CometWebAudit/0.1 (+https://cometweb.app)")
+
+# Connection pool limits (overridable through environment variables)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 200))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", 8))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 30))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() != "false"
+
+# Retries of idempotent requests failing with a connection error, a timeout
+# or a retryable status; waits are drawn uniformly from [0, base * 2^attempt]
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", 2))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", 0.5))
+HTTP_RETRY_MAX_WAIT = float(os.getenv("HTTP_RETRY_MAX_WAIT", 10))
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.ReadTimeout, httpx.RemoteProtocolError)
+
+# How long resolved addresses (and failed lookups) are reused
+DNS_CACHE_TTL = float(os.getenv("DNS_CACHE_TTL", 300))
+DNS_NEGATIVE_TTL = float(os.getenv("DNS_NEGATIVE_TTL", 30))
+DNS_CACHE_SIZE = int(os.getenv("DNS_CACHE_SIZE", 4096))
+
+
+class DNSCache:
+    """
+    Resolved addresses per host name, reused for DNS_CACHE_TTL seconds.
+
+    Concurrent lookups of the same name share one resolution. The system
+    resolver does not report record TTLs, so entries expire after a fixed
+    time; failed lookups are remembered for DNS_NEGATIVE_TTL seconds so a
+    dead domain does not cost a timeout per request.
+    """
+
+    def __init__(self, ttl: float = DNS_CACHE_TTL, negative_ttl: float = DNS_NEGATIVE_TTL,
+                 max_size: int = DNS_CACHE_SIZE):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._entries: Dict[str, Tuple[float, List[str], Optional[OSError]]] = {}
+        self._lookups: Dict[str, asyncio.Future] = {}
+
+    async def resolve(self, host: str) -> List[str]:
+        """
+        Addresses of ``host``, IPv4 first.
+
+        Raises:
+            OSError: When the name does not resolve
+        """
+        try:
+            ipaddress.ip_address(host)
+            return [host]
+        except ValueError:
+            pass
+
+        entry = self._entries.get(host)
+        if entry is not None and entry[0] > time.monotonic():
+            if entry[2] is not None:
+                raise entry[2]
+            return entry[1]
+
+        if host not in self._lookups:
+            self._lookups[host] = asyncio.ensure_future(self._lookup(host))
+            self._lookups[host].add_done_callback(lambda _: self._lookups.pop(host, None))
+        return await asyncio.shield(self._lookups[host])
+
+    def forget(self, host: str):
+        self._entries.pop(host, None)
+
+    async def _lookup(self, host: str) -> List[str]:
+        if len(self._entries) >= self.max_size:
+            now = time.monotonic()
+            self._entries = {name: e for name, e in self._entries.items() if e[0] > now}
+            if len(self._entries) >= self.max_size:
+                self._entries.clear()
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        except OSError as e:
+            self._entries[host] = (time.monotonic() + self.negative_ttl, [], e)
+            raise
+        addresses = []
+        for family, _, _, _, sockaddr in sorted(infos, key=lambda info: info[0] != socket.AF_INET):
+            if sockaddr[0] not in addresses:
+                addresses.append(sockaddr[0])
+        self._entries[host] = (time.monotonic() + self.ttl, addresses, None)
+        return addresses
+
+
+class CachedDNSBackend(httpcore.AnyIOBackend):
+    """Network backend connecting to addresses from a DNSCache"""
+
+    def __init__(self, dns: DNSCache):
+        self.dns = dns
+
+    async def connect_tcp(self, host: str, port: int, timeout: Optional[float] = None,
+                          local_address: Optional[str] = None, socket_options=None) -> httpcore.AsyncNetworkStream:
+        try:
+            addresses = await self.dns.resolve(host)
+        except OSError as e:
+            raise httpcore.ConnectError(str(e)) from e
+
+        error: Optional[Exception] = None
+        for address in addresses:
+            try:
+                # TLS still verifies and sends SNI for the host name, which
+                # httpcore takes from the request origin, not from here
+                return await super().connect_tcp(address, port, timeout=timeout, local_address=local_address,
+                                                 socket_options=socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        # Every cached address failed; look the name up again next time
+        self.dns.forget(host)
+        raise error
+
+
+class _HostSlotStream(httpx.AsyncByteStream):
+    """Response body stream releasing its host slot once closed"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+
+class _HostSlots:
+    """Request slots of one origin and the number of requests holding or awaiting one"""
+
+    def __init__(self, size: int):
+        self.semaphore = asyncio.Semaphore(size)
+        self.users = 0
+
+
+class PooledTransport(httpx.AsyncHTTPTransport):
+    """
+    HTTP transport with a DNS cache and a cap on concurrent requests per host.
+
+    The global connection cap is the pool's own limit; the per-host cap
+    holds a slot from sending a request until its response is closed, so a
+    single site cannot take the whole pool. Slots of an origin are dropped
+    once no request holds or awaits one, so crawling many sites does not
+    accumulate them.
+    """
+
+    def __init__(self, dns: DNSCache, max_connections: int, max_per_host: int, http2: bool):
+        # The base initializer only builds the connection pool; it is not
+        # called, since the pool built here replaces it to connect through
+        # the DNS cache
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            http1=True,
+            http2=http2,
+            network_backend=CachedDNSBackend(dns),
+        )
+        self.max_per_host = max_per_host
+        self._hosts: Dict[Tuple[str, str, Optional[int]], _HostSlots] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        origin = (request.url.scheme, request.url.host, request.url.port)
+        slots = self._hosts.get(origin)
+        if slots is None:
+            slots = self._hosts[origin] = _HostSlots(self.max_per_host)
+        slots.users += 1
+        try:
+            await slots.semaphore.acquire()
+        except BaseException:
+            self._leave(origin, slots)
+            raise
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            self._release(origin, slots)
+            raise
+        response.stream = _HostSlotStream(response.stream, lambda: self._release(origin, slots))
+        return response
+
+    def _release(self, origin, slots: _HostSlots):
+        slots.semaphore.release()
+        self._leave(origin, slots)
+
+    def _leave(self, origin, slots: _HostSlots):
+        slots.users -= 1
+        if not slots.users and self._hosts.get(origin) is slots:
+            del self._hosts[origin]
+
+
+@dataclass
+class FetchedResponse:
+    """A response whose body was read, up to a size limit"""
+
+    url: str
+    status_code: int
+    headers: httpx.Headers
+    content: bytes
+    encoding: Optional[str]
+    truncated: bool
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+
+async def read_limited(response: httpx.Response, max_bytes: int,
+                       on_chunk: Optional[Callable[[bytes], None]] = None) -> Tuple[bytes, bool]:
+    """
+    Read a streamed response body, stopping after ``max_bytes``.
+
+    Args:
+        response: A response opened with HttpClient.stream
+        max_bytes: Largest body kept; the rest is not downloaded
+        on_chunk: Called with each chunk as it arrives (e.g. to feed a parser)
+
+    Returns:
+        (body, truncated)
+    """
+    chunks = []
+    size = 0
+    async for chunk in response.aiter_bytes():
+        if size + len(chunk) > max_bytes:
+            chunk = chunk[:max_bytes - size]
+            chunks.append(chunk)
+            if on_chunk is not None and chunk:
+                on_chunk(chunk)
+            return b"".join(chunks), True
+        size += len(chunk)
+        chunks.append(chunk)
+        if on_chunk is not None:
+            on_chunk(chunk)
+    return b"".join(chunks), False
+
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class HttpClient:
+    """
+    The process-wide HTTP client all outbound requests go through.
+
+    One pooled httpx client keeps connections (HTTP/2 where the server
+    offers it) alive across audits, so fetching many pages and assets of the
+    same hosts pays for TCP and TLS setup once. Host names are resolved
+    through a DNSCache, concurrent requests are capped globally and per
+    host, bodies are read up to a size limit and idempotent requests are
+    retried with jittered exponential backoff. The client is created on
+    first use and closed when the API or worker shuts down.
+    """
+
+    def __init__(self, max_connections: int = HTTP_MAX_CONNECTIONS,
+                 max_per_host: int = HTTP_MAX_CONNECTIONS_PER_HOST, http2: bool = HTTP2_ENABLED):
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.http2 = http2
+        self.dns = DNSCache()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            http2 = self.http2
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    logger.warning("The h2 package is not installed, using HTTP/1.1 only")
+                    http2 = False
+            self._client = httpx.AsyncClient(
+                transport=PooledTransport(self.dns, self.max_connections, self.max_per_host, http2),
+                follow_redirects=True,
+                timeout=HTTP_TIMEOUT,
+                headers={"User-Agent": USER_AGENT},
+            )
+        return self._client
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, headers: Optional[Dict[str, str]] = None,
+                     timeout: Optional[float] = None, retries: int = HTTP_RETRIES) -> AsyncIterator[httpx.Response]:
+        """
+        Send a request and stream its response.
+
+        Connection errors, timeouts before the response arrives and
+        retryable statuses (429, 502-504) are retried for GET and HEAD;
+        a Retry-After header is honoured up to HTTP_RETRY_MAX_WAIT.
+
+        Args:
+            method: HTTP method
+            url: The URL to request
+            headers: Extra request headers
+            timeout: Timeout in seconds (defaults to HTTP_TIMEOUT)
+            retries: Retries after the first attempt
+
+        Yields:
+            The response, with the body not read yet
+        """
+        if method not in ("GET", "HEAD"):
+            retries = 0
+        options = {"timeout": timeout} if timeout is not None else {}
+        attempt = 0
+        while True:
+            request = self.client.build_request(method, url, headers=headers, **options)
+            try:
+                response = await self.client.send(request, stream=True)
+            except RETRYABLE_ERRORS as e:
+                if attempt >= retries:
+                    raise
+                await self._backoff(url, attempt, str(e) or type(e).__name__)
+                attempt += 1
+                continue
+
+            if response.status_code in RETRYABLE_STATUSES and attempt < retries:
+                wait = _retry_after(response.headers.get("retry-after"))
+                if wait is None or wait <= HTTP_RETRY_MAX_WAIT:
+                    await response.aclose()
+                    await self._backoff(url, attempt, f"status {response.status_code}", wait)
+                    attempt += 1
+                    continue
+
+            try:
+                yield response
+            finally:
+                await response.aclose()
+            return
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None, max_bytes: int = 10 * 1024 * 1024,
+                  timeout: Optional[float] = None, retries: int = HTTP_RETRIES) -> FetchedResponse:
+        """
+        Download a resource, keeping at most ``max_bytes`` of its body.
+
+        Raises:
+            httpx.HTTPError: When the request fails after its retries
+        """
+        async with self.stream("GET", url, headers=headers, timeout=timeout, retries=retries) as response:
+            body, truncated = await read_limited(response, max_bytes)
+        return FetchedResponse(str(response.url), response.status_code, response.headers, body,
+                               response.charset_encoding, truncated)
+
+    async def _backoff(self, url: str, attempt: int, reason: str, wait: Optional[float] = None):
+        if wait is None:
+            wait = random.uniform(0, min(HTTP_RETRY_MAX_WAIT, HTTP_RETRY_BACKOFF * 2 ** attempt))
+        logger.info(f"Retrying {url} in {wait:.2f}s ({reason})")
+        await asyncio.sleep(wait)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Process-wide HTTP client
+http_client = HttpClient()
@@ -0,0 +1,418 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import DateTime, Index, Integer, String, func, select, update
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.services.crawler import normalize_url
+from app.services.database import Base, SessionLocal, WriteSession, init_db
+
+# Admission control (overridable through environment variables)
+QUEUE_MAX_DEPTH = int(os.getenv("QUEUE_MAX_DEPTH", 1000))
+QUEUE_DEFAULT_RETRY_AFTER = int(os.getenv("QUEUE_DEFAULT_RETRY_AFTER", 30))
+
+# Leasing: a claimed job belongs to its worker until the lease expires; the
+# worker extends it with heartbeats and an expired job is queued again
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", 60))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+
+# Job statuses
+QUEUED = "queued"
+RUNNING = "running"
+ATTACHED = "attached"
+DONE = "done"
+FAILED = "failed"
+CANCELLING = "cancelling"  # Running, its worker is asked to stop it
+CANCELLED = "cancelled"
+
+
+class QueueFull(Exception):
+    """Raised when the queue is too deep to accept more work"""
+
+    def __init__(self, depth: int, retry_after: int, message: Optional[str] = None):
+        super().__init__(message or f"Analysis queue is full ({depth} jobs waiting)")
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+class JobRecord(Base):
+    """
+    A queued analysis job.
+
+    Jobs with the same flight key as an active job are stored as "attached"
+    to that job's task instead of being queued; they receive its results
+    when it finishes. A job whose deadline is earlier than the active job's
+    is queued on its own instead, as the active job might finish too late.
+    """
+
+    __tablename__ = "analysis_jobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    task_id: Mapped[str] = mapped_column(String(36), unique=True)
+    flight_key: Mapped[str] = mapped_column(String(64))
+    priority: Mapped[int] = mapped_column(Integer, default=0)
+    status: Mapped[str] = mapped_column(String(16))
+    leader_task_id: Mapped[Optional[str]] = mapped_column(String(36), nullable=True, index=True)
+    worker: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    lease_expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    enqueued_at: Mapped[datetime] = mapped_column(DateTime)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True, index=True)
+    deadline_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_analysis_jobs_claim", "status", "priority", "id"),
+        Index("ix_analysis_jobs_flight", "flight_key", "status"),
+        Index("ix_analysis_jobs_lease", "status", "lease_expires_at"),
+    )
+
+
+def flight_key(url: str, modules: List[str], device: str, depth: int) -> str:
+    """Identity of an audit used to coalesce identical requests"""
+    raw = json.dumps([normalize_url(url) or url, sorted(modules), device, depth])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class JobQueue:
+    """
+    Priority job queue embedded in the application database.
+
+    Any number of processes, on any number of machines sharing the database,
+    can enqueue and claim jobs. Claiming is a compare-and-set on the job
+    status that grants the worker a lease; the worker renews it with
+    heartbeats. Jobs whose lease expired (the worker died or hung) are queued
+    again, up to JOB_MAX_ATTEMPTS times. Higher priorities are claimed first,
+    FIFO within a priority. Cancelling a running job only flags it; the
+    worker holding it polls for the flag and stops the job.
+    """
+
+    def __init__(self, max_depth: int = QUEUE_MAX_DEPTH):
+        self.max_depth = max_depth
+        self._schema_ready = False
+
+    def _ensure_schema(self):
+        if not self._schema_ready:
+            init_db()
+            self._schema_ready = True
+
+    async def enqueue(self, task_id: str, task: Dict[str, Any], priority: int = 0,
+                      deadline: Optional[float] = None) -> Optional[str]:
+        """
+        Queue a task for analysis.
+
+        Args:
+            task_id: The ID of the task to run
+            task: The task document
+            priority: Higher values are claimed first
+            deadline: Seconds within which the task must finish, if any
+
+        A task joining an identical job raises that job's priority to its
+        own, so it does not wait longer than it would have on its own.
+
+        Returns:
+            The task ID of the running job this task was attached to, if any
+
+        Raises:
+            QueueFull: When the queue depth is at its limit, or when the jobs
+                ahead would take longer than the deadline to clear
+        """
+        key = flight_key(task["url"], task["modules"], task["device"], task["depth"])
+        return await asyncio.to_thread(self._enqueue, task_id, key, priority, deadline)
+
+    async def claim(self, worker: str) -> Optional[str]:
+        """Claim the next queued job under a lease, returning its task ID"""
+        return await asyncio.to_thread(self._claim, worker)
+
+    async def cancel(self, task_id: str) -> Optional[str]:
+        """
+        Cancel a job.
+
+        Jobs that are waiting (queued or attached) are cancelled at once; a
+        running job is flagged for its worker, which stops it at the next
+        cancellation check. Tasks attached to a cancelled job are not
+        cancelled with it: the first of them is queued in its place.
+
+        Returns:
+            The job status before cancelling, or None when there is no job
+            left to cancel
+        """
+        return await asyncio.to_thread(self._cancel, task_id)
+
+    async def cancellations(self, worker: str, task_ids: List[str]) -> List[str]:
+        """Task IDs among a worker's running jobs that were asked to stop"""
+        if not task_ids:
+            return []
+        return await asyncio.to_thread(self._cancellations, worker, task_ids)
+
+    async def heartbeat(self, worker: str, task_ids: List[str]) -> List[str]:
+        """
+        Renew the leases of the jobs a worker is running.
+
+        Returns:
+            Task IDs whose lease the worker no longer holds
+        """
+        if not task_ids:
+            return []
+        return await asyncio.to_thread(self._heartbeat, worker, task_ids)
+
+    async def recover_expired(self) -> Tuple[List[str], List[str]]:
+        """
+        Queue jobs with expired leases again.
+
+        Returns:
+            Task IDs of jobs that ran out of attempts and were marked failed,
+            and of jobs being cancelled whose worker died, marked cancelled
+        """
+        return await asyncio.to_thread(self._recover_expired)
+
+    async def finish(self, task_id: str, worker: str, succeeded: bool = True,
+                     cancelled: bool = False) -> Optional[List[str]]:
+        """
+        Mark a job finished, provided the worker still holds its lease.
+
+        A job that was cancelled (or ran past its deadline) shares nothing
+        with its attached jobs; the first of them is queued in its place.
+
+        Returns:
+            Task IDs of the jobs that were attached to it and receive its
+            results, or None when the lease was lost and another worker owns
+            the job
+        """
+        return await asyncio.to_thread(self._finish, task_id, worker, succeeded, cancelled)
+
+    async def fail_attached(self, task_id: str) -> List[str]:
+        """
+        Mark the jobs attached to a failed job as failed.
+
+        Returns:
+            Task IDs of the attached jobs
+        """
+        return await asyncio.to_thread(self._fail_attached, task_id)
+
+    async def depth(self) -> int:
+        """Number of jobs waiting to be claimed"""
+        return await asyncio.to_thread(self._depth)
+
+    def _enqueue(self, task_id: str, key: str, priority: int, deadline: Optional[float]) -> Optional[str]:
+        self._ensure_schema()
+        now = datetime.now()
+        deadline_at = now + timedelta(seconds=deadline) if deadline is not None else None
+        with WriteSession.begin() as session:
+            leaders = select(JobRecord).where(JobRecord.flight_key == key, JobRecord.status.in_((QUEUED, RUNNING)))
+            if deadline_at is not None:
+                # Only a job bound to finish by this deadline as well can stand in
+                leaders = leaders.where(JobRecord.deadline_at <= deadline_at)
+            leader = session.scalars(leaders.order_by(JobRecord.id).limit(1).with_for_update()).first()
+            if leader is not None:
+                leader.priority = max(leader.priority, priority)
+                session.add(JobRecord(task_id=task_id, flight_key=key, priority=priority, status=ATTACHED,
+                                      leader_task_id=leader.task_id, enqueued_at=now, deadline_at=deadline_at))
+                return leader.task_id
+
+            depth = session.scalar(select(func.count()).select_from(JobRecord).where(JobRecord.status == QUEUED))
+            if depth >= self.max_depth:
+                raise QueueFull(depth, self._retry_after(session, depth))
+            if deadline is not None and depth:
+                # Shed work that could not start before its deadline anyway
+                # rather than running it only to time out
+                throughput = self._throughput(session)
+                wait = depth / throughput if throughput else 0
+                if wait > deadline:
+                    raise QueueFull(depth, max(1, min(300, math.ceil(wait - deadline))),
+                                    f"The analysis queue is too deep to start within {deadline:g}s "
+                                    f"({depth} jobs waiting, about {wait:.0f}s)")
+
+            session.add(JobRecord(task_id=task_id, flight_key=key, priority=priority, status=QUEUED, enqueued_at=now,
+                                  deadline_at=deadline_at))
+            return None
+
+    def _claim(self, worker: str) -> Optional[str]:
+        self._ensure_schema()
+        for _ in range(5):
+            with WriteSession.begin() as session:
+                job = session.execute(
+                    select(JobRecord.id, JobRecord.task_id)
+                    .where(JobRecord.status == QUEUED)
+                    .order_by(JobRecord.priority.desc(), JobRecord.id)
+                    .limit(1)
+                    .with_for_update(skip_locked=True)
+                ).first()
+                if job is None:
+                    return None
+                now = datetime.now()
+                claimed = session.execute(
+                    update(JobRecord)
+                    .where(JobRecord.id == job.id, JobRecord.status == QUEUED)
+                    .values(status=RUNNING, worker=worker, started_at=now, attempts=JobRecord.attempts + 1,
+                            lease_expires_at=now + timedelta(seconds=JOB_LEASE_SECONDS))
+                ).rowcount
+                if claimed:
+                    return job.task_id
+            # Another worker won the race for this job; try the next one
+        return None
+
+    def _cancel(self, task_id: str) -> Optional[str]:
+        self._ensure_schema()
+        with WriteSession.begin() as session:
+            job = session.scalars(select(JobRecord).where(JobRecord.task_id == task_id).with_for_update()).first()
+            if job is None or job.status not in (QUEUED, ATTACHED, RUNNING):
+                return None
+            previous = job.status
+            if previous == RUNNING:
+                job.status = CANCELLING
+                return previous
+            job.status = CANCELLED
+            job.finished_at = datetime.now()
+            job.leader_task_id = None
+            if previous == QUEUED:
+                self._promote_follower(session, task_id, job.priority)
+            return previous
+
+    def _cancellations(self, worker: str, task_ids: List[str]) -> List[str]:
+        with SessionLocal() as session:
+            return list(session.scalars(
+                select(JobRecord.task_id)
+                .where(JobRecord.task_id.in_(task_ids), JobRecord.worker == worker, JobRecord.status == CANCELLING)
+            ))
+
+    def _promote_follower(self, session, task_id: str, priority: int):
+        """Queue a job attached to ``task_id`` in its place, with the others attached to it"""
+        followers = session.execute(
+            select(JobRecord.task_id, JobRecord.priority, JobRecord.deadline_at)
+            .where(JobRecord.leader_task_id == task_id, JobRecord.status == ATTACHED)
+            .order_by(JobRecord.id)
+        ).all()
+        if not followers:
+            return
+        # The job with the earliest deadline leads, so it holds for all of them
+        followers.sort(key=lambda row: (row.deadline_at is None, row.deadline_at or datetime.min))
+        leader, others = followers[0].task_id, [row.task_id for row in followers[1:]]
+        priority = max([priority, *(row.priority for row in followers)])
+        session.execute(
+            update(JobRecord).where(JobRecord.task_id == leader)
+            .values(status=QUEUED, leader_task_id=None, priority=priority)
+        )
+        if others:
+            session.execute(update(JobRecord).where(JobRecord.task_id.in_(others)).values(leader_task_id=leader))
+        logger.info(f"Queued task {leader} in place of cancelled task {task_id} ({len(others)} still attached)")
+
+    def _heartbeat(self, worker: str, task_ids: List[str]) -> List[str]:
+        active = (RUNNING, CANCELLING)
+        with WriteSession.begin() as session:
+            session.execute(
+                update(JobRecord)
+                .where(JobRecord.task_id.in_(task_ids), JobRecord.worker == worker, JobRecord.status.in_(active))
+                .values(lease_expires_at=datetime.now() + timedelta(seconds=JOB_LEASE_SECONDS))
+            )
+            held = set(session.scalars(
+                select(JobRecord.task_id)
+                .where(JobRecord.task_id.in_(task_ids), JobRecord.worker == worker, JobRecord.status.in_(active))
+            ))
+        return [task_id for task_id in task_ids if task_id not in held]
+
+    def _recover_expired(self) -> Tuple[List[str], List[str]]:
+        self._ensure_schema()
+        now = datetime.now()
+        with WriteSession.begin() as session:
+            expired = session.execute(
+                select(JobRecord.id, JobRecord.task_id, JobRecord.attempts, JobRecord.worker, JobRecord.status,
+                       JobRecord.priority)
+                .where(JobRecord.status.in_((RUNNING, CANCELLING)), JobRecord.lease_expires_at < now)
+                .with_for_update(skip_locked=True)
+            ).all()
+            exhausted, cancelled = [], []
+            for job in expired:
+                if job.status == CANCELLING:
+                    values = {"status": CANCELLED, "finished_at": now}
+                    cancelled.append(job.task_id)
+                    self._promote_follower(session, job.task_id, job.priority)
+                    logger.warning(f"Worker {job.worker} died while cancelling task {job.task_id}")
+                elif job.attempts >= JOB_MAX_ATTEMPTS:
+                    values = {"status": FAILED, "finished_at": now}
+                    exhausted.append(job.task_id)
+                    logger.error(f"Job for task {job.task_id} failed after {job.attempts} attempts")
+                else:
+                    values = {"status": QUEUED, "worker": None, "lease_expires_at": None}
+                    logger.warning(f"Lease of {job.worker} on task {job.task_id} expired, queueing it again")
+                session.execute(
+                    update(JobRecord).where(JobRecord.id == job.id, JobRecord.status == job.status).values(**values)
+                )
+            return exhausted, cancelled
+
+    def _finish(self, task_id: str, worker: str, succeeded: bool, cancelled: bool) -> Optional[List[str]]:
+        now = datetime.now()
+        status = CANCELLED if cancelled else DONE if succeeded else FAILED
+        with WriteSession.begin() as session:
+            job = session.execute(
+                select(JobRecord.id, JobRecord.priority)
+                .where(JobRecord.task_id == task_id, JobRecord.worker == worker,
+                       JobRecord.status.in_((RUNNING, CANCELLING)))
+                .with_for_update()
+            ).first()
+            if job is None:
+                return None
+            session.execute(
+                update(JobRecord).where(JobRecord.id == job.id)
+                .values(status=status, finished_at=now, lease_expires_at=None)
+            )
+            if cancelled:
+                self._promote_follower(session, task_id, job.priority)
+                return []
+            followers = list(session.scalars(
+                select(JobRecord.task_id).where(JobRecord.leader_task_id == task_id, JobRecord.status == ATTACHED)
+            ))
+            if followers:
+                session.execute(
+                    update(JobRecord).where(JobRecord.task_id.in_(followers)).values(status=status, finished_at=now)
+                )
+            return followers
+
+    def _fail_attached(self, task_id: str) -> List[str]:
+        with WriteSession.begin() as session:
+            followers = list(session.scalars(
+                select(JobRecord.task_id).where(JobRecord.leader_task_id == task_id, JobRecord.status == ATTACHED)
+            ))
+            if followers:
+                session.execute(
+                    update(JobRecord).where(JobRecord.task_id.in_(followers))
+                    .values(status=FAILED, finished_at=datetime.now())
+                )
+            return followers
+
+    def _depth(self) -> int:
+        self._ensure_schema()
+        with SessionLocal() as session:
+            return session.scalar(select(func.count()).select_from(JobRecord).where(JobRecord.status == QUEUED))
+
+    def _retry_after(self, session, depth: int) -> int:
+        """Estimate how long until the queue has room, from recent job durations"""
+        throughput = self._throughput(session)
+        if not throughput:
+            return QUEUE_DEFAULT_RETRY_AFTER
+        excess = depth - self.max_depth + 1
+        return max(1, min(300, math.ceil(excess / throughput)))
+
+    def _throughput(self, session) -> Optional[float]:
+        """Jobs finished per second recently, or None without any history"""
+        recent = session.execute(
+            select(JobRecord.started_at, JobRecord.finished_at)
+            .where(JobRecord.status == DONE, JobRecord.started_at.is_not(None))
+            .order_by(JobRecord.finished_at.desc())
+            .limit(50)
+        ).all()
+        if not recent:
+            return None
+        oldest = min(row.started_at for row in recent)
+        newest = max(row.finished_at for row in recent)
+        return len(recent) / max((newest - oldest).total_seconds(), 1)
+
+
+# Process-wide queue client
+job_queue = JobQueue()
@@ -0,0 +1,351 @@
+import asyncio
+import math
+import os
+import re
+import statistics
+import time
+from typing import Any, Dict, List
+
+from loguru import logger
+
+from app.services.asset_cache import asset_cache
+from app.services.browser_pool import browser_pool
+from app.services.snapshot import PageSnapshot
+from app.services.telemetry import span
+
+# Number of page loads per audit: runs start with PERF_MIN_RUNS loads in
+# parallel and continue in batches of PERF_PARALLEL_RUNS until the 95%
+# confidence interval of the key timings is within PERF_CI_TOLERANCE of the
+# median, or PERF_MAX_RUNS is reached
+PERF_MIN_RUNS = int(os.getenv("PERF_MIN_RUNS", 3))
+PERF_MAX_RUNS = int(os.getenv("PERF_MAX_RUNS", 9))
+PERF_PARALLEL_RUNS = int(os.getenv("PERF_PARALLEL_RUNS", 3))
+PERF_CI_TOLERANCE = float(os.getenv("PERF_CI_TOLERANCE", 0.1))
+
+# A page is considered interactive after this long without long tasks
+PERF_QUIET_WINDOW = float(os.getenv("PERF_QUIET_WINDOW", 5000))
+PERF_RUN_TIMEOUT = float(os.getenv("PERF_RUN_TIMEOUT", 45))
+PERF_THROTTLING = os.getenv("PERF_THROTTLING", "true").lower() != "false"
+# Upper bound for a whole multi-run measurement
+PERF_MODULE_TIMEOUT = float(os.getenv("PERF_MODULE_TIMEOUT", 300))
+
+# Scripts and stylesheets checked for minification, and the smallest
+# estimated saving worth reporting
+PERF_MAX_ASSETS = int(os.getenv("PERF_MAX_ASSETS", 30))
+MINIFY_MIN_SAVINGS = 2048
+# Bumped when minification_stats changes, invalidating memoized stats
+MINIFICATION_VERSION = 1
+
+# CPU slowdown and network conditions applied through the DevTools protocol
+# (the Lighthouse defaults for each device)
+THROTTLING_PROFILES = {
+    "desktop": {"cpu_slowdown": 1, "latency_ms": 40, "download_kbps": 10240, "upload_kbps": 10240},
+    "mobile": {"cpu_slowdown": 4, "latency_ms": 150, "download_kbps": 1638.4, "upload_kbps": 750},
+}
+
+# Lighthouse scoring curves (p10, median) and weights per device. Speed
+# Index needs a filmstrip, which is not recorded, so the Lighthouse weights
+# of the measured metrics are scaled up to replace its share
+SCORING = {
+    "desktop": {
+        "first_contentful_paint": (934, 1600, 0.11),
+        "largest_contentful_paint": (1200, 2400, 0.28),
+        "total_blocking_time": (150, 350, 0.33),
+        "cumulative_layout_shift": (0.1, 0.25, 0.28),
+    },
+    "mobile": {
+        "first_contentful_paint": (1800, 3000, 0.11),
+        "largest_contentful_paint": (2500, 4000, 0.28),
+        "total_blocking_time": (200, 600, 0.33),
+        "cumulative_layout_shift": (0.1, 0.25, 0.28),
+    },
+}
+
+# Metrics whose spread decides when enough runs were made
+CONVERGENCE_METRICS = ("first_contentful_paint", "largest_contentful_paint")
+
+# Two-sided 95% Student t quantiles by degrees of freedom
+T_QUANTILES = {1: 12.71, 2: 4.30, 3: 3.18, 4: 2.78, 5: 2.57, 6: 2.45, 7: 2.36, 8: 2.31, 9: 2.26, 10: 2.23,
+               12: 2.18, 15: 2.13, 20: 2.09, 30: 2.04}
+
+# Installed before any page script runs: observes paints, LCP candidates,
+# layout shifts (grouped in session windows for CLS) and long tasks
+VITALS_INIT_SCRIPT = """(() => {
+    const vitals = window.__cometwebVitals = {fcp: null, lcp: null, cls: 0, longTasks: []};
+    let sessionValue = 0, sessionStart = 0, sessionLast = 0;
+    const observe = (type, callback) => {
+        try {
+            new PerformanceObserver((list) => list.getEntries().forEach(callback)).observe({type, buffered: true});
+        } catch (e) {}
+    };
+    observe('paint', (entry) => {
+        if (entry.name === 'first-contentful-paint') vitals.fcp = entry.startTime;
+    });
+    observe('largest-contentful-paint', (entry) => { vitals.lcp = entry.startTime; });
+    observe('layout-shift', (entry) => {
+        if (entry.hadRecentInput) return;
+        if (sessionValue && (entry.startTime - sessionLast > 1000 || entry.startTime - sessionStart > 5000)) {
+            sessionValue = 0;
+        }
+        if (!sessionValue) sessionStart = entry.startTime;
+        sessionValue += entry.value;
+        sessionLast = entry.startTime;
+        vitals.cls = Math.max(vitals.cls, sessionValue);
+    });
+    observe('longtask', (entry) => { vitals.longTasks.push([entry.startTime, entry.duration]); });
+})();"""
+
+COLLECT_SCRIPT = """() => {
+    const nav = performance.getEntriesByType('navigation')[0] || {};
+    return {
+        ...(window.__cometwebVitals || {}),
+        ttfb: nav.responseStart || 0,
+        dcl: nav.domContentLoadedEventEnd || 0,
+        load: nav.loadEventEnd || nav.loadEventStart || 0,
+        now: performance.now()
+    };
+}"""
+
+
+def _interactive(fcp: float, dcl: float, long_tasks: List[List[float]]) -> float:
+    """Time to Interactive: end of the last long task before a quiet window"""
+    tti = fcp
+    for start, duration in sorted(long_tasks):
+        if start + duration <= fcp:
+            continue
+        if start - tti >= PERF_QUIET_WINDOW:
+            break
+        tti = max(tti, start + duration)
+    return max(tti, dcl)
+
+
+def _blocking_time(fcp: float, tti: float, long_tasks: List[List[float]]) -> float:
+    """Total Blocking Time: long task time beyond 50 ms between FCP and TTI"""
+    total = 0.0
+    for start, duration in long_tasks:
+        clipped = min(start + duration, tti) - max(start, fcp)
+        if clipped > 50:
+            total += clipped - 50
+    return total
+
+
+def _metrics(raw: Dict[str, Any]) -> Dict[str, float]:
+    fcp = raw.get("fcp")
+    if fcp is None:
+        raise RuntimeError("The page never painted any content")
+    lcp = raw.get("lcp") or fcp
+    long_tasks = raw.get("longTasks") or []
+    tti = _interactive(fcp, raw["dcl"], long_tasks)
+    return {
+        "first_contentful_paint": fcp,
+        "largest_contentful_paint": lcp,
+        "cumulative_layout_shift": raw.get("cls") or 0.0,
+        "total_blocking_time": _blocking_time(fcp, tti, long_tasks),
+        "time_to_interactive": tti,
+        "time_to_first_byte": raw["ttfb"],
+        "dom_content_loaded": raw["dcl"],
+        "load_event": raw["load"],
+    }
+
+
+async def _measure_once(url: str, device: str) -> Dict[str, float]:
+    """Load the page once in a fresh context and collect its metrics"""
+    profile = THROTTLING_PROFILES.get(device, THROTTLING_PROFILES["desktop"])
+    async with browser_pool.context(device) as context:
+        await context.add_init_script(VITALS_INIT_SCRIPT)
+        page = await context.new_page()
+        if PERF_THROTTLING:
+            cdp = await context.new_cdp_session(page)
+            await cdp.send("Network.enable")
+            await cdp.send("Network.emulateNetworkConditions", {
+                "offline": False,
+                "latency": profile["latency_ms"],
+                "downloadThroughput": profile["download_kbps"] * 1024 / 8,
+                "uploadThroughput": profile["upload_kbps"] * 1024 / 8,
+            })
+            await cdp.send("Emulation.setCPUThrottlingRate", {"rate": profile["cpu_slowdown"]})
+
+        deadline = time.monotonic() + PERF_RUN_TIMEOUT
+        with span("browser", "navigate"):
+            await page.goto(url, wait_until="load", timeout=PERF_RUN_TIMEOUT * 1000)
+
+        # Wait until the main thread has been quiet long enough to place TTI
+        while True:
+            raw = await page.evaluate(COLLECT_SCRIPT)
+            busy_until = max([raw.get("fcp") or 0] + [s + d for s, d in raw.get("longTasks") or []])
+            remaining = busy_until + PERF_QUIET_WINDOW - raw["now"]
+            if remaining <= 0 or time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(min(remaining / 1000, 0.5, max(deadline - time.monotonic(), 0)))
+        return _metrics(raw)
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower, upper = math.floor(position), math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _t_quantile(degrees: int) -> float:
+    eligible = [df for df in T_QUANTILES if df <= degrees]
+    return T_QUANTILES[max(eligible)] if eligible else T_QUANTILES[1]
+
+
+def describe_samples(values: List[float]) -> Dict[str, float]:
+    """Median, p75, spread and 95% confidence interval half-width of samples"""
+    mean = statistics.fmean(values)
+    variance = statistics.variance(values) if len(values) > 1 else 0.0
+    stdev = math.sqrt(variance)
+    return {
+        "median": statistics.median(values),
+        "p75": _percentile(values, 0.75),
+        "mean": mean,
+        "variance": variance,
+        "stdev": stdev,
+        "ci95": _t_quantile(len(values) - 1) * stdev / math.sqrt(len(values)) if len(values) > 1 else None,
+        "min": min(values),
+        "max": max(values),
+    }
+
+
+def _converged(runs: List[Dict[str, float]]) -> bool:
+    if len(runs) < max(PERF_MIN_RUNS, 2):
+        return False
+    for metric in CONVERGENCE_METRICS:
+        stats = describe_samples([run[metric] for run in runs])
+        if stats["median"] > 0 and stats["ci95"] / stats["median"] > PERF_CI_TOLERANCE:
+            return False
+    return True
+
+
+def metric_score(value: float, p10: float, median: float) -> float:
+    """Lighthouse log-normal score of a metric value, between 0 and 1"""
+    if value <= 0:
+        return 1.0
+    sigma = (math.log(median) - math.log(p10)) / 1.2816
+    return 1 - statistics.NormalDist(math.log(median), sigma).cdf(math.log(value))
+
+
+def performance_score(metrics: Dict[str, float], device: str) -> int:
+    scoring = SCORING.get(device, SCORING["desktop"])
+    total = sum(weight * metric_score(metrics[name], p10, median) for name, (p10, median, weight) in scoring.items())
+    return round(100 * total / sum(weight for _, _, weight in scoring.values()))
+
+
+def _opportunities(metrics: Dict[str, float], device: str) -> List[Dict[str, Any]]:
+    scoring = SCORING.get(device, SCORING["desktop"])
+    advice = {
+        "largest_contentful_paint": ("Improve Largest Contentful Paint",
+                                     "The main content renders late. Optimize the server response, preload the "
+                                     "largest image or text resource and remove render-blocking resources."),
+        "total_blocking_time": ("Reduce main-thread blocking",
+                                "Long JavaScript tasks delay interactivity. Split, defer or remove scripts."),
+        "cumulative_layout_shift": ("Avoid large layout shifts",
+                                    "Reserve space for images, embeds and late-loading content."),
+        "first_contentful_paint": ("Improve First Contentful Paint",
+                                   "Nothing is painted for a long time. Inline critical CSS and defer the rest."),
+    }
+    opportunities = []
+    for name, (title, description) in advice.items():
+        p10, median, _ = scoring[name]
+        score = metric_score(metrics[name], p10, median)
+        if score < 0.9:
+            opportunities.append({"title": title, "description": description, "metric": name,
+                                  "score": round(100 * score)})
+    return sorted(opportunities, key=lambda o: o["score"])
+
+
+_BLOCK_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_INDENTATION = re.compile(r"\n[ \t]+")
+_BLANK_LINES = re.compile(r"\n{2,}")
+
+
+def minification_stats(text: str) -> Dict[str, int]:
+    """Size of a script or stylesheet and the bytes comments and indentation take up"""
+    size = len(text.encode())
+    stripped = _BLANK_LINES.sub("\n", _INDENTATION.sub("\n", _BLOCK_COMMENT.sub("", text)))
+    return {"size": size, "savings": size - len(stripped.encode())}
+
+
+async def minification_opportunities(snapshot: PageSnapshot) -> List[Dict[str, Any]]:
+    """
+    Find unminified scripts and stylesheets of a page.
+
+    The files come from the shared asset cache and their statistics are
+    memoized per content hash, so common libraries are only checked once.
+    """
+    resources = [r for r in snapshot.resources if r["type"] in ("script", "stylesheet")][:PERF_MAX_ASSETS]
+    types = {r["url"]: r["type"] for r in resources}
+    assets = await asset_cache.get_many(list(types))
+    stats = await asyncio.gather(*(
+        asset_cache.memoize(asset.content_hash, f"minification:{MINIFICATION_VERSION}",
+                            lambda asset=asset: minification_stats(asset.text))
+        for asset in assets
+    ))
+
+    opportunities = []
+    for resource_type, title in (("script", "Minify JavaScript"), ("stylesheet", "Minify CSS")):
+        unminified = sorted(
+            ({"url": asset.url, **stat} for asset, stat in zip(assets, stats)
+             if types[asset.url] == resource_type and stat["savings"] >= MINIFY_MIN_SAVINGS),
+            key=lambda r: -r["savings"]
+        )
+        if unminified:
+            savings = sum(r["savings"] for r in unminified)
+            opportunities.append({
+                "title": title,
+                "description": f"Minifying {len(unminified)} files could save about {savings // 1024} KB.",
+                "savings_bytes": savings,
+                "resources": unminified[:10],
+                "score": max(0, round(100 - savings / 1024)),
+            })
+    return opportunities
+
+
+async def measure_performance(url: str, device: str) -> Dict[str, Any]:
+    """
+    Measure Core Web Vitals and lab metrics over repeated page loads.
+
+    Args:
+        url: The URL to load
+        device: Device profile (desktop/mobile), selecting emulation and throttling
+
+    Returns:
+        Median metrics with their statistics, the Lighthouse-style score and
+        improvement opportunities
+    """
+    runs: List[Dict[str, float]] = []
+    failures: List[str] = []
+    batch = PERF_MIN_RUNS
+    while len(runs) + len(failures) < PERF_MAX_RUNS:
+        batch = min(batch, PERF_MAX_RUNS - len(runs) - len(failures))
+        results = await asyncio.gather(*(_measure_once(url, device) for _ in range(batch)), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                if isinstance(result, asyncio.CancelledError):
+                    raise result
+                failures.append(str(result))
+            else:
+                runs.append(result)
+        if _converged(runs) or (not runs and len(failures) >= PERF_MIN_RUNS):
+            break
+        batch = PERF_PARALLEL_RUNS
+
+    if not runs:
+        raise RuntimeError(f"All page loads failed: {failures[0] if failures else 'no runs'}")
+    if failures:
+        logger.warning(f"{len(failures)} of {len(runs) + len(failures)} page loads of {url} failed")
+
+    statistics_by_metric = {name: describe_samples([run[name] for run in runs]) for name in runs[0]}
+    medians = {name: stats["median"] for name, stats in statistics_by_metric.items()}
+    return {
+        "lighthouse_score": performance_score(medians, device),
+        "metrics": medians,
+        "statistics": statistics_by_metric,
+        "runs": len(runs),
+        "failed_runs": len(failures),
+        "converged": _converged(runs),
+        "throttling": THROTTLING_PROFILES.get(device, THROTTLING_PROFILES["desktop"]) if PERF_THROTTLING else None,
+        "opportunities": _opportunities(medians, device),
+    }
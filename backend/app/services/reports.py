@@ -0,0 +1,220 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+# Report templates, and where rendered reports and compiled templates are kept
+REPORT_TEMPLATE_DIR = os.getenv(
+    "REPORT_TEMPLATE_DIR", os.path.join(os.path.dirname(__file__), "..", "templates")
+)
+REPORT_TEMPLATE = "report.html"
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", "data/reports")
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+# Rendering runs in REPORT_PROCESSES processes; at most REPORT_QUEUE_SIZE
+# reports may be waiting or rendering before new requests are turned away
+REPORT_PROCESSES = int(os.getenv("REPORT_PROCESSES", 2))
+REPORT_QUEUE_SIZE = int(os.getenv("REPORT_QUEUE_SIZE", 8))
+REPORT_RENDER_TIMEOUT = float(os.getenv("REPORT_RENDER_TIMEOUT", 120))
+
+# Bumped when the report context changes shape, invalidating cached reports
+REPORT_FORMAT_VERSION = 1
+
+# Longest tables (findings, issues, pages) printed in a report
+REPORT_MAX_ROWS = 200
+
+REPORT_FORMATS = {"pdf": "application/pdf", "html": "text/html; charset=utf-8"}
+
+# Task fields a report is rendered from
+REPORT_FIELDS = ["url", "status", "device", "error", "completed_at", "summary", "results", "pages"]
+
+
+class ReportQueueFull(Exception):
+    """Raised when too many reports are waiting to be rendered"""
+
+    def __init__(self, retry_after: int = 10):
+        super().__init__("Too many reports are being rendered, try again shortly")
+        self.retry_after = retry_after
+
+
+# Compiled template of a render process, loaded once by _init_renderer
+_template = None
+
+
+def _init_renderer(template_dir: str, bytecode_dir: str):
+    """Compile the report template once per render process"""
+    global _template
+    from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+
+    os.makedirs(bytecode_dir, exist_ok=True)
+    environment = Environment(
+        loader=FileSystemLoader(template_dir),
+        autoescape=select_autoescape(["html"]),
+        bytecode_cache=FileSystemBytecodeCache(bytecode_dir),
+    )
+    _template = environment.get_template(REPORT_TEMPLATE)
+
+
+def _render(report_format: str, context: Dict[str, Any]) -> bytes:
+    """Render a report in a render process"""
+    html = _template.render(**context)
+    if report_format == "html":
+        return html.encode("utf-8")
+    from weasyprint import HTML
+
+    return HTML(string=html).write_pdf()
+
+
+def template_version(template_dir: str = REPORT_TEMPLATE_DIR) -> str:
+    """Identifies the report template, so reports are re-rendered when it changes"""
+    digest = hashlib.sha256(str(REPORT_FORMAT_VERSION).encode())
+    with open(os.path.join(template_dir, REPORT_TEMPLATE), "rb") as f:
+        digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+class ReportRenderer:
+    """
+    Renders task reports as HTML or PDF in a dedicated process pool.
+
+    Rendering (PDF layout in particular) is CPU-bound, so it never runs on
+    the event loop: each render process compiles the template once at
+    start and then renders reports it is handed. Pending renders are
+    bounded; beyond REPORT_QUEUE_SIZE callers get ReportQueueFull instead of
+    piling up. Rendered reports are cached on disk per task, template
+    version and format, and concurrent requests for the same report share
+    one render. A render counts against the queue until its process is done
+    with it; one running past REPORT_RENDER_TIMEOUT cannot be interrupted,
+    so the pool's processes are terminated and a fresh pool is started.
+    """
+
+    def __init__(self, processes: int = REPORT_PROCESSES, queue_size: int = REPORT_QUEUE_SIZE,
+                 cache_dir: str = REPORT_CACHE_DIR):
+        self.processes = processes
+        self.queue_size = queue_size
+        self.cache_dir = cache_dir
+        self.version = template_version()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def path(self, task_id: str, report_format: str) -> str:
+        return os.path.join(self.cache_dir, f"{task_id}.{self.version}.{report_format}")
+
+    async def render(self, task_id: str, task: Dict[str, Any], report_format: str) -> str:
+        """
+        Get the rendered report of a task, rendering it if it is not cached.
+
+        Args:
+            task_id: The ID of the task
+            task: The task document (see REPORT_FIELDS)
+            report_format: "pdf" or "html"
+
+        Returns:
+            Path of the rendered report
+
+        Raises:
+            ReportQueueFull: When too many reports are waiting to be rendered
+        """
+        path = self.path(task_id, report_format)
+        if os.path.exists(path):
+            return path
+        if path in self._inflight:
+            return await asyncio.shield(self._inflight[path])
+        if self._pending >= self.queue_size:
+            raise ReportQueueFull()
+
+        # Released by _job_done once the render process is done with it
+        self._pending += 1
+        future = asyncio.ensure_future(self._render(path, task, report_format))
+        self._inflight[path] = future
+        future.add_done_callback(lambda _: self._inflight.pop(path, None))
+        return await asyncio.shield(future)
+
+    def _job_done(self, job: asyncio.Future):
+        self._pending -= 1
+        if not job.cancelled():
+            job.exception()  # Retrieved by _render already, unless it timed out
+
+    async def _render(self, path: str, task: Dict[str, Any], report_format: str) -> str:
+        context = {"task": task, "max_rows": REPORT_MAX_ROWS, "format": report_format}
+        loop = asyncio.get_running_loop()
+        try:
+            job = loop.run_in_executor(self._executor(), _render, report_format, context)
+        except BaseException:
+            self._pending -= 1
+            raise
+        job.add_done_callback(self._job_done)
+        try:
+            body = await asyncio.wait_for(asyncio.shield(job), REPORT_RENDER_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.error(f"Rendering report {os.path.basename(path)} timed out, restarting the pool")
+            self.stop(terminate=True)
+            raise
+        except BrokenProcessPool:
+            # A render process died (e.g. out of memory); start a fresh pool next time
+            logger.error("Report render process terminated abruptly, restarting the pool")
+            self.stop()
+            raise
+        await asyncio.to_thread(self._store, path, body)
+        logger.info(f"Rendered {report_format} report {os.path.basename(path)} ({len(body)} bytes)")
+        return path
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_renderer,
+                initargs=(REPORT_TEMPLATE_DIR, os.path.join(self.cache_dir, "templates")),
+            )
+        return self._pool
+
+    def _store(self, path: str, body: bytes):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temporary = f"{path}.{os.getpid()}"
+        with open(temporary, "wb") as f:
+            f.write(body)
+        os.replace(temporary, path)
+        self._prune()
+
+    def _prune(self):
+        """Delete the oldest reports while the cache exceeds its size bound"""
+        reports = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file():
+                stat = entry.stat()
+                reports.append((stat.st_atime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in reports)
+        for _, size, report in sorted(reports):
+            if total <= REPORT_CACHE_MAX_BYTES:
+                break
+            try:
+                os.remove(report)
+                total -= size
+            except OSError:
+                pass
+
+    def stop(self, terminate: bool = False):
+        """
+        Shut the pool down.
+
+        Args:
+            terminate: Also kill renders in progress instead of letting
+                them finish in the background
+        """
+        if self._pool is not None:
+            processes = list((self._pool._processes or {}).values()) if terminate else []
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            for process in processes:
+                process.terminate()
+
+
+# Process-wide report renderer
+report_renderer = ReportRenderer()
@@ -0,0 +1,299 @@
+import asyncio
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import DateTime, Integer, String, Text, select
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.services.asset_cache import asset_cache
+from app.services.crawler import normalize_url
+from app.services.database import Base, SessionLocal, WriteSession, init_db
+from app.services.snapshot import PageSnapshot, fetch_snapshot
+
+# Default freshness of a cached module result in seconds; override per module
+# with RESULT_CACHE_TTL_<MODULE> (e.g. RESULT_CACHE_TTL_PERFORMANCE=600)
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", 6 * 3600))
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() != "false"
+
+# Parts of a page modules declare as their inputs (scheduler depends_on):
+#   html     - the document, ignoring per-request tokens and nonces
+#   headers  - response headers, ignoring per-request ones
+#   assets   - the subresources referenced, with the content of scripts
+#              and stylesheets (from the asset cache)
+PAGE_FACETS = ("html", "headers", "assets")
+
+# Headers and attributes that change on every response of an unchanged page
+VOLATILE_HEADERS = {
+    "date", "age", "expires", "set-cookie", "etag", "last-modified", "x-request-id", "x-amz-cf-id",
+    "cf-ray", "server-timing", "report-to", "nel", "x-cache", "x-cache-hits", "x-served-by", "x-timer", "via",
+    "content-length", "content-security-policy", "content-security-policy-report-only",
+}
+VOLATILE_ATTRIBUTES = {"nonce"}
+TOKEN_NAMES = ("csrf", "token", "nonce")
+
+# Subresources whose content is part of the assets hash
+HASHED_ASSET_TYPES = ("script", "stylesheet")
+MAX_HASHED_ASSETS = 50
+
+
+class CachedModuleResult(Base):
+    """The last successful result of a module for a (url, device, depth) combination"""
+
+    __tablename__ = "module_result_cache"
+
+    cache_key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    url: Mapped[str] = mapped_column(String(2048), index=True)
+    module: Mapped[str] = mapped_column(String(32))
+    device: Mapped[str] = mapped_column(String(16))
+    depth: Mapped[int] = mapped_column(Integer)
+    result: Mapped[str] = mapped_column(Text)
+    etag: Mapped[Optional[str]] = mapped_column(String(256), nullable=True)
+    last_modified: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    stored_at: Mapped[datetime] = mapped_column(DateTime)
+    expires_at: Mapped[datetime] = mapped_column(DateTime)
+
+
+class CachedModuleInputs(Base):
+    """Hashes of the page parts a cached module result was computed from"""
+
+    __tablename__ = "module_result_inputs"
+
+    cache_key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    input_hash: Mapped[str] = mapped_column(String(64))
+    facets: Mapped[str] = mapped_column(Text)
+
+
+def _is_token(name: Optional[str]) -> bool:
+    return bool(name) and any(part in name.lower() for part in TOKEN_NAMES)
+
+
+def _html_hash(snapshot: PageSnapshot) -> str:
+    tree = snapshot.tree
+    if tree is None:
+        return hashlib.sha256(snapshot.body).hexdigest()
+    digest = hashlib.sha256()
+    for element in tree.iter():
+        tag = element.tag if isinstance(element.tag, str) else "#"
+        attributes = {k: v for k, v in element.attrib.items() if k not in VOLATILE_ATTRIBUTES}
+        if tag in ("input", "meta") and (_is_token(element.get("name")) or _is_token(element.get("id"))):
+            attributes.pop("value", None)
+            attributes.pop("content", None)
+        digest.update(f"<{tag} {sorted(attributes.items())}>{element.text or ''}|{element.tail or ''}".encode())
+    return digest.hexdigest()
+
+
+def _headers_hash(snapshot: PageSnapshot) -> str:
+    stable = sorted((k, v) for k, v in snapshot.headers.items() if k not in VOLATILE_HEADERS)
+    cookies = sorted(cookie.split("=", 1)[0].strip() for cookie in snapshot.cookies)
+    return hashlib.sha256(json.dumps([snapshot.status_code, stable, cookies]).encode()).hexdigest()
+
+
+async def _assets_hash(snapshot: PageSnapshot) -> str:
+    hashed = [r["url"] for r in snapshot.resources if r["type"] in HASHED_ASSET_TYPES][:MAX_HASHED_ASSETS]
+    contents = {asset.url: asset.content_hash for asset in await asset_cache.get_many(hashed)}
+    entries = sorted((r["type"], r["url"], contents.get(r["url"], "")) for r in snapshot.resources)
+    return hashlib.sha256(json.dumps(entries).encode()).hexdigest()
+
+
+async def page_facets(snapshot: PageSnapshot, facets) -> Dict[str, str]:
+    """Content hashes of the requested parts of a page (see PAGE_FACETS)"""
+    hashes = {}
+    if "html" in facets:
+        hashes["html"] = await asyncio.to_thread(_html_hash, snapshot)
+    if "headers" in facets:
+        hashes["headers"] = _headers_hash(snapshot)
+    if "assets" in facets:
+        hashes["assets"] = await _assets_hash(snapshot)
+    return hashes
+
+
+def input_hash(hashes: Dict[str, str], facets) -> str:
+    """Combined hash of the page parts a module depends on"""
+    return hashlib.sha256("|".join(f"{facet}={hashes[facet]}" for facet in sorted(facets)).encode()).hexdigest()
+
+
+def cache_key(url: str, module: str, device: str, depth: int) -> str:
+    raw = f"{normalize_url(url) or url}|{module}|{device}|{depth}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def module_ttl(module: str) -> int:
+    """Freshness lifetime of a module result in seconds"""
+    return int(os.getenv(f"RESULT_CACHE_TTL_{module.upper()}", RESULT_CACHE_TTL))
+
+
+class ResultCache:
+    """
+    Cache of module results for repeat audits of the same page.
+
+    A fresh entry is reused as is. An expired entry that recorded the page's
+    ETag or Last-Modified is revalidated with a single conditional GET per
+    page; when the server answers 304 the previous result is reused and its
+    lifetime extended. Otherwise the page parts each remaining module
+    depends on are hashed and compared with the hashes its cached result
+    was computed from, so modules whose inputs did not change are reused
+    even when the page as a whole did. The fetched response is handed back
+    so the analysis doesn't download the page a second time.
+    """
+
+    def __init__(self, enabled: bool = RESULT_CACHE_ENABLED):
+        self.enabled = enabled
+        self._schema_ready = False
+
+    async def lookup(self, url: str, modules: List[str], device: str, depth: int,
+                     dependencies: Optional[Dict[str, Tuple[str, ...]]] = None
+                     ) -> Tuple[Dict[str, Tuple[str, Dict[str, Any]]], Optional[PageSnapshot]]:
+        """
+        Find reusable results for the requested modules.
+
+        Args:
+            dependencies: The page parts each module depends on
+                (ModuleScheduler.dependencies)
+
+        Returns:
+            ({module: (status, result)} with status "hit", "revalidated" or
+             "unchanged", the page snapshot fetched while checking, if any)
+        """
+        if not self.enabled or not modules:
+            return {}, None
+        dependencies = dependencies or {}
+
+        entries = await asyncio.to_thread(self._load, url, modules, device, depth)
+        now = datetime.now()
+        reusable = {}
+        stale = []
+        for module, entry in entries.items():
+            if entry.expires_at > now:
+                reusable[module] = ("hit", json.loads(entry.result))
+            else:
+                stale.append(entry)
+
+        snapshot = None
+        validated = [e for e in stale if e.etag or e.last_modified]
+        if validated:
+            latest = max(validated, key=lambda e: e.stored_at)
+            headers = {}
+            if latest.etag:
+                headers["If-None-Match"] = latest.etag
+            if latest.last_modified:
+                headers["If-Modified-Since"] = latest.last_modified
+            try:
+                response = await fetch_snapshot(url, headers=headers)
+            except Exception as e:
+                logger.warning(f"Revalidation of {url} failed: {str(e)}")
+                response = None
+
+            if response is not None and response.status_code == 304:
+                unchanged = [e for e in validated if (e.etag, e.last_modified) == (latest.etag, latest.last_modified)]
+                for entry in unchanged:
+                    reusable[entry.module] = ("revalidated", json.loads(entry.result))
+                await asyncio.to_thread(self._extend, [e.cache_key for e in unchanged])
+            elif response is not None and response.status_code < 400:
+                snapshot = response
+
+        remaining = [e for e in stale if e.module not in reusable and dependencies.get(e.module)]
+        inputs = await asyncio.to_thread(self._load_inputs, [e.cache_key for e in remaining]) if remaining else {}
+        if inputs:
+            try:
+                if snapshot is None:
+                    response = await fetch_snapshot(url)
+                    snapshot = response if response.status_code < 400 else None
+                if snapshot is not None:
+                    facets = {facet for e in remaining for facet in dependencies[e.module]}
+                    hashes = await page_facets(snapshot, facets)
+                    unchanged = [
+                        e for e in remaining if e.cache_key in inputs
+                        and inputs[e.cache_key] == input_hash(hashes, dependencies[e.module])
+                    ]
+                    for entry in unchanged:
+                        reusable[entry.module] = ("unchanged", json.loads(entry.result))
+                    await asyncio.to_thread(self._extend, [e.cache_key for e in unchanged])
+            except Exception as e:
+                logger.warning(f"Could not compare the inputs of {url}: {str(e)}")
+
+        return reusable, snapshot
+
+    async def store(self, url: str, device: str, depth: int, results: Dict[str, Dict[str, Any]],
+                    snapshot: Optional[PageSnapshot] = None,
+                    dependencies: Optional[Dict[str, Tuple[str, ...]]] = None):
+        """
+        Cache successful module results together with the page validators
+        and the hashes of the page parts each module depends on.
+        """
+        if not self.enabled:
+            return
+        results = {module: result for module, result in results.items() if "error" not in result}
+        if not results:
+            return
+        etag = snapshot.headers.get("etag") if snapshot else None
+        last_modified = snapshot.headers.get("last-modified") if snapshot else None
+        inputs = {}
+        try:
+            if snapshot is not None and dependencies:
+                facets = {facet for module in results for facet in dependencies.get(module, ())}
+                hashes = await page_facets(snapshot, facets)
+                inputs = {
+                    module: (input_hash(hashes, dependencies[module]),
+                             json.dumps({f: hashes[f] for f in dependencies[module]}))
+                    for module in results if dependencies.get(module)
+                }
+            await asyncio.to_thread(self._save, url, device, depth, results, etag, last_modified, inputs)
+        except Exception as e:
+            logger.error(f"Failed to cache results for {url}: {str(e)}")
+
+    def _ensure_schema(self):
+        if not self._schema_ready:
+            init_db()
+            self._schema_ready = True
+
+    def _load(self, url, modules, device, depth) -> Dict[str, CachedModuleResult]:
+        self._ensure_schema()
+        keys = {cache_key(url, module, device, depth): module for module in modules}
+        with SessionLocal() as session:
+            rows = session.scalars(select(CachedModuleResult).where(CachedModuleResult.cache_key.in_(keys)))
+            return {keys[row.cache_key]: row for row in rows}
+
+    def _load_inputs(self, keys: List[str]) -> Dict[str, str]:
+        with SessionLocal() as session:
+            rows = session.scalars(select(CachedModuleInputs).where(CachedModuleInputs.cache_key.in_(keys)))
+            return {row.cache_key: row.input_hash for row in rows}
+
+    def _extend(self, keys: List[str]):
+        if not keys:
+            return
+        now = datetime.now()
+        with WriteSession.begin() as session:
+            for entry in session.scalars(select(CachedModuleResult).where(CachedModuleResult.cache_key.in_(keys))):
+                entry.expires_at = now + timedelta(seconds=module_ttl(entry.module))
+
+    def _save(self, url, device, depth, results, etag, last_modified, inputs):
+        self._ensure_schema()
+        now = datetime.now()
+        with WriteSession.begin() as session:
+            for module, result in results.items():
+                key = cache_key(url, module, device, depth)
+                entry = session.get(CachedModuleResult, key)
+                if entry is None:
+                    entry = CachedModuleResult(cache_key=key, url=normalize_url(url) or url,
+                                               module=module, device=device, depth=depth)
+                    session.add(entry)
+                entry.result = json.dumps(result, default=str)
+                entry.etag = etag
+                entry.last_modified = last_modified
+                entry.stored_at = now
+                entry.expires_at = now + timedelta(seconds=module_ttl(module))
+                if module in inputs:
+                    input_hash_value, facets = inputs[module]
+                    session.merge(CachedModuleInputs(cache_key=key, input_hash=input_hash_value, facets=facets))
+                else:
+                    record = session.get(CachedModuleInputs, key)
+                    if record is not None:
+                        session.delete(record)
+
+
+# Process-wide result cache
+result_cache = ResultCache()
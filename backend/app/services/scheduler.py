@@ -0,0 +1,185 @@
+import asyncio
+import inspect
+import os
+from contextlib import AsyncExitStack
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+
+from app.services.cancellation import AnalysisCancelled, checkpoint
+from app.services.telemetry import span
+
+# Scheduler defaults (overridable through environment variables)
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("ANALYSIS_MAX_CONCURRENCY", 4))
+DEFAULT_MODULE_TIMEOUT = float(os.getenv("ANALYSIS_MODULE_TIMEOUT", 120))
+
+
+class ModuleSpec:
+    """Registration record for a single analysis module"""
+
+    def __init__(self, name: str, func: Callable, requires: Tuple[str, ...], timeout: Optional[float],
+                 per_page: bool = False, depends_on: Tuple[str, ...] = ()):
+        self.name = name
+        self.func = func
+        self.requires = requires
+        self.timeout = timeout
+        self.per_page = per_page
+        self.depends_on = depends_on
+
+
+class InputSpec:
+    """Registration record for a shared input provider (e.g. the fetched page)"""
+
+    def __init__(self, name: str, factory: Callable, requires: Tuple[str, ...]):
+        self.name = name
+        self.factory = factory
+        self.requires = requires
+
+
+class ModuleScheduler:
+    """
+    Dependency-aware scheduler for analysis modules.
+
+    Modules register themselves together with the inputs they need. An input is
+    either a plain value supplied by the caller (url, device, depth, ...) or a
+    shared resource built by a registered provider (for example the raw HTML of
+    the page or a rendered browser page). Every provider runs at most once per
+    run and its value is shared by all modules that declared it, so independent
+    modules start as soon as their own inputs are ready and run in parallel
+    under the concurrency cap.
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 default_timeout: float = DEFAULT_MODULE_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.default_timeout = default_timeout
+        self.modules: Dict[str, ModuleSpec] = {}
+        self.inputs: Dict[str, InputSpec] = {}
+
+    def module(self, name: str, requires: Iterable[str] = (), timeout: Optional[float] = None,
+               per_page: bool = False, depends_on: Iterable[str] = ()):
+        """
+        Decorator registering an analysis module.
+
+        Args:
+            name: Module name as used in AnalysisRequest.modules
+            requires: Names of the inputs passed to the module as keyword arguments
+            timeout: Per-module timeout in seconds (defaults to the scheduler timeout)
+            per_page: Whether the module also runs on every crawled page
+            depends_on: Parts of the page the result is derived from (see
+                result_cache.PAGE_FACETS); a previous result is reused while
+                they are unchanged. Modules without any always rerun.
+        """
+        def decorator(func: Callable) -> Callable:
+            self.modules[name] = ModuleSpec(name, func, tuple(requires), timeout, per_page, tuple(depends_on))
+            return func
+        return decorator
+
+    def input(self, name: str, requires: Iterable[str] = ()):
+        """
+        Decorator registering a shared input provider.
+
+        The provider is either a coroutine function returning the value or an
+        async generator yielding it once; code after the ``yield`` runs when the
+        whole analysis run is finished, which is where pooled resources are
+        released.
+
+        Args:
+            name: Input name modules refer to in their ``requires``
+            requires: Names of the inputs the provider itself needs
+        """
+        def decorator(func: Callable) -> Callable:
+            self.inputs[name] = InputSpec(name, func, tuple(requires))
+            return func
+        return decorator
+
+    def dependencies(self, module_names: List[str]) -> Dict[str, Tuple[str, ...]]:
+        """The page parts each of ``module_names`` depends on"""
+        return {name: self.modules[name].depends_on for name in module_names if name in self.modules}
+
+    def per_page_modules(self, module_names: List[str]) -> List[str]:
+        """The subset of ``module_names`` that runs on every crawled page"""
+        return [name for name in module_names if name in self.modules and self.modules[name].per_page]
+
+    async def run(self, owner: Any, module_names: List[str], values: Dict[str, Any],
+                  on_result: Callable[[str, Dict[str, Any]], Any]) -> Dict[str, Any]:
+        """
+        Run the requested modules and report each result as soon as it is ready.
+
+        Args:
+            owner: Object the registered functions are bound to (the analyzer)
+            module_names: Modules to run
+            values: Plain input values supplied by the caller
+            on_result: Callback invoked with (module_name, result) as each module finishes
+
+        Returns:
+            The shared inputs that were built successfully during the run
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        resolved: Dict[str, asyncio.Future] = {}
+
+        async with AsyncExitStack() as stack:
+
+            async def provide(spec: InputSpec) -> Any:
+                kwargs = {dep: await resolve(dep) for dep in spec.requires}
+                with span("input", spec.name):
+                    if inspect.isasyncgenfunction(spec.factory):
+                        agen = spec.factory(owner, **kwargs)
+                        value = await agen.__anext__()
+                        stack.push_async_callback(agen.aclose)
+                        return value
+                    return await spec.factory(owner, **kwargs)
+
+            async def resolve(name: str) -> Any:
+                if name in values:
+                    return values[name]
+                if name not in self.inputs:
+                    raise KeyError(f"No provider registered for input '{name}'")
+                if name not in resolved:
+                    resolved[name] = asyncio.ensure_future(provide(self.inputs[name]))
+                # Shield the shared future so one module timing out does not
+                # cancel an input other modules are still waiting for
+                return await asyncio.shield(resolved[name])
+
+            async def execute(spec: ModuleSpec):
+                timeout = spec.timeout or self.default_timeout
+                try:
+                    kwargs = {}
+                    for dep in spec.requires:
+                        kwargs[dep] = await asyncio.wait_for(resolve(dep), timeout)
+                    async with semaphore:
+                        checkpoint()
+                        logger.info(f"Running module '{spec.name}'")
+                        with span("module", spec.name):
+                            result = await asyncio.wait_for(spec.func(owner, **kwargs), timeout)
+                except AnalysisCancelled:
+                    raise
+                except asyncio.TimeoutError:
+                    logger.error(f"Module '{spec.name}' timed out after {timeout}s")
+                    result = {"error": f"Module timed out after {timeout}s"}
+                except Exception as e:
+                    logger.error(f"Error in module '{spec.name}': {str(e)}")
+                    result = {"error": str(e)}
+
+                outcome = on_result(spec.name, result)
+                if inspect.isawaitable(outcome):
+                    await outcome
+
+            jobs = []
+            for name in module_names:
+                spec = self.modules.get(name)
+                if spec is None:
+                    logger.warning(f"Unknown module '{name}', skipping")
+                    continue
+                jobs.append(execute(spec))
+
+            try:
+                await asyncio.gather(*jobs)
+            finally:
+                for future in resolved.values():
+                    if not future.done():
+                        future.cancel()
+
+            return {
+                name: future.result() for name, future in resolved.items()
+                if future.done() and not future.cancelled() and future.exception() is None
+            }
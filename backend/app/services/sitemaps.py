@@ -0,0 +1,338 @@
+import asyncio
+import hashlib
+import os
+import random
+import re
+import zlib
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import httpx
+import lxml.html
+from lxml import etree
+from loguru import logger
+
+from app.services.cancellation import checkpoint
+from app.services.crawler import CRAWL_MAX_PAGES, HostLimiter, normalize_url, robots_cache
+from app.services.http_client import USER_AGENT, http_client
+from app.services.snapshot import SNAPSHOT_TIMEOUT, PageSnapshot, fetch_snapshot
+
+# Sites whose sitemaps list more pages than this are sampled by template
+# instead of crawled
+SITEMAP_SAMPLING = os.getenv("SITEMAP_SAMPLING", "true").lower() != "false"
+SITEMAP_SAMPLING_THRESHOLD = int(os.getenv("SITEMAP_SAMPLING_THRESHOLD", CRAWL_MAX_PAGES))
+
+# Limits on what is read from sitemaps
+SITEMAP_MAX_FILES = int(os.getenv("SITEMAP_MAX_FILES", 1000))
+SITEMAP_MAX_URLS = int(os.getenv("SITEMAP_MAX_URLS", 5_000_000))
+
+# Pages fetched to compare structures, and how many templates get audited
+SAMPLE_PAGES = int(os.getenv("SITEMAP_SAMPLE_PAGES", 100))
+MAX_TEMPLATES = int(os.getenv("SITEMAP_MAX_TEMPLATES", 25))
+
+# Sample URLs kept per URL pattern (reservoir sampling) and the number of
+# distinct patterns tracked before new ones fold into their first segment
+SAMPLES_PER_PATTERN = 3
+MAX_PATTERNS = 10000
+
+# Pages whose structural hashes differ in at most this many of 64 bits
+# belong to the same template
+STRUCTURE_DISTANCE = 6
+# Depth of the tag paths a structural hash is built from
+STRUCTURE_PATH_DEPTH = 4
+STRUCTURE_MAX_ELEMENTS = 20000
+
+_NUMERIC = re.compile(r"^\d+$")
+_IDENTIFIER = re.compile(r"^(?=.*\d)[0-9a-f]{8,}(?:-[0-9a-f]+)*$", re.IGNORECASE)
+_SLUG = re.compile(r"^[^-_.]+(?:[-_.][^-_.]+){2,}$")
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+def url_pattern(url: str) -> str:
+    """
+    Generalize a URL into the pattern of its page type.
+
+    Numeric and hexadecimal identifiers and multi-word slugs become
+    placeholders and query values are dropped, so /blog/2023/my-first-post
+    and /blog/2024/another-long-title share the pattern /blog/{n}/{slug}.
+    """
+    parts = urlsplit(url)
+    segments = []
+    for segment in parts.path.split("/"):
+        if not segment:
+            continue
+        if _NUMERIC.match(segment):
+            segments.append("{n}")
+        elif _IDENTIFIER.match(segment):
+            segments.append("{id}")
+        elif _SLUG.match(segment) or len(segment) > 40:
+            segments.append("{slug}")
+        else:
+            segments.append(segment.lower())
+    query = "&".join(sorted({key for key, _ in parse_qsl(parts.query, keep_blank_values=True)}))
+    return "/" + "/".join(segments) + (f"?{query}" if query else "")
+
+
+def structure_hash(tree: lxml.html.HtmlElement) -> int:
+    """
+    SimHash of the DOM structure of a page.
+
+    The features are the distinct tag paths (with the first class of each
+    element) up to STRUCTURE_PATH_DEPTH levels deep. Text and repeated
+    elements don't contribute, so pages built from the same template hash
+    to nearby values even when their content and list lengths differ.
+    """
+    features: Set[str] = set()
+    stack: List[Tuple[Any, Tuple[str, ...]]] = [(tree, ())]
+    visited = 0
+    while stack and visited < STRUCTURE_MAX_ELEMENTS:
+        element, path = stack.pop()
+        if not isinstance(element.tag, str):
+            continue
+        visited += 1
+        classes = (element.get("class") or "").split()
+        path = (path + (element.tag + ("." + classes[0] if classes else ""),))[-STRUCTURE_PATH_DEPTH:]
+        features.add("/".join(path))
+        stack.extend((child, path) for child in element)
+
+    weights = [0] * 64
+    for feature in features:
+        value = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def _distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _local_name(tag: Any) -> str:
+    return etree.QName(tag).localname if isinstance(tag, str) else ""
+
+
+async def _stream_sitemap(url: str) -> AsyncIterator[Tuple[str, str]]:
+    """
+    Read one sitemap (plain or gzipped) as it downloads.
+
+    Yields:
+        ("sitemap", url) for entries of a sitemap index, ("page", url) for
+        pages; elements are discarded once read so memory stays constant
+    """
+    parser = etree.XMLPullParser(events=("end",), resolve_entities=False, no_network=True)
+    decompressor = None
+    first = True
+    async with http_client.stream("GET", url, timeout=SNAPSHOT_TIMEOUT) as response:
+        if response.status_code >= 400:
+            logger.warning(f"Sitemap {url} returned {response.status_code}")
+            return
+        async for chunk in response.aiter_bytes():
+            if first:
+                # Gzipped sitemaps are served as files, not with Content-Encoding
+                first = False
+                if chunk.startswith(_GZIP_MAGIC):
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            if decompressor is not None:
+                chunk = decompressor.decompress(chunk)
+            parser.feed(chunk)
+            for _, element in parser.read_events():
+                name = _local_name(element.tag)
+                if name not in ("url", "sitemap"):
+                    continue
+                for child in element:
+                    if _local_name(child.tag) == "loc" and child.text:
+                        yield ("page" if name == "url" else "sitemap"), child.text.strip()
+                        break
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+
+
+async def iter_sitemap_urls(sitemaps: List[str],
+                            max_urls: int = SITEMAP_MAX_URLS) -> AsyncIterator[str]:
+    """
+    Page URLs listed by sitemaps, following sitemap indexes.
+
+    Args:
+        sitemaps: URLs of the sitemaps (or sitemap indexes) to start from
+        max_urls: Stop after this many page URLs
+    """
+    queue = list(sitemaps)
+    seen = set(queue)
+    count = 0
+    files = 0
+    while queue and files < SITEMAP_MAX_FILES:
+        sitemap = queue.pop(0)
+        files += 1
+        try:
+            async for kind, loc in _stream_sitemap(sitemap):
+                if kind == "sitemap":
+                    if loc not in seen:
+                        seen.add(loc)
+                        queue.append(loc)
+                    continue
+                yield loc
+                count += 1
+                if count >= max_urls:
+                    return
+        except (httpx.HTTPError, etree.XMLSyntaxError, zlib.error) as e:
+            logger.warning(f"Failed to read sitemap {sitemap}: {str(e)}")
+
+
+class Template:
+    """Pages sharing a DOM structure, audited through one representative"""
+
+    def __init__(self, template_id: int, structure: int, snapshot: PageSnapshot, pattern: str, pages: float):
+        self.id = template_id
+        self.structure = structure
+        self.representative = snapshot
+        self.patterns: Dict[str, float] = {}
+        self.samples = 0
+        self.add(pattern, pages)
+
+    def add(self, pattern: str, pages: float):
+        self.patterns[pattern] = self.patterns.get(pattern, 0) + pages
+        self.samples += 1
+
+    @property
+    def pages(self) -> int:
+        return round(sum(self.patterns.values()))
+
+    def to_dict(self) -> Dict[str, Any]:
+        top = sorted(self.patterns.items(), key=lambda p: -p[1])[:10]
+        return {
+            "id": self.id,
+            "representative": self.representative.final_url,
+            "pages": self.pages,
+            "sampled_pages": self.samples,
+            "patterns": [{"pattern": pattern, "pages": round(pages)} for pattern, pages in top],
+        }
+
+
+class SitePlan:
+    """
+    Template clusters of a site, built from its sitemaps.
+
+    URLs are streamed from the sitemaps and only counted per URL pattern,
+    keeping a few reservoir samples each. Samples of the largest patterns
+    are then fetched and grouped by structural hash; every group is a
+    template whose representative page is audited on behalf of all the
+    pages of its patterns.
+    """
+
+    def __init__(self, start_url: str):
+        self.start_url = start_url
+        self.total = 0
+        self.patterns: Dict[str, Dict[str, Any]] = {}
+        self.templates: List[Template] = []
+        self.unclassified = 0
+        # Seeded per site so repeated audits sample the same pages
+        self._random = random.Random(start_url)
+
+    def add(self, url: str):
+        """Count a sitemap URL under its pattern"""
+        self.total += 1
+        pattern = url_pattern(url)
+        if pattern not in self.patterns and len(self.patterns) >= MAX_PATTERNS:
+            pattern = "/" + pattern.strip("/").split("/", 1)[0].split("?", 1)[0] + "/**"
+        entry = self.patterns.setdefault(pattern, {"count": 0, "samples": []})
+        entry["count"] += 1
+        if len(entry["samples"]) < SAMPLES_PER_PATTERN:
+            entry["samples"].append(url)
+        else:
+            slot = self._random.randrange(entry["count"])
+            if slot < SAMPLES_PER_PATTERN:
+                entry["samples"][slot] = url
+
+    def sample_urls(self, budget: int = SAMPLE_PAGES) -> List[Tuple[str, str]]:
+        """(pattern, url) pairs to fetch: one per pattern, largest first, then further samples"""
+        ranked = sorted(self.patterns.items(), key=lambda p: -p[1]["count"])
+        selected = []
+        for round_index in range(SAMPLES_PER_PATTERN):
+            for pattern, entry in ranked:
+                if len(selected) >= budget:
+                    return selected
+                if round_index < len(entry["samples"]):
+                    selected.append((pattern, entry["samples"][round_index]))
+        return selected
+
+    def cluster(self, samples: List[Tuple[str, PageSnapshot]]):
+        """Group fetched samples into templates by structural hash"""
+        fetched: Dict[str, int] = {}
+        for pattern, _ in samples:
+            fetched[pattern] = fetched.get(pattern, 0) + 1
+
+        for pattern, snapshot in samples:
+            checkpoint()
+            tree = snapshot.tree
+            if tree is None:
+                continue
+            structure = structure_hash(tree)
+            pages = self.patterns[pattern]["count"] / fetched[pattern]
+            nearest = min(self.templates, key=lambda t: _distance(t.structure, structure), default=None)
+            if nearest is not None and (_distance(nearest.structure, structure) <= STRUCTURE_DISTANCE
+                                        or len(self.templates) >= MAX_TEMPLATES):
+                nearest.add(pattern, pages)
+            else:
+                self.templates.append(Template(len(self.templates) + 1, structure, snapshot, pattern, pages))
+        self.unclassified = self.total - sum(t.pages for t in self.templates)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "sitemap_urls": self.total,
+            "patterns": len(self.patterns),
+            "templates": [template.to_dict() for template in self.templates],
+            "unclassified_pages": max(self.unclassified, 0),
+        }
+
+
+async def discover_sitemaps(url: str) -> List[str]:
+    """Sitemaps announced in robots.txt, or the conventional /sitemap.xml"""
+    robots = await robots_cache.get(url)
+    sitemaps = robots.site_maps() or []
+    if not sitemaps:
+        parts = urlsplit(url)
+        sitemaps = [f"{parts.scheme}://{parts.netloc}/sitemap.xml"]
+    return sitemaps
+
+
+async def plan_site(url: str) -> Optional[SitePlan]:
+    """
+    Build the template plan of a large site.
+
+    Returns:
+        The plan with its templates and their fetched representatives, or
+        None when the sitemaps list no more than SITEMAP_SAMPLING_THRESHOLD
+        pages (the site is small enough to crawl)
+    """
+    start = normalize_url(url) or url
+    plan = SitePlan(start)
+    async for page_url in iter_sitemap_urls(await discover_sitemaps(start)):
+        plan.add(page_url)
+    if plan.total <= SITEMAP_SAMPLING_THRESHOLD:
+        return None
+    logger.info(f"Sitemaps of {start} list {plan.total} pages in {len(plan.patterns)} URL patterns")
+
+    limiter = HostLimiter()
+
+    async def fetch(pattern: str, page_url: str) -> Optional[Tuple[str, PageSnapshot]]:
+        robots = await robots_cache.get(page_url)
+        if not robots.can_fetch(USER_AGENT, page_url):
+            return None
+        semaphore = await limiter.acquire(urlsplit(page_url).netloc, robots.crawl_delay(USER_AGENT))
+        try:
+            snapshot = await fetch_snapshot(page_url)
+        except httpx.HTTPError as e:
+            logger.warning(f"Failed to fetch sample page {page_url}: {str(e)}")
+            return None
+        finally:
+            semaphore.release()
+        if snapshot.status_code >= 400:
+            return None
+        await asyncio.to_thread(lambda: snapshot.tree)
+        return pattern, snapshot
+
+    fetched = await asyncio.gather(*(fetch(pattern, u) for pattern, u in plan.sample_urls()))
+    await asyncio.to_thread(plan.cluster, [sample for sample in fetched if sample is not None])
+    logger.info(f"Grouped {plan.total} pages of {start} into {len(plan.templates)} templates")
+    return plan
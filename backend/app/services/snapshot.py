@@ -0,0 +1,175 @@
+import os
+import re
+import time
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+from urllib.parse import urljoin
+
+import lxml.html
+from loguru import logger
+
+from app.services.http_client import http_client, read_limited
+from app.services.telemetry import span
+
+# Fetch limits (overridable through environment variables)
+SNAPSHOT_TIMEOUT = float(os.getenv("SNAPSHOT_TIMEOUT", 30))
+SNAPSHOT_MAX_BYTES = int(os.getenv("SNAPSHOT_MAX_BYTES", 10 * 1024 * 1024))
+
+# Separates the cookies of a merged Set-Cookie header; the comma inside an
+# Expires date is not followed by a name=value pair
+COOKIE_SEPARATOR = re.compile(r",\s*(?=[^;,\s]+=)")
+
+# Elements referencing subresources and the attribute holding the reference
+RESOURCE_SELECTORS: Tuple[Tuple[str, str, str], ...] = (
+    ("script", "src", "script"),
+    ("img", "src", "image"),
+    ("iframe", "src", "iframe"),
+    ("video", "src", "media"),
+    ("audio", "src", "media"),
+    ("source", "src", "media"),
+)
+
+
+class PageSnapshot:
+    """
+    Immutable view of a single fetched page.
+
+    The snapshot is built once per page and handed to every analysis module,
+    so the page is downloaded and parsed exactly once per audit. Modules must
+    treat it as read-only: headers, cookies (one Set-Cookie value each) and
+    resources are exposed as immutable containers and the parsed tree is
+    shared between modules.
+    """
+
+    def __init__(self, url: str, final_url: str, status_code: int, headers: Mapping[str, str],
+                 body: bytes, encoding: Optional[str] = None, timings: Optional[Dict[str, float]] = None):
+        self.url = url
+        self.final_url = final_url
+        self.status_code = status_code
+        self.headers = MappingProxyType({k.lower(): v for k, v in headers.items()})
+        if hasattr(headers, "get_list"):
+            cookies = headers.get_list("set-cookie")
+        else:
+            cookies = COOKIE_SEPARATOR.split(self.headers.get("set-cookie", ""))
+        self.cookies: Tuple[str, ...] = tuple(cookie for cookie in cookies if "=" in cookie)
+        self.body = body
+        self.encoding = encoding or "utf-8"
+        self._timings = dict(timings or {})
+        self._tree = None
+        self._resources = None
+
+    @property
+    def timings(self) -> Mapping[str, float]:
+        """Timings of the fetch and parse steps in milliseconds"""
+        return MappingProxyType(self._timings)
+
+    @property
+    def content_type(self) -> str:
+        return self.headers.get("content-type", "")
+
+    @property
+    def is_html(self) -> bool:
+        return "html" in self.content_type or not self.content_type
+
+    @property
+    def html(self) -> str:
+        """The decoded response body"""
+        return self.body.decode(self.encoding, errors="replace")
+
+    @property
+    def tree(self) -> Optional[lxml.html.HtmlElement]:
+        """The parsed document (parsed lazily, once)"""
+        if self._tree is None and self.is_html and self.body:
+            started = time.perf_counter()
+            try:
+                with span("parse", "html"):
+                    self._tree = lxml.html.document_fromstring(self.body, base_url=self.final_url)
+            except Exception as e:
+                logger.warning(f"Failed to parse {self.final_url}: {str(e)}")
+            self._timings["parse"] = (time.perf_counter() - started) * 1000
+        return self._tree
+
+    @property
+    def resources(self) -> Tuple[Mapping[str, str], ...]:
+        """Subresources referenced by the document as (url, type) records"""
+        if self._resources is None:
+            self._resources = tuple(MappingProxyType(r) for r in self._extract_resources())
+        return self._resources
+
+    def _extract_resources(self) -> List[Dict[str, str]]:
+        tree = self.tree
+        if tree is None:
+            return []
+
+        resources = []
+        seen = set()
+
+        def add(ref: Optional[str], kind: str):
+            if not ref or ref.startswith(("data:", "javascript:", "#")):
+                return
+            absolute = urljoin(self.final_url, ref.strip())
+            if absolute not in seen:
+                seen.add(absolute)
+                resources.append({"url": absolute, "type": kind})
+
+        for tag, attr, kind in RESOURCE_SELECTORS:
+            for element in tree.iter(tag):
+                add(element.get(attr), kind)
+
+        for link in tree.iter("link"):
+            rel = (link.get("rel") or "").lower()
+            if "stylesheet" in rel:
+                add(link.get("href"), "stylesheet")
+            elif "icon" in rel:
+                add(link.get("href"), "image")
+            elif "preload" in rel:
+                add(link.get("href"), link.get("as") or "other")
+
+        return resources
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Summary of the snapshot suitable for storing with the task"""
+        return {
+            "url": self.url,
+            "final_url": self.final_url,
+            "status_code": self.status_code,
+            "content_type": self.content_type,
+            "size": len(self.body),
+            "resources": len(self.resources),
+            "timings": dict(self._timings),
+        }
+
+
+async def fetch_snapshot(url: str, headers: Optional[Dict[str, str]] = None) -> PageSnapshot:
+    """
+    Download a page and wrap it in a PageSnapshot.
+
+    Args:
+        url: The URL to fetch
+        headers: Extra request headers (e.g. conditional request validators)
+
+    Returns:
+        The snapshot of the fetched page
+    """
+    started = time.perf_counter()
+    with span("fetch", "page"):
+        async with http_client.stream("GET", url, headers=headers, timeout=SNAPSHOT_TIMEOUT) as response:
+            headers_at = time.perf_counter()
+            body, truncated = await read_limited(response, SNAPSHOT_MAX_BYTES)
+            if truncated:
+                logger.warning(f"Response from {url} exceeds {SNAPSHOT_MAX_BYTES} bytes, truncating")
+            finished = time.perf_counter()
+
+    return PageSnapshot(
+        url=url,
+        final_url=str(response.url),
+        status_code=response.status_code,
+        headers=response.headers,
+        body=body,
+        encoding=response.charset_encoding,
+        timings={
+            "time_to_headers": (headers_at - started) * 1000,
+            "download": (finished - headers_at) * 1000,
+            "total": (finished - started) * 1000,
+        }
+    )
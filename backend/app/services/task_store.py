@@ -0,0 +1,310 @@
+import asyncio
+import json
+import os
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Union
+from urllib.parse import urlsplit
+
+from loguru import logger
+from sqlalchemy import DateTime, Index, LargeBinary, String, delete, or_, select
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.services.database import Base, SessionLocal, WriteSession, init_db
+
+# Number of completed task documents kept in memory for repeated reads
+TASK_CACHE_SIZE = int(os.getenv("TASK_CACHE_SIZE", 1024))
+
+# Statuses after which a task document no longer changes
+FINAL_STATUSES = {"completed", "error", "rejected", "cancelled", "timed_out"}
+
+# zlib level for stored documents; low levels already shrink JSON severalfold
+TASK_COMPRESSION_LEVEL = int(os.getenv("TASK_COMPRESSION_LEVEL", 3))
+
+# Task fields stored as segments of their own instead of in the document
+PAGES_SEGMENT = "@pages"
+
+
+class TaskRecord(Base):
+    """
+    A persisted analysis task.
+
+    The document holds the task without its module results and crawled
+    pages, which are stored as separate segments; it is compressed JSON.
+    """
+
+    __tablename__ = "analysis_tasks"
+
+    task_id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    url: Mapped[str] = mapped_column(String(2048), index=True)
+    domain: Mapped[str] = mapped_column(String(255))
+    status: Mapped[str] = mapped_column(String(16), index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime)
+    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True, index=True)
+    document: Mapped[bytes] = mapped_column(LargeBinary)
+
+    __table_args__ = (
+        Index("ix_analysis_tasks_domain_created", "domain", "created_at"),
+    )
+
+
+class TaskModuleResult(Base):
+    """
+    A segment of a task: one module result, or the crawled pages.
+
+    Module results are written as soon as a module finishes. Keyed by
+    (task_id, module) so that writing the same result again, for example
+    after a crashed worker's job is retried, is idempotent. Each segment is
+    compressed on its own, so reading one module never decodes the others.
+    """
+
+    __tablename__ = "analysis_task_modules"
+
+    task_id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    module: Mapped[str] = mapped_column(String(32), primary_key=True)
+    result: Mapped[bytes] = mapped_column(LargeBinary)
+    updated_at: Mapped[datetime] = mapped_column(DateTime)
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def _encode(value: Any) -> bytes:
+    return zlib.compress(json.dumps(value, separators=(",", ":"), default=str).encode(), TASK_COMPRESSION_LEVEL)
+
+
+def _decode(blob: Union[bytes, str]) -> Any:
+    # Rows written before compression was introduced hold plain JSON text
+    if isinstance(blob, str):
+        return json.loads(blob)
+    return json.loads(zlib.decompress(blob))
+
+
+def project(task: Dict[str, Any], fields: Optional[Iterable[str]] = None,
+            modules: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Restrict a task document to some top-level fields and module results.
+
+    The task ID is always kept.
+    """
+    if modules is not None and "results" in task:
+        task = {**task, "results": {m: r for m, r in task["results"].items() if m in set(modules)}}
+    if fields is not None:
+        task = {k: v for k, v in task.items() if k in set(fields) or k == "task_id"}
+    return task
+
+
+class TaskStore:
+    """
+    Persistent store for analysis tasks.
+
+    Tasks live in the database, indexed by url, domain, status and
+    timestamps. Tasks being executed by this process are pinned in memory so
+    the analyzer can update them in place; once a task reaches a final status
+    it is written back and only kept in a bounded LRU cache of recently read
+    documents, so memory stays flat no matter how many audits have run.
+    Tasks that are not final and not executed here are always read from the
+    database, since another process may be updating them; module results
+    stored while such a task runs are merged into the returned document.
+    Reads can be projected to some fields and modules, in which case only
+    the segments holding them are loaded and decompressed.
+    """
+
+    def __init__(self, cache_size: int = TASK_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._active: Dict[str, Dict[str, Any]] = {}
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._schema_ready = False
+
+    def _ensure_schema(self):
+        if not self._schema_ready:
+            init_db()
+            self._schema_ready = True
+
+    async def create(self, task_id: str, task: Dict[str, Any]):
+        """Persist a new task"""
+        await asyncio.to_thread(self._write, task_id, task, True)
+
+    async def save(self, task_id: str, task: Dict[str, Any]):
+        """
+        Persist the current state of a task.
+
+        Tasks that are not final are pinned in memory, as the caller is the
+        process executing them; tasks reaching a final status are unpinned
+        and moved to the LRU cache.
+        """
+        await asyncio.to_thread(self._write, task_id, task, False)
+        if task.get("status") in FINAL_STATUSES:
+            self._active.pop(task_id, None)
+            self._remember(task_id, task)
+        else:
+            self._active[task_id] = task
+
+    async def save_module_result(self, task_id: str, module: str, result: Dict[str, Any]):
+        """Persist a single module result of a running task (idempotent)"""
+        await asyncio.to_thread(self._write_module_result, task_id, module, result)
+
+    def discard(self, task_id: str):
+        """Unpin a task this process stopped executing, without persisting it"""
+        self._active.pop(task_id, None)
+
+    async def delete(self, task_ids: List[str]):
+        """Remove tasks and their results"""
+        for task_id in task_ids:
+            self._active.pop(task_id, None)
+            self._cache.pop(task_id, None)
+        await asyncio.to_thread(self._delete, task_ids)
+
+    async def get(self, task_id: str, fields: Optional[List[str]] = None,
+                  modules: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Return a task document by ID.
+
+        Args:
+            task_id: The ID of the task
+            fields: Top-level fields to return (all when omitted)
+            modules: Module results to return (all when omitted)
+
+        Returns:
+            The task document, or a projected copy of it
+        """
+        projected = fields is not None or modules is not None
+        if task_id in self._active:
+            task = self._active[task_id]
+            return project(task, fields, modules) if projected else task
+        if task_id in self._cache:
+            self._cache.move_to_end(task_id)
+            task = self._cache[task_id]
+            return project(task, fields, modules) if projected else task
+
+        if projected:
+            return await asyncio.to_thread(self._read, task_id, fields, modules)
+        task = await asyncio.to_thread(self._read, task_id)
+        if task is not None and task.get("status") in FINAL_STATUSES:
+            self._remember(task_id, task)
+        return task
+
+    async def find(self, url: Optional[str] = None, domain: Optional[str] = None,
+                   status: Optional[str] = None, since: Optional[datetime] = None,
+                   limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        Look up tasks through the database indexes, newest first.
+
+        Returns:
+            Lightweight task records (without module results)
+        """
+        return await asyncio.to_thread(self._find, url, domain, status, since, limit, offset)
+
+    def _remember(self, task_id: str, task: Dict[str, Any]):
+        self._cache[task_id] = task
+        self._cache.move_to_end(task_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _write(self, task_id: str, task: Dict[str, Any], new: bool):
+        self._ensure_schema()
+        now = datetime.now()
+        with WriteSession.begin() as session:
+            record = None if new else session.get(TaskRecord, task_id)
+            if record is None:
+                record = TaskRecord(
+                    task_id=task_id,
+                    url=task["url"],
+                    domain=(urlsplit(task["url"]).hostname or "").lower(),
+                    created_at=_parse_timestamp(task.get("timestamp")) or now,
+                )
+                session.add(record)
+            record.status = task.get("status", "pending")
+            record.updated_at = now
+            record.completed_at = _parse_timestamp(task.get("completed_at"))
+            record.document = _encode({k: v for k, v in task.items() if k not in ("results", "pages")})
+
+            segments = dict(task.get("results", {}))
+            if "pages" in task:
+                segments[PAGES_SEGMENT] = task["pages"]
+            for name, value in segments.items():
+                session.merge(TaskModuleResult(task_id=task_id, module=name, result=_encode(value), updated_at=now))
+
+    def _write_module_result(self, task_id: str, module: str, result: Dict[str, Any]):
+        self._ensure_schema()
+        with WriteSession.begin() as session:
+            session.merge(TaskModuleResult(
+                task_id=task_id,
+                module=module,
+                result=_encode(result),
+                updated_at=datetime.now()
+            ))
+
+    def _delete(self, task_ids: List[str]):
+        self._ensure_schema()
+        with WriteSession.begin() as session:
+            session.execute(delete(TaskModuleResult).where(TaskModuleResult.task_id.in_(task_ids)))
+            session.execute(delete(TaskRecord).where(TaskRecord.task_id.in_(task_ids)))
+
+    def _read(self, task_id: str, fields: Optional[List[str]] = None,
+              modules: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        self._ensure_schema()
+        try:
+            with SessionLocal() as session:
+                document = session.scalar(select(TaskRecord.document).where(TaskRecord.task_id == task_id))
+                if document is None:
+                    return None
+                task = _decode(document)
+                task.setdefault("results", {})
+
+                # Only load the segments the projection keeps
+                segments = []
+                if fields is None or "results" in fields:
+                    segments.append(TaskModuleResult.module.in_(modules) if modules is not None
+                                    else TaskModuleResult.module != PAGES_SEGMENT)
+                if fields is None or "pages" in fields:
+                    segments.append(TaskModuleResult.module == PAGES_SEGMENT)
+                if segments:
+                    query = select(TaskModuleResult.module, TaskModuleResult.result).where(
+                        TaskModuleResult.task_id == task_id, or_(*segments)
+                    )
+                    for name, blob in session.execute(query):
+                        if name == PAGES_SEGMENT:
+                            task["pages"] = _decode(blob)
+                        else:
+                            task["results"][name] = _decode(blob)
+            return project(task, fields, modules)
+        except Exception as e:
+            logger.error(f"Failed to load task {task_id}: {str(e)}")
+            return None
+
+    def _find(self, url, domain, status, since, limit, offset) -> List[Dict[str, Any]]:
+        self._ensure_schema()
+        query = select(
+            TaskRecord.task_id, TaskRecord.url, TaskRecord.domain, TaskRecord.status,
+            TaskRecord.created_at, TaskRecord.completed_at
+        )
+        if url:
+            query = query.where(TaskRecord.url == url)
+        if domain:
+            query = query.where(TaskRecord.domain == domain.lower())
+        if status:
+            query = query.where(TaskRecord.status == status)
+        if since:
+            query = query.where(TaskRecord.created_at >= since)
+        query = query.order_by(TaskRecord.created_at.desc()).limit(limit).offset(offset)
+
+        with SessionLocal() as session:
+            return [
+                {
+                    "task_id": row.task_id,
+                    "url": row.url,
+                    "domain": row.domain,
+                    "status": row.status,
+                    "created_at": row.created_at.isoformat(),
+                    "completed_at": row.completed_at.isoformat() if row.completed_at else None,
+                }
+                for row in session.execute(query)
+            ]
+
+
+# Process-wide task store
+task_store = TaskStore()
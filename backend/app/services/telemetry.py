@@ -0,0 +1,333 @@
+import asyncio
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import DateTime, String, Text, delete, select
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.services.database import Base, SessionLocal, WriteSession, init_db
+
+# How often each process publishes its metrics for the /metrics endpoint,
+# and after how long the metrics of a process that stopped doing so are dropped
+TELEMETRY_FLUSH_INTERVAL = float(os.getenv("TELEMETRY_FLUSH_INTERVAL", 10))
+TELEMETRY_STALE_AFTER = float(os.getenv("TELEMETRY_STALE_AFTER", 60))
+# How often the event loop is checked for lag
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", 0.5))
+# Spans kept in a task's timing breakdown; later spans are only counted
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", 500))
+
+# Histogram bucket upper bounds in seconds
+SPAN_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+# Name, type, help text and (for histograms) buckets of every metric
+METRICS = {
+    "audit_span_seconds": ("histogram", "Duration of traced operations", SPAN_BUCKETS),
+    "audit_span_errors_total": ("counter", "Traced operations that raised", None),
+    "audit_tasks_total": ("counter", "Analysis tasks finished, by final status", None),
+    "audit_jobs_in_flight": ("gauge", "Analysis jobs running in a worker", None),
+    "audit_queue_depth": ("gauge", "Analysis jobs waiting in the queue", None),
+    "event_loop_lag_seconds": ("histogram", "Delay of event loop wakeups past their due time", LAG_BUCKETS),
+    "event_loop_lag_last_seconds": ("gauge", "Most recent event loop lag measurement", None),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class TelemetrySnapshot(Base):
+    """The latest metrics published by one process (API or worker)"""
+
+    __tablename__ = "telemetry_snapshots"
+
+    process: Mapped[str] = mapped_column(String(255), primary_key=True)
+    data: Mapped[str] = mapped_column(Text)
+    updated_at: Mapped[datetime] = mapped_column(DateTime)
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metrics:
+    """
+    In-process counters, gauges and histograms.
+
+    Updates are a dictionary lookup and a few additions under a lock, cheap
+    enough to record every module run, fetch and parse. Audits run in worker
+    processes, so each process periodically publishes a snapshot of its
+    metrics to the database and the API renders them all, labelled with the
+    process they come from, in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        self._schema_ready = False
+
+    def _ensure_schema(self):
+        if not self._schema_ready:
+            init_db()
+            self._schema_ready = True
+
+    def inc(self, metric: str, value: float = 1, **labels):
+        key = (metric, _labels(labels))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, metric: str, value: float, **labels):
+        with self._lock:
+            self._values[(metric, _labels(labels))] = value
+
+    def observe(self, metric: str, value: float, **labels):
+        buckets = METRICS[metric][2]
+        key = (metric, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # Per-bucket counts, then +Inf, sum and count
+                histogram = self._histograms[key] = [0.0] * (len(buckets) + 3)
+            histogram[bisect.bisect_left(buckets, value)] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """The current metrics as a JSON-serializable document"""
+        with self._lock:
+            return {
+                "values": [[name, list(labels), value] for (name, labels), value in self._values.items()],
+                "histograms": [[name, list(labels), list(counts)] for (name, labels), counts in self._histograms.items()],
+            }
+
+    async def publish(self, process: str):
+        """Store this process's metrics for the /metrics endpoint"""
+        await asyncio.to_thread(self._publish, process, json.dumps(self.snapshot()))
+
+    async def render(self, process: str, gauges: Optional[Dict[str, float]] = None) -> str:
+        """
+        Render the metrics of all live processes in the Prometheus text format.
+
+        Args:
+            process: Name of this process; its own metrics are read live
+            gauges: Extra unlabelled gauges measured at scrape time (e.g. queue depth)
+
+        Returns:
+            The exposition text
+        """
+        snapshots = await asyncio.to_thread(self._collect, process)
+        snapshots[process] = self.snapshot()
+
+        series: Dict[str, List[str]] = {name: [] for name in METRICS}
+        for name, value in (gauges or {}).items():
+            series[name].append(f"{name} {_format_value(value)}")
+
+        for source, snapshot in sorted(snapshots.items()):
+            extra = (("process", source),)
+            for name, labels, value in snapshot.get("values", ()):
+                if name in series:
+                    labels = tuple(tuple(pair) for pair in labels)
+                    series[name].append(f"{name}{_format_labels(labels, extra)} {_format_value(value)}")
+            for name, labels, counts in snapshot.get("histograms", ()):
+                if name not in series:
+                    continue
+                labels = tuple(tuple(pair) for pair in labels)
+                cumulative = 0.0
+                for bound, count in zip(METRICS[name][2] + ("+Inf",), counts[:-2]):
+                    cumulative += count
+                    le = (("le", bound if isinstance(bound, str) else _format_value(bound)),)
+                    series[name].append(f"{name}_bucket{_format_labels(labels, extra + le)} {_format_value(cumulative)}")
+                series[name].append(f"{name}_sum{_format_labels(labels, extra)} {repr(float(counts[-2]))}")
+                series[name].append(f"{name}_count{_format_labels(labels, extra)} {_format_value(counts[-1])}")
+
+        lines = []
+        for name, (kind, help_text, _) in METRICS.items():
+            if series[name]:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(series[name])
+        return "\n".join(lines) + "\n"
+
+    def _publish(self, process: str, data: str):
+        self._ensure_schema()
+        with WriteSession.begin() as session:
+            session.merge(TelemetrySnapshot(process=process, data=data, updated_at=datetime.now()))
+
+    def _collect(self, process: str) -> Dict[str, Dict[str, Any]]:
+        self._ensure_schema()
+        cutoff = datetime.now() - timedelta(seconds=TELEMETRY_STALE_AFTER)
+        with WriteSession.begin() as session:
+            session.execute(delete(TelemetrySnapshot).where(TelemetrySnapshot.updated_at < cutoff))
+        with SessionLocal() as session:
+            rows = session.scalars(select(TelemetrySnapshot).where(TelemetrySnapshot.process != process))
+            return {row.process: json.loads(row.data) for row in rows}
+
+
+class Trace:
+    """Spans recorded while running one task, summarized as its timing breakdown"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self.kinds: Dict[str, List[float]] = {}
+        self.modules: Dict[str, float] = {}
+
+    def add(self, kind: str, name: str, started: float, duration: float, failed: bool):
+        totals = self.kinds.setdefault(kind, [0, 0.0, 0.0])
+        totals[0] += 1
+        totals[1] += duration
+        totals[2] = max(totals[2], duration)
+        if kind == "module":
+            # Per-page runs of a module add up
+            self.modules[name] = self.modules.get(name, 0.0) + duration
+
+        if len(self.spans) >= TRACE_MAX_SPANS:
+            self.dropped += 1
+            return
+        span = {
+            "kind": kind,
+            "name": name,
+            "start_ms": round((started - self.started) * 1000, 1),
+            "duration_ms": round(duration * 1000, 1),
+        }
+        if failed:
+            span["error"] = True
+        self.spans.append(span)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        The timing breakdown stored on the task.
+
+        Totals per kind add up spans that ran concurrently, so they can
+        exceed the task's wall-clock time.
+        """
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "by_kind": {
+                kind: {"count": count, "total_ms": round(total * 1000, 1), "max_ms": round(longest * 1000, 1)}
+                for kind, (count, total, longest) in self.kinds.items()
+            },
+            "modules": {name: round(total * 1000, 1) for name, total in self.modules.items()},
+            "spans": sorted(self.spans, key=lambda span: span["start_ms"]),
+            "dropped_spans": self.dropped,
+        }
+
+
+# Trace of the task the current coroutine (or thread started from it) works on
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+@contextmanager
+def trace() -> Iterator[Trace]:
+    """
+    Collect the spans of everything run inside the block into a Trace.
+
+    Context variables are inherited by tasks created and threads started
+    (asyncio.to_thread) from the block, so their spans are collected too.
+    """
+    current = Trace()
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(kind: str, name: str) -> Iterator[None]:
+    """
+    Time an operation.
+
+    The duration is recorded in the ``audit_span_seconds`` histogram and,
+    inside a trace, as a span of the task. ``kind`` and ``name`` become
+    metric labels, so they must come from a small fixed set (module names,
+    fetch purposes, ...), never from URLs.
+
+    Args:
+        kind: Kind of operation: task, module, input, fetch, parse or browser
+        name: What is being done, e.g. the module name
+    """
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        metrics.observe("audit_span_seconds", duration, kind=kind, name=name)
+        if failed:
+            metrics.inc("audit_span_errors_total", kind=kind, name=name)
+        current = _current_trace.get()
+        if current is not None:
+            current.add(kind, name, started, duration, failed)
+
+
+class TelemetryMonitor:
+    """
+    Background loop of a process measuring event loop lag and publishing its metrics.
+
+    The loop sleeps LOOP_LAG_INTERVAL at a time; how much later than
+    requested it wakes up is the time the event loop spent busy with other
+    callbacks, i.e. how long any coroutine of this process could have been
+    kept waiting.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, process: str):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(process))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, process: str):
+        loop = asyncio.get_running_loop()
+        published_at = loop.time()
+        while True:
+            expected = loop.time() + LOOP_LAG_INTERVAL
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            lag = max(0.0, loop.time() - expected)
+            metrics.observe("event_loop_lag_seconds", lag)
+            metrics.set("event_loop_lag_last_seconds", lag)
+
+            if loop.time() - published_at >= TELEMETRY_FLUSH_INTERVAL:
+                published_at = loop.time()
+                try:
+                    await metrics.publish(process)
+                except Exception as e:
+                    logger.error(f"Failed to publish metrics of {process}: {str(e)}")
+
+
+# Process-wide metrics and monitor
+metrics = Metrics()
+telemetry_monitor = TelemetryMonitor()
@@ -0,0 +1,221 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from typing import Dict, List, Optional
+from loguru import logger
+
+from app.services.analyzer import WebsiteAnalyzer
+from app.services.batches import batch_store
+from app.services.browser_pool import browser_pool
+from app.services.cancellation import CANCELLED, TIMED_OUT
+from app.services.events import EVENT_PRUNE_INTERVAL, event_log
+from app.services.http_client import http_client
+from app.services.job_queue import JOB_LEASE_SECONDS, QUEUE_MAX_DEPTH, job_queue
+from app.services.task_store import task_store
+from app.services.telemetry import metrics, telemetry_monitor
+
+# Worker configuration (overridable through environment variables)
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", 2))
+WORKER_MAX_IN_FLIGHT = int(os.getenv("WORKER_MAX_IN_FLIGHT", 4))
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", 0.5))
+WORKER_SHUTDOWN_GRACE = float(os.getenv("WORKER_SHUTDOWN_GRACE", 30))
+WORKER_BATCH_FEED_INTERVAL = float(os.getenv("WORKER_BATCH_FEED_INTERVAL", 2))
+WORKER_CANCEL_CHECK_INTERVAL = float(os.getenv("WORKER_CANCEL_CHECK_INTERVAL", 1))
+
+
+class Worker:
+    """
+    Consumes analysis jobs from the queue.
+
+    A worker runs up to ``max_in_flight`` audits concurrently on its own
+    event loop. While they run it renews their leases every third of the
+    lease period and requeues jobs whose workers stopped doing so; a job
+    whose lease was taken over by another worker is cancelled locally.
+    Every WORKER_CANCEL_CHECK_INTERVAL seconds it also checks whether any of
+    its jobs was cancelled through the API and stops those, persisting
+    their partial results, and every EVENT_PRUNE_INTERVAL it deletes expired
+    progress events. When a job finishes, tasks that were attached to
+    it as identical requests receive a copy of its results. Workers also
+    feed URLs of submitted batches into the queue.
+    """
+
+    def __init__(self, name: Optional[str] = None, max_in_flight: int = WORKER_MAX_IN_FLIGHT):
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.max_in_flight = max_in_flight
+        self.analyzer = WebsiteAnalyzer()
+        self._stopping = asyncio.Event()
+        self._jobs: Dict[str, asyncio.Task] = {}
+
+    async def run(self):
+        """Claim and execute jobs until stopped"""
+        slots = asyncio.Semaphore(self.max_in_flight)
+        heartbeat = asyncio.create_task(self._heartbeat())
+        feeder = asyncio.create_task(self._feed_batches())
+        logger.info(f"Worker {self.name} started (max {self.max_in_flight} jobs in flight)")
+
+        while not self._stopping.is_set():
+            await slots.acquire()
+            try:
+                task_id = await job_queue.claim(self.name)
+            except Exception as e:
+                logger.error(f"Worker {self.name} failed to claim a job: {str(e)}")
+                task_id = None
+
+            if task_id is None:
+                slots.release()
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), WORKER_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job = asyncio.create_task(self._process(task_id))
+            self._jobs[task_id] = job
+            metrics.set("audit_jobs_in_flight", len(self._jobs))
+            job.add_done_callback(lambda done, task_id=task_id: self._job_done(task_id, slots))
+
+        if self._jobs:
+            logger.info(f"Worker {self.name} waiting for {len(self._jobs)} jobs to finish")
+            await asyncio.wait(list(self._jobs.values()), timeout=WORKER_SHUTDOWN_GRACE)
+        heartbeat.cancel()
+        feeder.cancel()
+        logger.info(f"Worker {self.name} stopped")
+
+    def stop(self):
+        """Stop claiming new jobs; jobs in flight are allowed to finish"""
+        self._stopping.set()
+
+    def _job_done(self, task_id: str, slots: asyncio.Semaphore):
+        self._jobs.pop(task_id, None)
+        metrics.set("audit_jobs_in_flight", len(self._jobs))
+        slots.release()
+
+    async def _heartbeat(self):
+        """Stop cancelled jobs, renew leases of running jobs, recover jobs of dead workers and prune events"""
+        loop = asyncio.get_running_loop()
+        next_renewal = loop.time() + JOB_LEASE_SECONDS / 3
+        next_prune = loop.time()
+        while True:
+            await asyncio.sleep(WORKER_CANCEL_CHECK_INTERVAL)
+            try:
+                if loop.time() >= next_prune:
+                    next_prune = loop.time() + EVENT_PRUNE_INTERVAL
+                    await event_log.prune()
+
+                for task_id in await job_queue.cancellations(self.name, list(self._jobs)):
+                    if self.analyzer.cancel(task_id):
+                        logger.info(f"Worker {self.name} stopping cancelled task {task_id}")
+
+                if loop.time() < next_renewal:
+                    continue
+                next_renewal = loop.time() + JOB_LEASE_SECONDS / 3
+                lost = await job_queue.heartbeat(self.name, list(self._jobs))
+                for task_id in lost:
+                    logger.warning(f"Worker {self.name} lost the lease on task {task_id}, cancelling it")
+                    job = self._jobs.get(task_id)
+                    if job is not None:
+                        job.cancel()
+
+                exhausted, cancelled = await job_queue.recover_expired()
+                for task_id in exhausted:
+                    await self._fail(task_id, "Analysis worker stopped responding")
+                for task_id in cancelled:
+                    await self.analyzer.cancel_task(task_id, "Analysis cancelled")
+            except Exception as e:
+                logger.error(f"Worker {self.name} heartbeat failed: {str(e)}")
+
+    async def _feed_batches(self):
+        """Move waiting batch URLs into the queue while it has room for them"""
+        while True:
+            try:
+                await batch_store.feed(self.analyzer.start_analysis, QUEUE_MAX_DEPTH)
+            except Exception as e:
+                logger.error(f"Worker {self.name} failed to feed batches: {str(e)}")
+            await asyncio.sleep(WORKER_BATCH_FEED_INTERVAL)
+
+    async def _process(self, task_id: str):
+        try:
+            await self.analyzer.run_analysis(task_id)
+            task = await task_store.get(task_id)
+            succeeded = task is not None and task.get("status") == "completed"
+            cancelled = task is not None and task.get("status") in (CANCELLED, TIMED_OUT)
+            followers = await job_queue.finish(task_id, self.name, succeeded, cancelled)
+            if followers is None:
+                logger.warning(f"Worker {self.name} finished task {task_id} after losing its lease")
+                return
+            for follower_id in followers:
+                await self.analyzer.share_results(follower_id, task)
+        except asyncio.CancelledError:
+            task_store.discard(task_id)
+            raise
+        except Exception as e:
+            logger.error(f"Worker {self.name} failed to process task {task_id}: {str(e)}")
+
+    async def _fail(self, task_id: str, reason: str):
+        """Mark a task whose job was abandoned as failed, with its attached tasks"""
+        for failed_id in [task_id, *await job_queue.fail_attached(task_id)]:
+            await self.analyzer.fail_task(failed_id, reason)
+
+
+async def _serve(name: str):
+    worker = Worker(name)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+    telemetry_monitor.start(name)
+    try:
+        await browser_pool.start()
+    except Exception as e:
+        # The worker stays usable; browser-based modules will report the error
+        logger.error(f"Worker {name} failed to start the browser pool: {str(e)}")
+    try:
+        await worker.run()
+    finally:
+        await telemetry_monitor.stop()
+        await browser_pool.stop()
+        await http_client.close()
+
+
+def worker_main(name: Optional[str] = None):
+    """Entry point of a worker process"""
+    logger.add("logs/worker.log", rotation="10 MB", retention="1 week", level="INFO")
+    asyncio.run(_serve(name or f"{socket.gethostname()}:{os.getpid()}"))
+
+
+class WorkerPool:
+    """Set of worker processes started and stopped with the API"""
+
+    def __init__(self, processes: int = WORKER_PROCESSES):
+        self.processes = processes
+        self._procs: List[multiprocessing.Process] = []
+
+    def start(self):
+        context = multiprocessing.get_context("spawn")
+        for index in range(self.processes):
+            proc = context.Process(target=worker_main, name=f"analysis-worker-{index}", daemon=True)
+            proc.start()
+            self._procs.append(proc)
+        logger.info(f"Started {self.processes} analysis worker processes")
+
+    async def stop(self):
+        """Ask the workers to finish their jobs, killing those still running after WORKER_SHUTDOWN_GRACE"""
+        for proc in self._procs:
+            if proc.is_alive():
+                proc.terminate()
+        await asyncio.to_thread(self._join, time.monotonic() + WORKER_SHUTDOWN_GRACE)
+        self._procs = []
+
+    def _join(self, deadline: float):
+        for proc in self._procs:
+            proc.join(max(deadline - time.monotonic(), 0))
+        for proc in self._procs:
+            if proc.is_alive():
+                proc.kill()
+                proc.join()
+
+
+if __name__ == "__main__":
+    worker_main()
@@ -0,0 +1,171 @@
+"""
+Local HTTP server generating synthetic websites for benchmarks.
+
+Every path prefix is a separate site (``/site-0/``, ``/site-1/``, ...), so
+a benchmark can audit as many distinct URLs as it needs without any of
+them being answered from the result cache. Pages and assets are generated
+deterministically from the site and page number, sized by the options
+below, and each response is delayed by the configured latency.
+
+    python -m benchmarks.fixture_site --port 8900 --pages 20 --dom-nodes 1500
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+from dataclasses import asdict, dataclass
+
+from aiohttp import web
+
+FIXTURE_HOST = os.getenv("FIXTURE_HOST", "127.0.0.1")
+FIXTURE_PORT = int(os.getenv("FIXTURE_PORT", 8900))
+
+# Asset kinds generated for every page: (file name, content type)
+ASSET_KINDS = (
+    ("app-{}.js", "application/javascript"),
+    ("style-{}.css", "text/css"),
+    ("image-{}.png", "image/png"),
+)
+
+# A well-known library banner so technology detection has something to find
+SCRIPT_BANNER = b"/*! jQuery v3.7.1 | (c) OpenJS Foundation and other contributors | jquery.org/license */\n"
+
+
+@dataclass
+class SiteShape:
+    """Size and speed of the generated sites"""
+
+    pages: int = 10  # Pages per site, linked from every page
+    dom_nodes: int = 1000  # Approximate number of elements per page
+    assets: int = 6  # Assets referenced by every page
+    asset_kb: int = 40  # Size of each asset
+    latency_ms: float = 20  # Delay before every response
+
+
+def _rng(*parts) -> random.Random:
+    return random.Random(hashlib.sha256("/".join(map(str, parts)).encode()).digest())
+
+
+def render_page(shape: SiteShape, site: str, page: int) -> str:
+    """The HTML of one page of a site"""
+    rng = _rng(site, page)
+    base = f"/{site}/"
+    head = [
+        f"<title>{site} page {page}</title>",
+        f'<meta name="description" content="Synthetic page {page} of {site} for load testing.">',
+        '<meta name="viewport" content="width=device-width, initial-scale=1">',
+    ]
+    for index in range(shape.assets):
+        name = ASSET_KINDS[index % len(ASSET_KINDS)][0].format(index)
+        if name.endswith(".css"):
+            head.append(f'<link rel="stylesheet" href="{base}static/{name}">')
+        elif name.endswith(".js"):
+            head.append(f'<script src="{base}static/{name}" defer></script>')
+
+    nav = "".join(
+        f'<li><a href="{base}{"" if target == 0 else f"page-{target}.html"}">Page {target}</a></li>'
+        for target in range(shape.pages)
+    )
+    body = [f"<header><nav><ul>{nav}</ul></nav></header>", "<main>", f"<h1>{site} page {page}</h1>"]
+
+    images = [ASSET_KINDS[i % len(ASSET_KINDS)][0].format(i) for i in range(shape.assets)]
+    images = [name for name in images if name.endswith(".png")]
+    nodes = shape.pages * 2 + 10
+    section = 0
+    while nodes < shape.dom_nodes:
+        section += 1
+        body.append(f"<section><h2>Section {section}</h2>")
+        for _ in range(rng.randint(3, 8)):
+            words = " ".join(rng.choice(("lorem", "ipsum", "dolor", "sit", "amet", "audit", "page")) for _ in range(30))
+            body.append(f"<p>{words} <a href=\"#s{section}\">more</a></p>")
+            nodes += 2
+        if images and rng.random() < 0.5:
+            # Some images deliberately lack alt text
+            alt = f' alt="Figure {section}"' if rng.random() < 0.7 else ""
+            body.append(f'<img src="{base}static/{rng.choice(images)}"{alt} width="320" height="200">')
+            nodes += 1
+        body.append("<ul>" + "".join(f"<li>Item {i}</li>" for i in range(5)) + "</ul></section>")
+        nodes += 8
+    body.append('<form><label for="q">Search</label><input id="q" name="q"><button>Go</button></form>')
+    body.append("</main><footer><p>Generated for benchmarks</p></footer>")
+
+    return (
+        '<!DOCTYPE html><html lang="en"><head><meta charset="utf-8">'
+        + "".join(head) + "</head><body>" + "".join(body) + "</body></html>"
+    )
+
+
+def render_asset(shape: SiteShape, name: str) -> bytes:
+    """Asset bodies depend only on the name, so sites share identical assets"""
+    size = shape.asset_kb * 1024
+    if name.endswith(".js"):
+        line = b"function f(a,b){return a+b}var x=f(1,2);\n"
+        return (SCRIPT_BANNER + line * (size // len(line) + 1))[:size]
+    if name.endswith(".css"):
+        line = b".c{margin:0;padding:0;color:#123456}\n"
+        return (line * (size // len(line) + 1))[:size]
+    return _rng(name).randbytes(size)
+
+
+def create_app(shape: SiteShape) -> web.Application:
+    latency = shape.latency_ms / 1000
+
+    async def delay(request: web.Request, handler):
+        if latency:
+            await asyncio.sleep(latency)
+        return await handler(request)
+
+    async def page(request: web.Request) -> web.Response:
+        name = request.match_info.get("page", "")
+        number = 0
+        if name:
+            try:
+                number = int(name.removeprefix("page-").removesuffix(".html"))
+            except ValueError:
+                raise web.HTTPNotFound()
+        if number >= shape.pages:
+            raise web.HTTPNotFound()
+        html = render_page(shape, request.match_info["site"], number)
+        return web.Response(text=html, content_type="text/html", headers={"Cache-Control": "max-age=60"})
+
+    async def asset(request: web.Request) -> web.Response:
+        name = request.match_info["name"]
+        for pattern, content_type in ASSET_KINDS:
+            if name.endswith(pattern.rsplit(".", 1)[1]):
+                return web.Response(body=render_asset(shape, name), content_type=content_type,
+                                    headers={"Cache-Control": "max-age=3600", "ETag": f'"{name}"'})
+        raise web.HTTPNotFound()
+
+    async def robots(request: web.Request) -> web.Response:
+        return web.Response(text="User-agent: *\nAllow: /\n")
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response(asdict(shape))
+
+    app = web.Application(middlewares=[web.middleware(delay)])
+    app.router.add_get("/robots.txt", robots)
+    app.router.add_get("/_shape", health)
+    app.router.add_get("/{site}/static/{name}", asset)
+    app.router.add_get("/{site}/", page)
+    app.router.add_get("/{site}/{page}", page)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve synthetic websites for benchmarks")
+    parser.add_argument("--host", default=FIXTURE_HOST)
+    parser.add_argument("--port", type=int, default=FIXTURE_PORT)
+    parser.add_argument("--pages", type=int, default=SiteShape.pages)
+    parser.add_argument("--dom-nodes", type=int, default=SiteShape.dom_nodes)
+    parser.add_argument("--assets", type=int, default=SiteShape.assets)
+    parser.add_argument("--asset-kb", type=int, default=SiteShape.asset_kb)
+    parser.add_argument("--latency-ms", type=float, default=SiteShape.latency_ms)
+    args = parser.parse_args()
+
+    shape = SiteShape(args.pages, args.dom_nodes, args.assets, args.asset_kb, args.latency_ms)
+    web.run_app(create_app(shape), host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""
+Load and latency benchmark of the audit API.
+
+Starts the synthetic site server (benchmarks/fixture_site.py) and the API
+with its workers in a scratch directory, submits audits of distinct
+synthetic sites through ``POST /api/analyze`` at a fixed concurrency and
+polls ``GET /api/analysis/{task_id}`` until each one finishes. Reports
+audits per second, end-to-end latency percentiles, the median time of
+each module (from the task timing breakdown) and the peak RSS of the API
+process tree, then compares them with a stored baseline.
+
+    python -m benchmarks.run --audits 50 --concurrency 8
+    python -m benchmarks.run --save-baseline          # record a new baseline
+
+The exit status is 1 when any metric regressed by more than --threshold
+relative to the baseline. Everything runs locally; no network access is
+needed. Browser-based modules (performance, carbon) need Playwright's
+Chromium installed and are not part of the default module set.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(BACKEND_DIR, "benchmarks", "baseline.json")
+
+FINAL_STATUSES = {"completed", "error", "rejected", "cancelled", "timed_out"}
+
+# Whether a higher value of a metric is better; metrics not listed are not compared
+DIRECTIONS = {
+    "audits_per_second": True,
+    "latency_p50_ms": False,
+    "latency_p95_ms": False,
+    "latency_p99_ms": False,
+    "peak_rss_mb": False,
+}
+
+# Differences in milliseconds below which a timing is never reported as a
+# regression, however large in relative terms (short modules are noisy)
+NOISE_FLOOR_MS = 5
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values: List[float], percent: float) -> Optional[float]:
+    """Linearly interpolated percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _tree_rss_mb(root: int) -> float:
+    """Resident memory of a process and all its descendants (Linux /proc)"""
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; fields resume after ')'
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total = 0
+    pending = [root]
+    while pending:
+        pid = pending.pop()
+        pending.extend(children.get(pid, ()))
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return total / 1024
+
+
+class Service:
+    """A subprocess that is ready once an HTTP endpoint answers"""
+
+    def __init__(self, name: str, command: List[str], ready_url: str, cwd: str, env: Dict[str, str], log: str):
+        self.name = name
+        self.command = command
+        self.ready_url = ready_url
+        self.cwd = cwd
+        self.env = env
+        self.log = log
+        self.process: Optional[subprocess.Popen] = None
+
+    def start(self, timeout: float = 60):
+        with open(self.log, "ab") as log:
+            self.process = subprocess.Popen(self.command, cwd=self.cwd, env=self.env, stdout=log,
+                                            stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.name} exited with status {self.process.returncode}, see {self.log}")
+            try:
+                if httpx.get(self.ready_url, timeout=1).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"{self.name} did not become ready within {timeout}s, see {self.log}")
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+
+class LoadDriver:
+    """Submits audits at a fixed concurrency and records how long each one took"""
+
+    def __init__(self, api_url: str, site_url: str, modules: List[str], depth: int,
+                 concurrency: int, poll_interval: float, audit_timeout: float):
+        self.api_url = api_url
+        self.site_url = site_url
+        self.modules = modules
+        self.depth = depth
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.audit_timeout = audit_timeout
+        self.rejections = 0
+
+    async def run(self, first_site: int, count: int) -> List[Dict[str, Any]]:
+        """Audit sites ``first_site`` .. ``first_site + count - 1``"""
+        sites = iter(range(first_site, first_site + count))
+        records: List[Dict[str, Any]] = []
+        limits = httpx.Limits(max_connections=self.concurrency * 2)
+        async with httpx.AsyncClient(base_url=self.api_url, timeout=30, limits=limits) as client:
+
+            async def user():
+                for site in sites:
+                    records.append(await self._audit(client, f"{self.site_url}/site-{site}/"))
+
+            await asyncio.gather(*(user() for _ in range(self.concurrency)))
+        return records
+
+    async def _audit(self, client: httpx.AsyncClient, url: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        payload = {"url": url, "modules": self.modules, "depth": self.depth}
+        while True:
+            response = await client.post("/api/analyze", json=payload)
+            if response.status_code != 429:
+                break
+            self.rejections += 1
+            await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+        response.raise_for_status()
+        task_id = response.json()["task_id"]
+
+        deadline = started + self.audit_timeout
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            response = await client.get(f"/api/analysis/{task_id}", params={"fields": "status,timings"})
+            task = response.json() if response.status_code == 200 else {}
+            if task.get("status") in FINAL_STATUSES:
+                break
+            if time.perf_counter() > deadline:
+                task = {"status": "timeout"}
+                break
+
+        return {
+            "url": url,
+            "status": task.get("status"),
+            "latency_ms": (time.perf_counter() - started) * 1000,
+            "modules": (task.get("timings") or {}).get("modules", {}),
+        }
+
+
+def summarize(records: List[Dict[str, Any]], elapsed: float, peak_rss_mb: float, rejections: int) -> Dict[str, Any]:
+    completed = [r for r in records if r["status"] == "completed"]
+    latencies = [r["latency_ms"] for r in completed]
+    module_times: Dict[str, List[float]] = {}
+    for record in completed:
+        for name, duration in record["modules"].items():
+            module_times.setdefault(name, []).append(duration)
+
+    metrics = {
+        "audits_per_second": len(completed) / elapsed if elapsed else 0.0,
+        "latency_p50_ms": _percentile(latencies, 50),
+        "latency_p95_ms": _percentile(latencies, 95),
+        "latency_p99_ms": _percentile(latencies, 99),
+        "peak_rss_mb": peak_rss_mb,
+    }
+    for name, durations in sorted(module_times.items()):
+        metrics[f"module_{name}_p50_ms"] = statistics.median(durations)
+    return {
+        "audits": len(records),
+        "completed": len(completed),
+        "failed": len(records) - len(completed),
+        "rejections": rejections,
+        "elapsed_s": elapsed,
+        "metrics": metrics,
+    }
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Metrics that are worse than the baseline by more than ``threshold``"""
+    regressions = []
+    for name, value in result["metrics"].items():
+        before = baseline.get("metrics", {}).get(name)
+        if value is None or not before:
+            continue
+        higher_is_better = DIRECTIONS.get(name, False if name.startswith("module_") else None)
+        if higher_is_better is None:
+            continue
+        if name.endswith("_ms") and abs(value - before) < NOISE_FLOOR_MS:
+            continue
+        change = (value - before) / before
+        if (change < -threshold) if higher_is_better else (change > threshold):
+            regressions.append(f"{name}: {before:.2f} -> {value:.2f} ({change:+.1%})")
+    return regressions
+
+
+def report(result: Dict[str, Any], baseline: Optional[Dict[str, Any]]):
+    print(f"\n{result['completed']}/{result['audits']} audits completed in {result['elapsed_s']:.1f}s"
+          f" ({result['rejections']} rejected with 429 and retried)")
+    print(f"{'metric':<36}{'value':>12}{'baseline':>12}{'change':>10}")
+    for name, value in result["metrics"].items():
+        before = (baseline or {}).get("metrics", {}).get(name)
+        change = f"{(value - before) / before:+.1%}" if value is not None and before else ""
+        shown = f"{value:.2f}" if value is not None else "-"
+        print(f"{name:<36}{shown:>12}{(f'{before:.2f}' if before is not None else '-'):>12}{change:>10}")
+
+
+async def _sample_rss(pid: int, peak: List[float], stop: asyncio.Event):
+    while not stop.is_set():
+        peak[0] = max(peak[0], await asyncio.to_thread(_tree_rss_mb, pid))
+        try:
+            await asyncio.wait_for(stop.wait(), 0.5)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def benchmark(args: argparse.Namespace, api: Service, api_url: str, site_url: str) -> Dict[str, Any]:
+    modules = [m.strip() for m in args.modules.split(",") if m.strip()]
+    driver = LoadDriver(api_url, site_url, modules, args.depth, args.concurrency, args.poll_interval,
+                        args.audit_timeout)
+    if args.warmup:
+        print(f"Warming up with {args.warmup} audits")
+        await driver.run(0, args.warmup)
+        driver.rejections = 0
+
+    print(f"Running {args.audits} audits at concurrency {args.concurrency}")
+    peak = [0.0]
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(_sample_rss(api.process.pid, peak, stop))
+    started = time.perf_counter()
+    records = await driver.run(args.warmup, args.audits)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await sampler
+
+    result = summarize(records, elapsed, peak[0], driver.rejections)
+    result["config"] = {
+        "audits": args.audits,
+        "concurrency": args.concurrency,
+        "workers": args.workers,
+        "modules": modules,
+        "depth": args.depth,
+        "site": {"pages": args.pages, "dom_nodes": args.dom_nodes, "assets": args.assets,
+                 "asset_kb": args.asset_kb, "latency_ms": args.latency_ms},
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+    }
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark audit throughput and latency against synthetic sites")
+    parser.add_argument("--audits", type=int, default=40, help="Audits measured")
+    parser.add_argument("--warmup", type=int, default=4, help="Audits run before measuring")
+    parser.add_argument("--concurrency", type=int, default=8, help="Audits submitted concurrently")
+    parser.add_argument("--workers", type=int, default=2, help="Analysis worker processes")
+    parser.add_argument("--modules", default="seo,accessibility,technology")
+    parser.add_argument("--depth", type=int, default=1)
+    parser.add_argument("--pages", type=int, default=10, help="Pages per synthetic site")
+    parser.add_argument("--dom-nodes", type=int, default=1000, help="Elements per page")
+    parser.add_argument("--assets", type=int, default=6, help="Assets per page")
+    parser.add_argument("--asset-kb", type=int, default=40, help="Size of each asset")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Fixture server response delay")
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument("--audit-timeout", type=float, default=300)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.1, help="Allowed relative regression")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="cometweb-bench-")
+    env = {
+        **os.environ,
+        "PYTHONPATH": BACKEND_DIR,
+        "WORKER_PROCESSES": str(args.workers),
+        "ACCESSIBILITY_RENDER": "false",
+        "TELEMETRY_FLUSH_INTERVAL": "1",
+    }
+    site_port, api_port = _free_port(), _free_port()
+    site_url, api_url = f"http://127.0.0.1:{site_port}", f"http://127.0.0.1:{api_port}"
+
+    fixture = Service(
+        "fixture server",
+        [sys.executable, "-m", "benchmarks.fixture_site", "--port", str(site_port), "--pages", str(args.pages),
+         "--dom-nodes", str(args.dom_nodes), "--assets", str(args.assets), "--asset-kb", str(args.asset_kb),
+         "--latency-ms", str(args.latency_ms)],
+        f"{site_url}/_shape", BACKEND_DIR, env, os.path.join(scratch, "fixture.log"),
+    )
+    # The API runs in the scratch directory so its database, caches and
+    # logs start empty and are not shared with a development instance
+    api = Service(
+        "API",
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(api_port),
+         "--log-level", "warning"],
+        f"{api_url}/health", scratch, env, os.path.join(scratch, "api.log"),
+    )
+
+    print(f"Scratch directory: {scratch}")
+    fixture.start()
+    try:
+        api.start()
+        try:
+            result = asyncio.run(benchmark(args, api, api_url, site_url))
+        finally:
+            api.stop()
+    finally:
+        fixture.stop()
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("config", {}) != result["config"]:
+            print("Warning: the baseline was recorded with a different configuration")
+
+    report(result, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+
+    if result["failed"]:
+        print(f"\n{result['failed']} audits did not complete")
+    if baseline is not None:
+        regressions = compare(result, baseline, args.threshold)
+        if regressions:
+            print(f"\nRegressions beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nNo regressions beyond {args.threshold:.0%}")
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+Shared fixtures of the test suite.
+
+The database, caches and compiled indexes live in a scratch directory, set
+up through the environment before any application module is imported (the
+database engine is created at import). Tables are recreated for every test,
+so tests never see each other's tasks, jobs or cache entries.
+
+    cd backend && python -m pytest
+"""
+import asyncio
+import os
+import tempfile
+
+SCRATCH_DIR = tempfile.mkdtemp(prefix="cometweb-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(SCRATCH_DIR, 'test.db')}",
+    "ASSET_CACHE_DIR": os.path.join(SCRATCH_DIR, "assets"),
+    "REPORT_CACHE_DIR": os.path.join(SCRATCH_DIR, "reports"),
+    "TECH_INDEX_CACHE": os.path.join(SCRATCH_DIR, "fingerprints.idx"),
+    # Tests run without Playwright's Chromium and without network access
+    "ACCESSIBILITY_RENDER": "false",
+    "SITEMAP_SAMPLING": "false",
+    "CRAWL_DELAY": "0",
+    "HTTP_RETRIES": "0",
+})
+
+import pytest  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+from app.services.database import Base, engine  # noqa: E402
+from app.services.http_client import http_client  # noqa: E402
+from benchmarks.fixture_site import SiteShape, create_app  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def event_loop():
+    # The process-wide services (HTTP client, caches) outlive a single test
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.run_until_complete(http_client.close())
+    loop.close()
+
+
+@pytest.fixture(autouse=True)
+def database():
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield
+
+
+async def serve(app: web.Application):
+    """Serve an aiohttp application on a free local port, returning its runner and base URL"""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+@pytest.fixture(scope="session")
+async def fixture_site():
+    """Base URL of a small synthetic site server (see benchmarks/fixture_site.py)"""
+    shape = SiteShape(pages=4, dom_nodes=200, assets=3, asset_kb=4, latency_ms=0)
+    runner, url = await serve(create_app(shape))
+    yield url
+    await runner.cleanup()
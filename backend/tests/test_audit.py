@@ -0,0 +1,73 @@
+"""End-to-end audits of the synthetic fixture site, run by a worker in-process"""
+import socket
+
+from app.services.job_queue import job_queue
+from app.services.task_store import task_store
+from app.services.workers import Worker
+
+MODULES = ["seo", "accessibility", "technology"]
+
+
+async def run_next_job(worker: Worker) -> str:
+    task_id = await job_queue.claim(worker.name)
+    assert task_id is not None
+    await worker._process(task_id)
+    return task_id
+
+
+async def test_audit_of_one_page(fixture_site):
+    worker = Worker("test-worker")
+    task_id = await worker.analyzer.start_analysis(f"{fixture_site}/site-0/", MODULES)
+
+    assert await run_next_job(worker) == task_id
+    task = await task_store.get(task_id)
+    assert task["status"] == "completed", task.get("error")
+    assert set(task["results"]) == set(MODULES)
+    assert all("error" not in result for result in task["results"].values())
+    assert 0 <= task["summary"]["overall_score"] <= 100
+    assert "jQuery" in str(task["results"]["technology"])
+    assert task["timings"]["total_ms"] > 0
+
+
+async def test_crawl_analyzes_the_start_page_first(fixture_site):
+    worker = Worker("test-worker")
+    start_url = f"{fixture_site}/site-1/"
+    task_id = await worker.analyzer.start_analysis(start_url, ["seo"], depth=2)
+
+    await run_next_job(worker)
+    task = await task_store.get(task_id)
+    assert task["status"] == "completed", task.get("error")
+    assert task["results"]["seo"]
+    # Pages 1-3 are linked from the start page, which is not analyzed twice
+    assert sorted(page["url"] for page in task["pages"]) == [
+        f"{start_url}page-{number}.html" for number in range(1, 4)
+    ]
+    assert task["crawl"]["pages_crawled"] == 4
+
+
+async def test_crawl_fails_when_the_start_page_fails():
+    # Nothing listens on a port that was just released
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    worker = Worker("test-worker")
+    task_id = await worker.analyzer.start_analysis(f"http://127.0.0.1:{port}/", ["seo"], depth=2)
+
+    await run_next_job(worker)
+    task = await task_store.get(task_id)
+    assert task["status"] == "error"
+    assert not task.get("pages")
+
+
+async def test_identical_requests_share_one_run(fixture_site):
+    worker = Worker("test-worker")
+    url = f"{fixture_site}/site-3/"
+    leader_id = await worker.analyzer.start_analysis(url, ["seo"])
+    follower_id = await worker.analyzer.start_analysis(url, ["seo"], priority=5)
+
+    assert await run_next_job(worker) == leader_id
+    assert await job_queue.claim(worker.name) is None
+    follower = await task_store.get(follower_id)
+    assert follower["status"] == "completed"
+    assert follower["shared_from"] == leader_id
+    assert follower["results"] == (await task_store.get(leader_id))["results"]
@@ -0,0 +1,81 @@
+"""Feeding of batch URLs into the job queue"""
+import asyncio
+
+from sqlalchemy import func, select
+
+from app.services.analyzer import WebsiteAnalyzer
+from app.services.batches import batch_store
+from app.services.database import SessionLocal
+from app.services.job_queue import QUEUED, JobRecord, job_queue
+from app.services.task_store import TaskRecord, task_store
+
+OPTIONS = {"modules": ["seo"], "depth": 1, "device": "desktop"}
+
+
+async def urls(*values: str):
+    for value in values:
+        yield value
+
+
+def count(model, *where) -> int:
+    with SessionLocal() as session:
+        return session.scalar(select(func.count()).select_from(model).where(*where))
+
+
+async def queued_urls():
+    with SessionLocal() as session:
+        task_ids = list(session.scalars(select(JobRecord.task_id).where(JobRecord.status == QUEUED)
+                                        .order_by(JobRecord.id)))
+    return [(await task_store.get(task_id))["url"] for task_id in task_ids]
+
+
+async def test_domains_are_fed_round_robin():
+    batch = await batch_store.create(urls(
+        "https://big.example/1", "https://big.example/2", "https://big.example/3",
+        "https://small.example/1", "https://other.example/1",
+    ), OPTIONS)
+    assert batch["total"] == 5
+
+    assert await batch_store.feed(WebsiteAnalyzer().start_analysis, 8) == 4
+    assert await queued_urls() == [
+        "https://big.example/1", "https://small.example/1", "https://other.example/1", "https://big.example/2",
+    ]
+    status = await batch_store.status(batch["batch_id"])
+    assert (status["scheduled"], status["waiting"]) == (4, 1)
+
+
+async def test_concurrent_feeders_respect_the_batch_share():
+    await batch_store.create(urls(*(f"https://site{index}.example/" for index in range(30))), OPTIONS)
+    analyzer = WebsiteAnalyzer()
+
+    fed = await asyncio.gather(*(batch_store.feed(analyzer.start_analysis, 20) for _ in range(3)))
+    assert sum(fed) == 10
+    assert await job_queue.depth() == 10
+    # A full share leaves nothing to feed until jobs are claimed
+    assert await batch_store.feed(analyzer.start_analysis, 20) == 0
+
+
+async def test_rejected_items_are_returned_without_leftover_tasks(monkeypatch):
+    batch = await batch_store.create(urls(*(f"https://site{index}.example/" for index in range(5))), OPTIONS)
+    monkeypatch.setattr(job_queue, "max_depth", 2)
+
+    assert await batch_store.feed(WebsiteAnalyzer().start_analysis, 20) == 2
+    status = await batch_store.status(batch["batch_id"])
+    assert (status["scheduled"], status["waiting"]) == (2, 3)
+    assert count(TaskRecord) == 2
+
+
+async def test_completed_items_stream_in_completion_order():
+    batch = await batch_store.create(urls("https://a.example/", "https://b.example/"), OPTIONS)
+    await batch_store.feed(WebsiteAnalyzer().start_analysis, 8)
+    with SessionLocal() as session:
+        first, second = session.scalars(select(JobRecord.task_id).order_by(JobRecord.id))
+
+    await batch_store.item_finished(second)
+    await batch_store.item_finished(second)
+    await batch_store.item_finished(first)
+
+    items = await batch_store.completed_items(batch["batch_id"], 0)
+    assert [(item["url"], item["cursor"]) for item in items] == [("https://b.example/", 1), ("https://a.example/", 2)]
+    assert await batch_store.completed_items(batch["batch_id"], 1) == items[1:]
+    assert (await batch_store.status(batch["batch_id"]))["completed"] == 2
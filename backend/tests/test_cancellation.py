@@ -0,0 +1,105 @@
+"""Cancellation scopes and deadlines of analysis runs"""
+import asyncio
+import threading
+
+import pytest
+from aiohttp import web
+
+from app.services.cancellation import CANCELLED, TIMED_OUT, AnalysisCancelled, CancelScope, checkpoint
+from app.services.job_queue import job_queue
+from app.services.task_store import task_store
+from app.services.workers import Worker
+from tests.conftest import serve
+
+
+async def test_scope_cancel_raises_analysis_cancelled():
+    scope = CancelScope()
+    run = asyncio.create_task(scope.run(asyncio.sleep(10)))
+    await asyncio.sleep(0.01)
+
+    assert scope.cancel(TIMED_OUT, "Too slow")
+    assert not scope.cancel()
+    with pytest.raises(AnalysisCancelled) as raised:
+        await run
+    assert (raised.value.status, str(raised.value)) == (TIMED_OUT, "Too slow")
+
+
+async def test_caller_cancellation_stays_a_cancelled_error():
+    scope = CancelScope()
+    started = asyncio.Event()
+    stopped = asyncio.Event()
+
+    async def work():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        finally:
+            stopped.set()
+
+    run = asyncio.create_task(scope.run(work()))
+    await started.wait()
+    run.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await run
+    assert stopped.is_set()
+    assert not scope.cancelled
+
+
+async def test_threads_stop_at_their_next_checkpoint():
+    scope = CancelScope()
+    running = threading.Event()
+    exited = threading.Event()
+
+    def loop():
+        running.set()
+        try:
+            while True:
+                checkpoint()
+        finally:
+            exited.set()
+
+    run = asyncio.create_task(scope.run(asyncio.to_thread(loop)))
+    await asyncio.to_thread(running.wait)
+    scope.cancel()
+    with pytest.raises(AnalysisCancelled):
+        await run
+    assert await asyncio.to_thread(exited.wait, 5)
+
+
+async def test_task_past_its_deadline_is_not_started(fixture_site):
+    worker = Worker("test-worker")
+    task_id = await worker.analyzer.start_analysis(f"{fixture_site}/site-0/", ["seo"], deadline=0.01)
+    await asyncio.sleep(0.05)
+
+    assert await job_queue.claim(worker.name) == task_id
+    await worker._process(task_id)
+    task = await task_store.get(task_id)
+    assert task["status"] == TIMED_OUT
+    assert task["results"] == {}
+
+
+async def test_cancelling_a_running_audit():
+    release = asyncio.Event()
+
+    async def slow(request: web.Request) -> web.Response:
+        await release.wait()
+        return web.Response(text="<html></html>", content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/", slow)
+    runner, url = await serve(app)
+    try:
+        worker = Worker("test-worker")
+        task_id = await worker.analyzer.start_analysis(f"{url}/", ["seo"])
+        await job_queue.claim(worker.name)
+        job = asyncio.create_task(worker._process(task_id))
+        while not worker.analyzer.cancel(task_id):
+            await asyncio.sleep(0.01)
+
+        await asyncio.wait_for(job, 5)
+        task = await task_store.get(task_id)
+        assert task["status"] == CANCELLED
+        assert await job_queue.claim(worker.name) is None
+    finally:
+        release.set()
+        await runner.cleanup()
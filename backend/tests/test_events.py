@@ -0,0 +1,86 @@
+"""Progress events: the event bus and the resumable SSE stream"""
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.endpoints import analyze
+from app.services.analyzer import WebsiteAnalyzer
+from app.services.events import EVENT_MAX_BYTES, MODULE, STATUS, EventBus, event_log
+
+
+@pytest.fixture
+async def client():
+    app = FastAPI()
+    app.include_router(analyze.router, prefix="/api")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    await analyze.event_bus.stop()
+
+
+def parse(stream: str):
+    """(id, event, data) of each event of an SSE stream"""
+    events = []
+    for block in stream.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        events.append((int(fields["id"]) if "id" in fields else None, fields["event"], json.loads(fields["data"])))
+    return events
+
+
+async def test_stream_resumes_after_the_last_event_id(client):
+    task_id = await WebsiteAnalyzer().start_analysis("https://example.com/", ["seo"])
+    await event_log.publish(task_id, STATUS, {"status": "running"})
+    await event_log.publish(task_id, MODULE, {"module": "seo", "result": {"score": 90}})
+    await event_log.publish(task_id, STATUS, {"status": "completed"})
+
+    response = await client.get(f"/api/analysis/{task_id}/events")
+    events = parse(response.text)
+    assert [(event, data.get("status")) for _, event, data in events] == [
+        ("status", "pending"), ("status", "running"), ("module", None), ("status", "completed"),
+    ]
+
+    resumed = await client.get(f"/api/analysis/{task_id}/events", headers={"Last-Event-ID": str(events[1][0])})
+    assert parse(resumed.text) == events[2:]
+    by_query = await client.get(f"/api/analysis/{task_id}/events", params={"last_event_id": events[2][0]})
+    assert parse(by_query.text) == events[3:]
+
+
+async def test_stream_follows_live_events(client):
+    task_id = await WebsiteAnalyzer().start_analysis("https://example.com/", ["seo"])
+    stream = asyncio.create_task(client.get(f"/api/analysis/{task_id}/events"))
+    await asyncio.sleep(0.3)
+
+    await event_log.publish(task_id, STATUS, {"status": "running"})
+    await event_log.publish(task_id, STATUS, {"status": "cancelled"})
+    response = await asyncio.wait_for(stream, 5)
+    assert [data["status"] for _, _, data in parse(response.text)] == ["pending", "running", "cancelled"]
+
+
+async def test_unknown_task_is_not_found(client):
+    response = await client.get("/api/analysis/missing/events")
+    assert response.status_code == 404
+
+
+async def test_bus_delivers_only_events_published_after_subscribing():
+    bus = EventBus(event_log)
+    await event_log.publish("a", STATUS, {"status": "pending"})
+    try:
+        async with bus.subscribe("a") as queue:
+            await event_log.publish("b", STATUS, {"status": "running"})
+            await event_log.publish("a", STATUS, {"status": "running"})
+            event = await asyncio.wait_for(queue.get(), 5)
+            assert (event["task_id"], event["data"]) == ("a", {"status": "running"})
+            assert queue.empty()
+    finally:
+        await bus.stop()
+
+
+async def test_oversized_events_are_stored_without_results():
+    await event_log.publish("a", MODULE, {"module": "seo", "result": {"html": "x" * EVENT_MAX_BYTES}})
+    await event_log.publish("a", MODULE, {"module": "carbon", "result": {"grams": 0.2}})
+
+    large, small = await event_log.history("a")
+    assert large["data"] == {"module": "seo", "truncated": True}
+    assert small["data"] == {"module": "carbon", "result": {"grams": 0.2}}
@@ -0,0 +1,150 @@
+"""State machine of the analysis job queue"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+from app.services.database import SessionLocal, WriteSession
+from app.services.job_queue import (ATTACHED, CANCELLED, CANCELLING, DONE, FAILED, JOB_MAX_ATTEMPTS, QUEUED,
+                                    RUNNING, JobQueue, JobRecord, QueueFull)
+
+
+def job(url: str = "https://example.com/") -> dict:
+    return {"url": url, "modules": ["seo"], "device": "desktop", "depth": 1}
+
+
+def job_row(task_id: str) -> JobRecord:
+    with SessionLocal() as session:
+        return session.scalars(select(JobRecord).where(JobRecord.task_id == task_id)).one()
+
+
+def expire_lease(task_id: str):
+    with WriteSession.begin() as session:
+        session.execute(update(JobRecord).where(JobRecord.task_id == task_id)
+                        .values(lease_expires_at=datetime.now() - timedelta(seconds=1)))
+
+
+@pytest.fixture
+def queue():
+    return JobQueue(max_depth=3)
+
+
+async def test_claims_by_priority_then_fifo(queue):
+    await queue.enqueue("low", job("https://a.example/"))
+    await queue.enqueue("high", job("https://b.example/"), priority=5)
+    await queue.enqueue("low-2", job("https://c.example/"))
+
+    assert [await queue.claim("w") for _ in range(4)] == ["high", "low", "low-2", None]
+    assert job_row("high").status == RUNNING
+    assert job_row("high").attempts == 1
+
+
+async def test_rejects_jobs_beyond_the_depth_limit(queue):
+    for index in range(3):
+        await queue.enqueue(f"t{index}", job(f"https://{index}.example/"))
+
+    with pytest.raises(QueueFull) as raised:
+        await queue.enqueue("t3", job("https://3.example/"))
+    assert raised.value.depth == 3
+    assert await queue.depth() == 3
+
+
+async def test_identical_job_attaches_and_raises_the_leader_priority(queue):
+    assert await queue.enqueue("leader", job()) is None
+    assert await queue.enqueue("follower", job(), priority=7) == "leader"
+
+    assert job_row("follower").status == ATTACHED
+    assert job_row("leader").priority == 7
+    assert await queue.depth() == 1
+
+
+async def test_tighter_deadline_does_not_attach(queue):
+    await queue.enqueue("leader", job(), deadline=600)
+
+    assert await queue.enqueue("urgent", job(), deadline=60) is None
+    assert await queue.enqueue("relaxed", job(), deadline=3600) == "leader"
+    assert await queue.enqueue("unbounded", job()) == "leader"
+
+
+async def test_deadline_does_not_attach_to_an_unbounded_job(queue):
+    await queue.enqueue("leader", job())
+
+    assert await queue.enqueue("bounded", job(), deadline=3600) is None
+
+
+async def test_finish_hands_results_to_attached_jobs(queue):
+    await queue.enqueue("leader", job())
+    await queue.enqueue("follower", job())
+    assert await queue.claim("w") == "leader"
+
+    assert await queue.finish("leader", "w") == ["follower"]
+    assert job_row("leader").status == DONE
+    assert job_row("follower").status == DONE
+
+
+async def test_finish_after_losing_the_lease(queue):
+    await queue.enqueue("t", job())
+    await queue.claim("w1")
+    expire_lease("t")
+    await queue.recover_expired()
+    assert await queue.claim("w2") == "t"
+
+    assert await queue.heartbeat("w1", ["t"]) == ["t"]
+    assert await queue.heartbeat("w2", ["t"]) == []
+    assert await queue.finish("t", "w1") is None
+    assert await queue.finish("t", "w2") == []
+
+
+async def test_expired_leases_requeue_until_attempts_run_out(queue):
+    await queue.enqueue("t", job())
+    for _ in range(1, JOB_MAX_ATTEMPTS):
+        assert await queue.claim("w") == "t"
+        expire_lease("t")
+        assert await queue.recover_expired() == ([], [])
+        assert job_row("t").status == QUEUED
+
+    assert await queue.claim("w") == "t"
+    expire_lease("t")
+    assert await queue.recover_expired() == (["t"], [])
+    assert job_row("t").status == FAILED
+
+
+async def test_cancelling_a_queued_job_promotes_a_follower(queue):
+    await queue.enqueue("leader", job(), deadline=60)
+    await queue.enqueue("late", job(), deadline=3600)
+    await queue.enqueue("early", job(), deadline=600)
+    await queue.enqueue("plain", job(), priority=2)
+
+    assert await queue.cancel("leader") == QUEUED
+    assert job_row("leader").status == CANCELLED
+    # The follower with the earliest deadline takes over, at the highest priority
+    promoted = job_row("early")
+    assert (promoted.status, promoted.priority) == (QUEUED, 2)
+    assert job_row("late").leader_task_id == "early"
+    assert job_row("plain").leader_task_id == "early"
+    assert await queue.cancel("leader") is None
+
+
+async def test_cancelling_a_running_job_flags_its_worker(queue):
+    await queue.enqueue("t", job())
+    await queue.enqueue("follower", job())
+    await queue.claim("w")
+
+    assert await queue.cancel("t") == RUNNING
+    assert job_row("t").status == CANCELLING
+    assert await queue.cancellations("w", ["t"]) == ["t"]
+    assert await queue.cancellations("other", ["t"]) == []
+
+    assert await queue.finish("t", "w", succeeded=False, cancelled=True) == []
+    assert job_row("t").status == CANCELLED
+    assert job_row("follower").status == QUEUED
+
+
+async def test_worker_dying_while_cancelling(queue):
+    await queue.enqueue("t", job())
+    await queue.claim("w")
+    await queue.cancel("t")
+    expire_lease("t")
+
+    assert await queue.recover_expired() == ([], ["t"])
+    assert job_row("t").status == CANCELLED
@@ -0,0 +1,142 @@
+"""Reuse of cached module results: freshness, revalidation and input hashes"""
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from aiohttp import web
+from sqlalchemy import update
+
+from app.services.database import WriteSession
+from app.services.result_cache import CachedModuleResult, ResultCache, _headers_hash, _html_hash
+from app.services.snapshot import PageSnapshot, fetch_snapshot
+from tests.conftest import serve
+
+DEPENDENCIES = {"seo": ("html",), "security": ("headers",)}
+RESULTS = {"seo": {"score": 80}, "security": {"score": 60}}
+
+PAGE = """<html><head><title>{title}</title><meta name="csrf-token" content="{token}">
+<script nonce="{token}">start()</script></head>
+<body><form><input type="hidden" name="csrf" value="{token}"></form></body></html>"""
+
+
+def snapshot(body: str = "<html></html>", headers=()) -> PageSnapshot:
+    return PageSnapshot("https://example.com/", "https://example.com/", 200, httpx.Headers(list(headers)),
+                        body.encode())
+
+
+def expire_all():
+    with WriteSession.begin() as session:
+        session.execute(update(CachedModuleResult).values(expires_at=datetime.now() - timedelta(seconds=1)))
+
+
+def test_html_hash_ignores_per_request_tokens():
+    first = snapshot(PAGE.format(title="Home", token="a1b2"))
+    second = snapshot(PAGE.format(title="Home", token="c3d4"))
+    changed = snapshot(PAGE.format(title="About", token="a1b2"))
+
+    assert _html_hash(first) == _html_hash(second)
+    assert _html_hash(first) != _html_hash(changed)
+
+
+def test_headers_hash_tracks_cookie_names_only():
+    def response(*cookies, cache_control="no-cache"):
+        return snapshot(headers=[("cache-control", cache_control), ("date", "Mon, 01 Jan 2024 00:00:00 GMT"),
+                                 *(("set-cookie", cookie) for cookie in cookies)])
+
+    session = "sid=1; Expires=Wed, 21 Oct 2026 07:28:00 GMT; Path=/"
+    renewed = "sid=2; Expires=Thu, 22 Oct 2026 07:28:00 GMT; Path=/"
+    baseline = _headers_hash(response(session, "theme=dark"))
+
+    assert _headers_hash(response(renewed, "theme=light")) == baseline
+    assert _headers_hash(response(session)) != baseline
+    assert _headers_hash(response(session, "theme=dark", cache_control="max-age=60")) != baseline
+
+
+def test_cookies_split_from_a_joined_header():
+    joined = snapshot(headers=[("set-cookie", "a=1; Expires=Wed, 21 Oct 2026 07:28:00 GMT, b=2; Path=/")])
+    separate = snapshot(headers=[("set-cookie", "a=1; Expires=Wed, 21 Oct 2026 07:28:00 GMT"),
+                                 ("set-cookie", "b=2; Path=/")])
+    plain = PageSnapshot("https://example.com/", "https://example.com/", 200,
+                         {"Set-Cookie": "a=1; Expires=Wed, 21 Oct 2026 07:28:00 GMT, b=2; Path=/"}, b"")
+
+    assert joined.cookies == ("a=1; Expires=Wed, 21 Oct 2026 07:28:00 GMT, b=2; Path=/",)
+    assert separate.cookies == plain.cookies == ("a=1; Expires=Wed, 21 Oct 2026 07:28:00 GMT", "b=2; Path=/")
+
+
+@pytest.fixture
+async def page_server():
+    """A page whose body and headers tests can change; answers conditional requests on its ETag"""
+    state = {"title": "Home", "token": "a1b2", "headers": {}, "etag": None}
+
+    async def page(request: web.Request) -> web.Response:
+        headers = dict(state["headers"])
+        if state["etag"]:
+            if request.headers.get("If-None-Match") == state["etag"]:
+                return web.Response(status=304)
+            headers["ETag"] = state["etag"]
+        return web.Response(text=PAGE.format(title=state["title"], token=state["token"]),
+                            content_type="text/html", headers=headers)
+
+    app = web.Application()
+    app.router.add_get("/", page)
+    runner, url = await serve(app)
+    yield f"{url}/", state
+    await runner.cleanup()
+
+
+async def cache_page(cache: ResultCache, url: str):
+    await cache.store(url, "desktop", 1, RESULTS, await fetch_snapshot(url), DEPENDENCIES)
+
+
+async def statuses(cache: ResultCache, url: str):
+    reusable, _ = await cache.lookup(url, list(RESULTS), "desktop", 1, DEPENDENCIES)
+    return {module: status for module, (status, _) in reusable.items()}
+
+
+async def test_fresh_results_are_hits(page_server):
+    url, _ = page_server
+    cache = ResultCache(enabled=True)
+    await cache_page(cache, url)
+
+    reusable, snapshot = await cache.lookup(url, list(RESULTS), "desktop", 1, DEPENDENCIES)
+    assert reusable == {module: ("hit", result) for module, result in RESULTS.items()}
+    assert snapshot is None
+
+
+async def test_expired_results_are_reused_per_unchanged_input(page_server):
+    url, state = page_server
+    cache = ResultCache(enabled=True)
+    await cache_page(cache, url)
+
+    # New tokens only: both modules' inputs are unchanged
+    expire_all()
+    state["token"] = "c3d4"
+    assert await statuses(cache, url) == {"seo": "unchanged", "security": "unchanged"}
+
+    # A new title only invalidates the module reading the document
+    expire_all()
+    state["title"] = "About"
+    assert await statuses(cache, url) == {"security": "unchanged"}
+
+    # A new header only invalidates the module reading headers
+    await cache_page(cache, url)
+    expire_all()
+    state["headers"] = {"Strict-Transport-Security": "max-age=31536000"}
+    assert await statuses(cache, url) == {"seo": "unchanged"}
+
+
+async def test_expired_results_revalidate_with_the_etag(page_server):
+    url, state = page_server
+    state["etag"] = '"v1"'
+    cache = ResultCache(enabled=True)
+    await cache_page(cache, url)
+
+    expire_all()
+    state["title"] = "Changed behind an unchanged ETag"
+    assert await statuses(cache, url) == {"seo": "revalidated", "security": "revalidated"}
+    # Revalidation extended the entries
+    assert await statuses(cache, url) == {"seo": "hit", "security": "hit"}
+
+    expire_all()
+    state["etag"] = '"v2"'
+    assert await statuses(cache, url) == {"security": "unchanged"}